@@ -4,7 +4,18 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 from PIL import Image
 import numpy as np
-import time
+import json
+
+from ontario_energy import backtest
+from ontario_energy import data as energy_data
+from ontario_energy import instrumentation
+from ontario_energy import options
+from ontario_energy.downsample import downsample
+from ontario_energy.intervals import INTERVAL_LEVEL
+from ontario_energy.metrics import POINT_METRICS
+from ontario_energy.service import ForecastService
+
+instrumentation.set_process("streamlit")
 
 # Set page config
 st.set_page_config(
@@ -54,9 +65,34 @@ st.markdown("""
 st.markdown('<div class="main-header"><h1>Ontario Energy Demand System</h1></div>', unsafe_allow_html=True)
 st.markdown('<div class="sub-header"><h3>Ontario Energy Forecasting</h3></div>', unsafe_allow_html=True)
 
-# Sidebar for navigation
+@st.cache_resource
+def get_forecast_service():
+    """One forecasting service (and model cache) shared by every session"""
+    return ForecastService()
+
+@st.cache_resource
+def get_backtest_scheduler():
+    """Background backtest runner shared by every session"""
+    return backtest.BacktestScheduler()
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def get_plot_series(data_source, time_period, method, version):
+    """Downsampled series for one (source, period); ``version`` invalidates stale data"""
+    return downsample(energy_data.load_source(data_source, time_period), method=method)
+
+def page_request(name):
+    """Time one page run, with the profiles chosen on the Diagnostics page (if any)"""
+    return instrumentation.request(name, profile=st.session_state.get("profiles"))
+
+def show_figure(fig, stage):
+    """Render a matplotlib figure into the page, timed as ``<stage>.render``"""
+    with instrumentation.span(f"{stage}.render"):
+        st.pyplot(fig)
+
+# Sidebar for navigation; the Diagnostics page is only listed with ?diagnostics in the URL
 st.sidebar.title("Navigation")
-page = st.sidebar.radio("Select Page", ["Home", "Visualization", "Predict", "Evaluation"])
+pages = options.PAGES + (["Diagnostics"] if "diagnostics" in st.query_params else [])
+page = st.sidebar.radio("Select Page", pages)
 
 # Home page
 if page == "Home":
@@ -94,138 +130,91 @@ elif page == "Visualization":
         with col1:
             data_source = st.selectbox(
                 "Data Source",
-                ["IESO Historical Data", "Weather Data", "Economic Indicators"]
+                options.SOURCE_OPTIONS
             )
             
             visualization_type = st.selectbox(
                 "Visualization Type",
-                ["Line Chart", "Bar Chart", "Heat Map", "Scatter Plot"]
+                options.VISUALIZATION_TYPES
             )
         
         with col2:
             time_period = st.selectbox(
                 "Time Period",
-                ["Last Month", "Last 6 Months", "Last Year", "Last 5 Years"]
+                options.PERIOD_OPTIONS
             )
         
         submitted = st.form_submit_button("Generate Visualization")
     
     # Generate visualization when form is submitted
     if submitted:
-        st.success(f"Generating {visualization_type} for {data_source} over {time_period}")
-        
-        # Create placeholder data
-        if time_period == "Last Month":
-            days = 30
-        elif time_period == "Last 6 Months":
-            days = 180
-        elif time_period == "Last Year":
-            days = 365
-        else:
-            days = 1825
-        
-        # Generate sample data
-        dates = pd.date_range(end=pd.Timestamp.now(), periods=days)
-        
-        if data_source == "IESO Historical Data":
-            # Generate energy demand data with daily and seasonal patterns
-            base_demand = 18000  # Base demand in MW
-            daily_pattern = np.sin(np.linspace(0, 2*np.pi, 24)).repeat(days//24 + 1)[:days]
-            seasonal_pattern = 3000 * np.sin(np.linspace(0, 2*np.pi, 365)).repeat(days//365 + 1)[:days]
-            random_noise = np.random.normal(0, 1000, days)
-            values = base_demand + 3000 * daily_pattern + seasonal_pattern + random_noise
-            
-            data = pd.DataFrame({
-                'Date': dates,
-                'Energy Demand (MW)': values
-            })
-            
-            title = "Ontario Energy Demand"
-            y_label = "Energy Demand (MW)"
-        
-        elif data_source == "Weather Data":
-            # Generate temperature data
-            base_temp = 10  # Base temperature in Celsius
-            seasonal_pattern = 15 * np.sin(np.linspace(0, 2*np.pi, 365)).repeat(days//365 + 1)[:days]
-            random_noise = np.random.normal(0, 5, days)
-            values = base_temp + seasonal_pattern + random_noise
-            
-            data = pd.DataFrame({
-                'Date': dates,
-                'Temperature (°C)': values
-            })
-            
-            title = "Ontario Temperature"
-            y_label = "Temperature (°C)"
-        
-        else:  # Economic Indicators
-            # Generate economic indicator data (e.g., GDP growth)
-            base_value = 100
-            trend = np.linspace(0, 20, days)
-            seasonal_pattern = 5 * np.sin(np.linspace(0, 8*np.pi, days))
-            random_noise = np.random.normal(0, 3, days)
-            values = base_value + trend + seasonal_pattern + random_noise
-            
-            data = pd.DataFrame({
-                'Date': dates,
-                'Economic Index': values
-            })
+        with page_request("visualization"):
+            st.success(f"Generating {visualization_type} for {data_source} over {time_period}")
             
-            title = "Ontario Economic Index"
-            y_label = "Index Value"
-        
-        # Create the visualization
-        fig, ax = plt.subplots(figsize=(10, 6))
-        
-        if visualization_type == "Line Chart":
-            plt.plot(data['Date'], data.iloc[:, 1], linewidth=2)
-            plt.title(title)
-            plt.xlabel("Date")
-            plt.ylabel(y_label)
-            plt.grid(True, alpha=0.3)
+            source_info = energy_data.SOURCES[data_source]
+            title = source_info["title"]
+            y_label = source_info["y_label"]
+            version = energy_data.source_version(data_source)
             
-        elif visualization_type == "Bar Chart":
-            # For bar chart, use monthly averages
-            data.set_index('Date', inplace=True)
-            monthly_data = data.resample('M').mean()
-            monthly_data.plot(kind='bar', ax=ax)
-            plt.title(f"Monthly Average {title}")
-            plt.xlabel("Month")
-            plt.ylabel(y_label)
-            plt.xticks(rotation=45)
-            
-        elif visualization_type == "Heat Map":
-            # Create a heatmap of daily values (reshape data)
-            data.set_index('Date', inplace=True)
-            
-            # If there's enough data, create a month-hour heatmap
-            if days >= 30:
-                data_pivot = data.iloc[:, 0].groupby([data.index.month, data.index.hour]).mean().unstack()
-                sns.heatmap(data_pivot, cmap="YlOrRd", annot=True, fmt=".0f", ax=ax)
-                plt.title(f"{title} Heatmap by Month and Hour")
-                plt.xlabel("Hour of Day")
-                plt.ylabel("Month")
-            else:
-                st.error("Not enough data for a heatmap. Please select a longer time period.")
+            # Memoised full-resolution history; only aggregates or downsampled points get plotted
+            series = energy_data.load_source(data_source, time_period)
+            days = (series.index[-1] - series.index[0]).days + 1
             
-        elif visualization_type == "Scatter Plot":
-            # Create a scatter plot with trend line
-            plt.scatter(data.index, data.iloc[:, 0], alpha=0.5)
+            # Create the visualization
+            fig, ax = plt.subplots(figsize=(10, 6))
             
-            # Add trend line
-            z = np.polyfit(range(len(data)), data.iloc[:, 0], 1)
-            p = np.poly1d(z)
-            plt.plot(data.index, p(range(len(data))), "r--", linewidth=2)
+            if visualization_type == "Line Chart":
+                plot_data = get_plot_series(data_source, time_period, "lttb", version)
+                plt.plot(plot_data.index, plot_data.to_numpy(), linewidth=2)
+                plt.title(title)
+                plt.xlabel("Date")
+                plt.ylabel(y_label)
+                plt.grid(True, alpha=0.3)
             
-            plt.title(f"{title} Scatter Plot with Trend")
-            plt.xlabel("Date")
-            plt.ylabel(y_label)
-        
-        st.pyplot(fig)
-        
-        # Display data sample
-        st.subheader("Data Sample")
-        st.dataframe(data.head())
+            elif visualization_type == "Bar Chart":
+                # For bar chart, use monthly averages sliced from the calendar cube
+                cube = energy_data.load_cube(data_source)
+                monthly_data = cube.monthly(months=energy_data.PERIOD_MONTHS[time_period])
+                monthly_data.index = monthly_data.index.strftime('%Y-%m')
+                monthly_data.plot(kind='bar', ax=ax)
+                plt.title(f"Monthly Average {title}")
+                plt.xlabel("Month")
+                plt.ylabel(y_label)
+                plt.xticks(rotation=45)
+            
+            elif visualization_type == "Heat Map":
+                # If there's enough data, create a month-hour heatmap
+                if days >= 28:
+                    cube = energy_data.load_cube(data_source)
+                    data_pivot = cube.heatmap("month", "hour", months=energy_data.PERIOD_MONTHS[time_period])
+                    sns.heatmap(data_pivot, cmap="YlOrRd", annot=True, fmt=".0f", ax=ax)
+                    plt.title(f"{title} Heatmap by Month and Hour")
+                    plt.xlabel("Hour of Day")
+                    plt.ylabel("Month")
+                else:
+                    st.error("Not enough data for a heatmap. Please select a longer time period.")
+            
+            elif visualization_type == "Scatter Plot":
+                # Bucket extremes keep outliers visible in the reduced scatter
+                plot_data = get_plot_series(data_source, time_period, "minmax", version)
+                plt.scatter(plot_data.index, plot_data.to_numpy(), alpha=0.5)
+            
+                # Add trend line, fitted on the full-resolution series
+                elapsed = (series.index - series.index[0]).total_seconds().to_numpy()
+                p = np.poly1d(np.polyfit(elapsed, series.to_numpy(), 1))
+                plot_elapsed = (plot_data.index - series.index[0]).total_seconds().to_numpy()
+                plt.plot(plot_data.index, p(plot_elapsed), "r--", linewidth=2)
+            
+                plt.title(f"{title} Scatter Plot with Trend")
+                plt.xlabel("Date")
+                plt.ylabel(y_label)
+            
+            show_figure(fig, "visualization")
+            plt.close(fig)
+            
+            # Display data sample
+            st.subheader("Data Sample")
+            st.dataframe(series.head().rename_axis('Date').reset_index())
 
 # Predict page
 elif page == "Predict":
@@ -238,47 +227,46 @@ elif page == "Predict":
         with col1:
             model = st.selectbox(
                 "Select Model",
-                ["ARIMA", "XGBoost", "LSTM", "ARIMA + LSTM + XGBoost"]
+                options.MODEL_OPTIONS
             )
             
             target = st.selectbox(
                 "Prediction Target",
-                ["Electricity Demand", "Price"]
+                options.TARGET_OPTIONS
             )
         
         with col2:
             duration = st.selectbox(
                 "Forecast Duration",
-                ["2 Years", "5 Years", "10 Years"]
+                options.DURATION_OPTIONS
             )
         
         submitted = st.form_submit_button("Run Prediction")
     
     # Generate predictions when form is submitted
     if submitted:
-        with st.spinner(f"Running {model} prediction for {target} over {duration}..."):
-            # Simulate processing time
-            time.sleep(2)
-            
-            # Generate sample prediction data
-            if duration == "2 Years":
-                periods = 24
-            elif duration == "5 Years":
-                periods = 60
-            else:
-                periods = 120
-            
-            future_dates = pd.date_range(start=pd.Timestamp.now(), periods=periods, freq='M')
+        with st.spinner(f"Running {model} prediction for {target} over {duration}..."), page_request("predict"):
+            try:
+                with instrumentation.span("predict.forecast"):
+                    daily_forecast = get_forecast_service().forecast(model, target, duration)
+            except ValueError as e:
+                st.error(str(e))
+                st.stop()
+            
+            if energy_data.is_demo(target):
+                st.info(f"No {target} data has been loaded yet; forecasting from the demo history.")
+            
+            # Show monthly averages of the daily forecast, aggregated by the forecast store
+            monthly_forecast = get_forecast_service().store.monthly(
+                model, target, issued_at=energy_data.load_series(target).index[-1],
+                end=daily_forecast.index[-1])
+            future_dates = monthly_forecast.index
+            forecast = monthly_forecast['forecast'].to_numpy()
+            # Monthly means of the model's daily prediction interval
+            lower_bound = monthly_forecast['lower'].to_numpy()
+            upper_bound = monthly_forecast['upper'].to_numpy()
             
             if target == "Electricity Demand":
-                # Generate forecast with uncertainty
-                base_forecast = 18000 + np.random.normal(0, 100, periods)
-                trend = np.linspace(0, 2000, periods)  # Increasing trend
-                seasonal_pattern = 3000 * np.sin(np.linspace(0, 2*np.pi*periods/12, periods))
-                forecast = base_forecast + trend + seasonal_pattern
-                
-                lower_bound = forecast * 0.9
-                upper_bound = forecast * 1.1
                 
                 forecast_df = pd.DataFrame({
                     'Date': future_dates,
@@ -291,15 +279,6 @@ elif page == "Predict":
                 y_label = "Demand (MW)"
             
             else:  # Price
-                # Generate price forecast
-                base_price = 50 + np.random.normal(0, 5, periods)
-                trend = np.linspace(0, 20, periods)  # Increasing trend
-                seasonal_pattern = 15 * np.sin(np.linspace(0, 2*np.pi*periods/12, periods))
-                forecast = base_price + trend + seasonal_pattern
-                
-                lower_bound = forecast * 0.85
-                upper_bound = forecast * 1.15
-                
                 forecast_df = pd.DataFrame({
                     'Date': future_dates,
                     'Forecast ($/MWh)': forecast,
@@ -316,7 +295,7 @@ elif page == "Predict":
             plt.fill_between(forecast_df['Date'], 
                             forecast_df['Lower Bound'], 
                             forecast_df['Upper Bound'], 
-                            color='b', alpha=0.2, label='Uncertainty')
+                            color='b', alpha=0.2, label=f'{INTERVAL_LEVEL:.0%} Interval')
             plt.title(title)
             plt.xlabel("Date")
             plt.ylabel(y_label)
@@ -324,7 +303,7 @@ elif page == "Predict":
             plt.grid(True, alpha=0.3)
             
             st.success("Prediction completed!")
-            st.pyplot(fig)
+            show_figure(fig, "predict")
             
             # Display forecast data
             st.subheader("Forecast Data")
@@ -356,31 +335,44 @@ elif page == "Evaluation":
         with col1:
             model = st.selectbox(
                 "Select Model",
-                ["ARIMA", "XGBoost", "LSTM", "Ensemble"]
+                options.MODEL_OPTIONS
             )
             
             metric = st.selectbox(
                 "Evaluation Metric",
-                ["RMSE", "MAE", "MAPE", "All Metrics"]
+                options.METRIC_OPTIONS
             )
         
         with col2:
             test_period = st.selectbox(
                 "Test Period",
-                ["Last 3 Months", "Last 6 Months", "Last Year"]
+                options.TEST_PERIOD_OPTIONS
+            )
+            
+            eval_target = st.selectbox(
+                "Prediction Target",
+                options.TARGET_OPTIONS
             )
         
         submitted = st.form_submit_button("Run Evaluation")
     
+    # Backtests run in a background process pool; the page only reads their results
+    scheduler = get_backtest_scheduler()
+    sweep = scheduler.status()
+    if sweep["running"]:
+        st.info(f"Backtest sweep running: {sweep['completed']} of {sweep['total']} folds finished. "
+                "Results appear here once it completes.")
+    elif st.button("Run Backtest Sweep"):
+        scheduler.start()
+        st.info("Backtest sweep started for every model, target and test period.")
+    elif sweep["error"]:
+        st.error(f"Last backtest sweep failed: {sweep['error']}")
+    
     # Generate evaluation results when form is submitted
     if submitted:
-        with st.spinner(f"Evaluating {model} using {metric} for {test_period}..."):
-            # Simulate processing time
-            time.sleep(2)
-            
-            # Generate sample evaluation data
-            models = ["ARIMA", "XGBoost", "LSTM", "Ensemble"]
-            metrics = ["RMSE", "MAE", "MAPE"]
+        with st.spinner(f"Evaluating {model} using {metric} for {test_period}..."), page_request("evaluation"):
+            models = options.MODEL_OPTIONS
+            metrics = list(POINT_METRICS)
             
             if model == "Ensemble":
                 model_data = models
@@ -392,41 +384,25 @@ elif page == "Evaluation":
             else:
                 metric_data = [metric]
             
-            # Create evaluation results
+            # Score the latest backtest folds of the test period in the forecast store
+            store = get_forecast_service().store
+            folds = backtest.TEST_PERIODS[test_period]
+            scores = store.metrics(eval_target, last=folds, models=model_data)
+            scores = scores.set_index(['model', 'metric'])['value']
+            
             results = {}
             for m in model_data:
                 results[m] = {}
                 for met in metric_data:
-                    if met == "RMSE":
-                        # Lower is better for RMSE
-                        if m == "Ensemble":
-                            results[m][met] = 350 + np.random.normal(0, 20)
-                        elif m == "LSTM":
-                            results[m][met] = 400 + np.random.normal(0, 30)
-                        elif m == "XGBoost":
-                            results[m][met] = 450 + np.random.normal(0, 40)
-                        else:  # ARIMA
-                            results[m][met] = 500 + np.random.normal(0, 50)
-                    elif met == "MAE":
-                        # Lower is better for MAE
-                        if m == "Ensemble":
-                            results[m][met] = 250 + np.random.normal(0, 15)
-                        elif m == "LSTM":
-                            results[m][met] = 300 + np.random.normal(0, 20)
-                        elif m == "XGBoost":
-                            results[m][met] = 350 + np.random.normal(0, 25)
-                        else:  # ARIMA
-                            results[m][met] = 400 + np.random.normal(0, 30)
-                    else:  # MAPE
-                        # Lower is better for MAPE
-                        if m == "Ensemble":
-                            results[m][met] = 5 + np.random.normal(0, 0.5)
-                        elif m == "LSTM":
-                            results[m][met] = 6 + np.random.normal(0, 0.6)
-                        elif m == "XGBoost":
-                            results[m][met] = 7 + np.random.normal(0, 0.7)
-                        else:  # ARIMA
-                            results[m][met] = 8 + np.random.normal(0, 0.8)
+                    results[m][met] = scores.get((m, met), np.nan)
+            
+            missing = [m for m in model_data if all(np.isnan(v) for v in results[m].values())]
+            if len(missing) == len(model_data):
+                st.warning(f"No backtest results for {', '.join(model_data)} on {eval_target} yet. "
+                           "Run a backtest sweep first.")
+                st.stop()
+            elif missing:
+                st.caption(f"Not backtested yet: {', '.join(missing)}")
             
             # Create a DataFrame for the results
             if len(model_data) > 1:
@@ -451,7 +427,7 @@ elif page == "Evaluation":
                 fig, ax = plt.subplots(figsize=(10, 6))
                 sns.heatmap(eval_df, annot=True, fmt=".2f", cmap="YlGnBu", ax=ax)
                 plt.title(f"Model Evaluation Results for {test_period}")
-                st.pyplot(fig)
+                show_figure(fig, "evaluation")
                 
                 # Show the data
                 st.dataframe(eval_df)
@@ -465,7 +441,7 @@ elif page == "Evaluation":
                 plt.ylabel(metric_data[0])
                 plt.xticks(rotation=0)
                 plt.grid(True, alpha=0.3)
-                st.pyplot(fig)
+                show_figure(fig, "evaluation")
                 
                 # Show the data
                 st.dataframe(eval_df)
@@ -479,7 +455,7 @@ elif page == "Evaluation":
                 plt.ylabel("Value")
                 plt.xticks(rotation=0)
                 plt.grid(True, alpha=0.3)
-                st.pyplot(fig)
+                show_figure(fig, "evaluation")
                 
                 # Show the data
                 st.dataframe(eval_df)
@@ -494,41 +470,17 @@ elif page == "Evaluation":
             # Add a time series plot of actual vs predicted values
             st.subheader("Actual vs Predicted")
             
-            # Generate sample data
-            if test_period == "Last 3 Months":
-                days = 90
-            elif test_period == "Last 6 Months":
-                days = 180
-            else:
-                days = 365
-            
-            dates = pd.date_range(end=pd.Timestamp.now(), periods=days)
-            
-            # Generate actual values
-            base_value = 18000
-            daily_pattern = np.sin(np.linspace(0, 2*np.pi, 24)).repeat(days//24 + 1)[:days]
-            seasonal_pattern = 3000 * np.sin(np.linspace(0, 2*np.pi, 365)).repeat(days//365 + 1)[:days]
-            random_noise = np.random.normal(0, 1000, days)
-            actual_values = base_value + 3000 * daily_pattern + seasonal_pattern + random_noise
-            
-            # Generate predicted values with error
-            if model == "Ensemble":
-                error_factor = 0.05
-            elif model == "LSTM":
-                error_factor = 0.07
-            elif model == "XGBoost":
-                error_factor = 0.09
-            else:  # ARIMA
-                error_factor = 0.12
-                
-            predicted_values = actual_values * (1 + np.random.normal(0, error_factor, days))
+            predictions = store.predictions(model, eval_target, last=folds)
+            if predictions.empty:
+                st.info(f"No backtest predictions for {model} yet.")
+                st.stop()
             
             # Create a DataFrame
             comparison_df = pd.DataFrame({
-                'Date': dates,
-                'Actual': actual_values,
-                'Predicted': predicted_values,
-                'Error': predicted_values - actual_values
+                'Date': predictions['day'].to_numpy(),
+                'Actual': predictions['actual'].to_numpy(),
+                'Predicted': predictions['predicted'].to_numpy(),
+                'Error': (predictions['predicted'] - predictions['actual']).to_numpy()
             })
             
             # Plot the comparison
@@ -540,7 +492,7 @@ elif page == "Evaluation":
             plt.ylabel("Value")
             plt.legend()
             plt.grid(True, alpha=0.3)
-            st.pyplot(fig)
+            show_figure(fig, "evaluation")
             
             # Plot the error
             fig, ax = plt.subplots(figsize=(10, 4))
@@ -550,12 +502,83 @@ elif page == "Evaluation":
             plt.ylabel("Error")
             plt.axhline(y=0, color='r', linestyle='-')
             plt.grid(True, alpha=0.3)
-            st.pyplot(fig)
+            show_figure(fig, "evaluation")
             
             # Show a sample of the comparison data
             st.subheader("Comparison Data Sample")
             st.dataframe(comparison_df.head())
 
+# Diagnostics page (hidden): stage timings, cache counters and profiles of recent requests
+elif page == "Diagnostics":
+    st.markdown('<p class="section-title">Diagnostics</p>', unsafe_allow_html=True)
+    registry = instrumentation.metrics()
+    
+    # Profiles apply to this session's next Predict, Visualization and Evaluation runs
+    st.session_state["profiles"] = st.multiselect(
+        "Profile my next requests",
+        instrumentation.PROFILES,
+        default=sorted(instrumentation.profile_setting(st.session_state.get("profiles")))
+    )
+    
+    counters = registry.counters()
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        hits = counters.get("cache.model.memory_hit", 0) + counters.get("cache.model.disk_hit", 0)
+        lookups = hits + counters.get("cache.model.miss", 0)
+        st.metric("Model Cache Hit Rate", f"{hits / lookups:.0%}" if lookups else "n/a")
+    with col2:
+        hits = counters.get("cache.features.hit", 0) + counters.get("cache.features.extend", 0)
+        lookups = hits + counters.get("cache.features.miss", 0)
+        st.metric("Feature Cache Hit Rate", f"{hits / lookups:.0%}" if lookups else "n/a")
+    with col3:
+        st.metric("Requests Recorded", len(registry.requests()))
+    
+    st.subheader("Stage Timings (seconds)")
+    spans = pd.DataFrame.from_dict(registry.spans(), orient="index")
+    if spans.empty:
+        st.info("Nothing has been timed in this server process yet.")
+    else:
+        st.dataframe(spans.sort_values("total", ascending=False))
+    
+    st.subheader("Counters")
+    st.dataframe(pd.Series(counters, name="count", dtype="int64").rename_axis("event"))
+    
+    st.subheader("Recent Requests")
+    for record in registry.requests():
+        label = f"{record['request']}: {record['seconds']:.2f}s"
+        if record["error"]:
+            label += f" (failed: {record['error']})"
+        with st.expander(label):
+            breakdown = pd.DataFrame(record["spans"]).sort_values("start")
+            breakdown["span"] = [". " * depth + name for depth, name in zip(breakdown["depth"], breakdown["span"])]
+            st.dataframe(breakdown[["span", "start", "seconds"]].reset_index(drop=True))
+            if "cpu" in record:
+                st.caption(f"cProfile saved to {record['cpu']['path']}")
+                st.code(record["cpu"]["top"])
+            if "memory" in record:
+                st.write(f"**Peak traced memory:** {record['memory']['peak_mb']:.1f} MiB")
+                st.dataframe(pd.DataFrame(record["memory"]["top"]))
+    
+    # Batch commands and the desktop client export their own numbers
+    others = {name: snapshot for name, snapshot in instrumentation.load_exports().items()
+              if name != registry.process}
+    if others:
+        st.subheader("Other Processes")
+        process = st.selectbox("Process", list(others))
+        st.dataframe(pd.DataFrame.from_dict(others[process]["spans"], orient="index"))
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.download_button("Download JSON", json.dumps(registry.snapshot(), indent=1, default=str),
+                           file_name="metrics.json", mime="application/json")
+    with col2:
+        st.download_button("Download Prometheus Text", registry.prometheus(),
+                           file_name="metrics.prom", mime="text/plain")
+    with col3:
+        if st.button("Reset Metrics"):
+            registry.reset()
+            st.rerun()
+
 # Add a footer
 st.markdown("""
 <div style="text-align: center; margin-top: 40px; padding: 20px; background-color: #f0f0f0;">
@@ -0,0 +1,19 @@
+"""Benchmarks of the ingestion, feature, training and inference hot paths.
+
+    python -m benchmarks [--size small|medium|production] [--resolution daily|hourly]
+                         [--cases ingest features ...] [--save] [--tolerance 0.25]
+
+Every case runs against deterministic synthetic data (see
+``ontario_energy.synthetic``) sized like the production inputs: the
+number of households and blocks, the years of history and whether the
+models see daily or hourly series. Generated inputs are kept under
+``--workdir`` and reused by later runs of the same size.
+
+Each case runs in a fresh process, so its peak RSS is its own. The suite
+reports latency percentiles over ``--repeat`` timed runs (after warm-up
+runs), throughput in the case's own unit (rows, series-hours, steps) and
+peak RSS, and compares them with the stored baseline in
+``benchmarks/baselines/<size>-<resolution>.json``. A case slower or larger
+than its baseline by more than ``--tolerance`` is a regression and makes
+the run exit with status 1; ``--save`` stores the run as the new baseline.
+"""
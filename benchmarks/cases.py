@@ -0,0 +1,317 @@
+"""Benchmark cases and the input sizes they run at.
+
+Every case is a function of ``(size, resolution, workdir)`` that prepares
+its inputs (untimed) and returns a ``Bench`` whose ``run`` is the timed
+operation. Generated inputs are written once under ``workdir/inputs`` and
+shared by every case and later run of the same size.
+"""
+import collections
+import glob
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from .harness import Bench, Skip
+
+Size = collections.namedtuple("Size", [
+    "households", "blocks", "years", "history_years", "hourly_series", "hourly_days",
+])
+
+# ``production`` is the London smart-meter trial behind the notebook (5,566
+# households in 112 block files over 2.3 years) and the 10-year daily
+# histories of the Predict page; the hourly series are households or zones
+SIZES = {
+    "small": Size(households=200, blocks=4, years=1, history_years=3, hourly_series=10, hourly_days=90),
+    "medium": Size(households=1000, blocks=20, years=2, history_years=5, hourly_series=100,
+                   hourly_days=365),
+    "production": Size(households=5566, blocks=112, years=2.3, history_years=10, hourly_series=500,
+                       hourly_days=2 * 365),
+}
+
+RESOLUTIONS = ("daily", "hourly")
+
+# Fixed end date, so every run generates exactly the same inputs
+END = pd.Timestamp("2024-12-31")
+
+# Forecast horizons: the shortest Predict page duration, and a week of hours
+HORIZON = {"daily": 2 * 365, "hourly": 168}
+
+BLOCK_COLUMNS = ["LCLid", "day", "energy_median", "energy_mean", "energy_max", "energy_count",
+                 "energy_std", "energy_sum", "energy_min"]
+
+
+def _generated(path, write):
+    """``path``, written by ``write(temporary_path)`` unless it already exists"""
+    if not os.path.exists(path):
+        temporary = path + ".tmp"
+        shutil.rmtree(temporary, ignore_errors=True)
+        os.makedirs(temporary)
+        write(temporary)
+        os.replace(temporary, path)
+    return path
+
+
+def _scratch(workdir):
+    """Fresh directory for one timed run's outputs"""
+    return tempfile.mkdtemp(dir=_generated(os.path.join(workdir, "scratch"), lambda path: None))
+
+
+def block_files(size, workdir):
+    """Smart-meter block CSVs in the trial's daily layout, households split between blocks"""
+    from ontario_energy.synthetic import household_energy
+
+    def write(directory):
+        frame = household_energy(size.households, size.years, end=END)
+        frame["energy_count"] = 48
+        frame["energy_mean"] = frame["energy_sum"] / 48
+        frame["energy_median"] = frame["energy_mean"] * 0.9
+        frame["energy_max"] = frame["energy_mean"] * 3.0
+        frame["energy_min"] = frame["energy_mean"] * 0.2
+        frame["energy_std"] = frame["energy_mean"] * 0.6
+        codes = frame["LCLid"].cat.codes.to_numpy()
+        for number, households in enumerate(np.array_split(np.arange(size.households), size.blocks)):
+            block = frame[(codes >= households[0]) & (codes <= households[-1])]
+            block[BLOCK_COLUMNS].to_csv(os.path.join(directory, f"block_{number}.csv"), index=False,
+                                        date_format="%Y-%m-%d")
+
+    return _generated(os.path.join(workdir, "inputs", "blocks"), write)
+
+
+def energy_dataset(size, workdir):
+    from ontario_energy.ingest import ingest_blocks
+
+    return _generated(os.path.join(workdir, "inputs", "energy"),
+                      lambda directory: ingest_blocks(block_files(size, workdir), directory))
+
+
+def daily_energy(size, workdir):
+    """The normalised daily frame: ``day``, ``energy_sum``, ``LCLid`` count and ``avg_energy``"""
+    from ontario_energy.aggregates import DailyAggregateStore
+
+    path = _generated(os.path.join(workdir, "inputs", "daily_aggregates"), lambda directory:
+                      DailyAggregateStore(directory).append_blocks(energy_dataset(size, workdir)))
+    frame = DailyAggregateStore(path).to_frame()
+    frame["avg_energy"] = frame["energy_sum"] / frame["LCLid"]
+    return frame
+
+
+def weather_frame(size):
+    from ontario_energy.synthetic import daily_weather
+
+    weather = daily_weather(end=END, years=size.years)
+    weather.insert(0, "day", weather.pop("time"))
+    return weather
+
+
+def history(size, resolution):
+    """The series the models forecast at ``resolution``"""
+    from ontario_energy.synthetic import hourly_demand, target_series
+
+    if resolution == "hourly":
+        return hourly_demand(end=END, years=size.hourly_days / 365.25)
+    return target_series("Electricity Demand", end=END, years=size.history_years)
+
+
+def zonal_files(size, workdir):
+    """IESO-style zonal demand reports, one per year, with a column per series"""
+    from ontario_energy.synthetic import zonal_demand
+
+    def write(directory):
+        frame = zonal_demand(end=END, years=size.hourly_days / 365.25, zones=size.hourly_series)
+        frame.insert(0, "Hour", frame.index.hour + 1)
+        frame.insert(0, "Date", frame.index.strftime("%Y-%m-%d"))
+        for year, report in frame.groupby(frame.index.year):
+            report.to_csv(os.path.join(directory, f"PUB_DemandZonal_{year}.csv"), index=False,
+                          float_format="%.1f")
+
+    return _generated(os.path.join(workdir, "inputs", "zonal"), write)
+
+
+def hourly_dataset(size, workdir):
+    from ontario_energy.hourly import ingest_hourly
+
+    return _generated(os.path.join(workdir, "inputs", "hourly"),
+                      lambda directory: ingest_hourly(zonal_files(size, workdir), directory))
+
+
+def bench_ingest(size, resolution, workdir):
+    from ontario_energy.ingest import ingest_blocks
+
+    source = block_files(size, workdir)
+    target = _scratch(workdir)
+    rows = 0
+    for path in glob.glob(os.path.join(source, "block_*.csv")):
+        with open(path) as f:
+            rows += sum(1 for _ in f) - 1
+    return Bench(lambda: ingest_blocks(source, target, force=True), rows, "rows")
+
+
+def bench_normalize(size, resolution, workdir):
+    """Per-day totals and household counts folded from every block, then ``avg_energy``"""
+    from ontario_energy.aggregates import DailyAggregateStore
+    from ontario_energy.ingest import open_dataset
+
+    dataset = energy_dataset(size, workdir)
+    rows = open_dataset(dataset).count_rows()
+
+    def normalize():
+        store = DailyAggregateStore(_scratch(workdir))
+        store.append_blocks(dataset)
+        frame = store.to_frame()
+        frame["avg_energy"] = frame["energy_sum"] / frame["LCLid"]
+        return frame
+
+    return Bench(normalize, rows, "rows")
+
+
+def bench_weather_merge(size, resolution, workdir):
+    from ontario_energy.weather import weather_energy_table
+
+    energy = daily_energy(size, workdir)
+    weather = weather_frame(size)
+    return Bench(lambda: weather_energy_table(energy, weather), len(energy), "days")
+
+
+def bench_kmeans(size, resolution, workdir):
+    """Weather clusters and the elbow scores used to choose their number"""
+    from ontario_energy.clustering import WeatherClusterer, elbow_scores
+    from ontario_energy.weather import weather_energy_table
+
+    table = weather_energy_table(daily_energy(size, workdir), weather_frame(size))
+
+    def run():
+        clusterer = WeatherClusterer().fit(table)
+        return elbow_scores(clusterer._scaled(table))
+
+    return Bench(run, len(table), "days")
+
+
+def bench_features(size, resolution, workdir):
+    from ontario_energy.calendars import ontario_calendar
+    from ontario_energy.features import build_features
+
+    series = history(size, resolution)
+    events = ontario_calendar()
+    return Bench(lambda: build_features(series, events=events), len(series), "rows")
+
+
+def bench_panel_features(size, resolution, workdir):
+    """Hourly features of one block of series, as ``HourlyForecaster`` builds them"""
+    from ontario_energy.features import panel_features
+    from ontario_energy.hourly import HOURLY_DIFFS, HOURLY_LAGS, HOURLY_WINDOWS, HourlyForecaster
+    from ontario_energy.synthetic import zonal_demand
+
+    frame = zonal_demand(end=END, years=size.hourly_days / 365.25,
+                         zones=min(size.hourly_series, HourlyForecaster.block))
+    values = frame.to_numpy()
+    return Bench(lambda: panel_features(values, frame.index, HOURLY_LAGS, HOURLY_DIFFS, HOURLY_WINDOWS),
+                 values.size, "values")
+
+
+def bench_hourly_ingest(size, resolution, workdir):
+    from ontario_energy.hourly import ingest_hourly
+
+    source = zonal_files(size, workdir)
+    target = _scratch(workdir)
+    values = size.hourly_series * len(pd.date_range(end=END, periods=int(size.hourly_days * 24), freq="h"))
+    return Bench(lambda: ingest_hourly(source, target, force=True), values, "values")
+
+
+def bench_hourly_fit(size, resolution, workdir):
+    """Fit of the hourly model on every series, chunk by chunk from the dataset"""
+    from ontario_energy.hourly import fit_hourly, open_hourly
+
+    dataset = hourly_dataset(size, workdir)
+    values = open_hourly(dataset).count_rows()
+    return Bench(lambda: fit_hourly(dataset, path=os.path.join(_scratch(workdir), "hourly.npz"),
+                                    refresh=False), values, "values", repeat=3)
+
+
+def _fit_bench(model, size, resolution, repeat):
+    series = history(size, resolution)
+    return Bench(lambda: model().fit(series), len(series), "points", repeat=repeat)
+
+
+def _predict_bench(model, size, resolution):
+    fitted = model().fit(history(size, resolution))
+    steps = HORIZON[resolution]
+    return Bench(lambda: fitted.forecast_interval(steps), steps, "steps")
+
+
+def bench_sarimax_fit(size, resolution, workdir):
+    from ontario_energy.models import SarimaxForecaster
+
+    return _fit_bench(SarimaxForecaster, size, resolution, repeat=3)
+
+
+def bench_sarimax_predict(size, resolution, workdir):
+    from ontario_energy.models import SarimaxForecaster
+
+    return _predict_bench(SarimaxForecaster, size, resolution)
+
+
+def bench_lstm_fit(size, resolution, workdir):
+    from ontario_energy.models import LstmForecaster
+
+    return _fit_bench(LstmForecaster, size, resolution, repeat=3)
+
+
+def bench_lstm_predict(size, resolution, workdir):
+    from ontario_energy.models import LstmForecaster
+
+    return _predict_bench(LstmForecaster, size, resolution)
+
+
+def bench_xgboost_fit(size, resolution, workdir):
+    """XGBoost fit with its feature matrix already in the cache, as on a refit"""
+    from ontario_energy.models import XgboostForecaster
+
+    return _fit_bench(XgboostForecaster, size, resolution, repeat=3)
+
+
+def bench_xgboost_predict(size, resolution, workdir):
+    from ontario_energy.models import XgboostForecaster
+
+    return _predict_bench(XgboostForecaster, size, resolution)
+
+
+def bench_page_render(size, resolution, workdir):
+    """Every page of the Streamlit app, rendered in turn by ``AppTest``"""
+    try:
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        raise Skip("streamlit is not installed") from None
+    from ontario_energy.options import PAGES
+
+    script = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "GUI.py")
+
+    def run():
+        app = AppTest.from_file(script, default_timeout=600).run()
+        for page in PAGES[1:]:
+            app.sidebar.radio[0].set_value(page).run()
+        if app.exception:
+            raise RuntimeError(app.exception[0].value)
+
+    return Bench(run, len(PAGES), "pages")
+
+
+CASES = {
+    "ingest": bench_ingest,
+    "normalize": bench_normalize,
+    "weather_merge": bench_weather_merge,
+    "kmeans": bench_kmeans,
+    "features": bench_features,
+    "panel_features": bench_panel_features,
+    "hourly_ingest": bench_hourly_ingest,
+    "hourly_fit": bench_hourly_fit,
+    "sarimax_fit": bench_sarimax_fit,
+    "sarimax_predict": bench_sarimax_predict,
+    "lstm_fit": bench_lstm_fit,
+    "lstm_predict": bench_lstm_predict,
+    "xgboost_fit": bench_xgboost_fit,
+    "xgboost_predict": bench_xgboost_predict,
+    "page_render": bench_page_render,
+}
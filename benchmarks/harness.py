@@ -0,0 +1,149 @@
+"""Timing, memory measurement and baseline comparison for the benchmark cases."""
+import collections
+import json
+import math
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+Bench = collections.namedtuple("Bench", ["run", "items", "unit", "repeat"], defaults=[None])
+
+Result = collections.namedtuple("Result", [
+    "name", "items", "unit", "repeat", "p50", "p90", "p99", "mean", "throughput", "peak_rss_mb",
+    "skipped",
+])
+
+# Metrics compared with the baseline; larger is worse for both
+COMPARED = ("p50", "peak_rss_mb")
+
+DEFAULT_REPEAT = 5
+
+# Calls faster than this are timed in loops, so timer and scheduler noise
+# stays small next to the sample
+MIN_SAMPLE = 0.05
+
+
+class Skip(Exception):
+    """Raised by a case that cannot run here, e.g. without an optional dependency"""
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MiB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+
+def percentiles(latencies):
+    latencies = np.asarray(latencies, dtype=np.float64)
+    p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+    return float(p50), float(p90), float(p99)
+
+
+def run_case(name, size, resolution, workdir, repeat=None, warmup=1):
+    """Set up and time one case in the current process
+
+    Called in a fresh worker process by ``run_isolated``, with the package
+    data (caches, saved models) under ``workdir/data``. The case's setup
+    is not timed but does count towards the peak RSS, as it would in
+    production. ``repeat`` defaults to the case's own, then ``DEFAULT_REPEAT``.
+    Latencies are per call, averaged over the calls of each sample.
+    """
+    os.environ["ONTARIO_ENERGY_DATA"] = os.path.join(workdir, "data")
+    from .cases import CASES, SIZES
+
+    try:
+        bench = CASES[name](SIZES[size], resolution, workdir)
+    except Skip as skip:
+        return Result(name, 0, "", 0, *[float("nan")] * 6, skipped=str(skip))
+    repeat = repeat or bench.repeat or DEFAULT_REPEAT
+    for _ in range(warmup):
+        bench.run()
+    start = time.perf_counter()
+    bench.run()
+    first = time.perf_counter() - start
+    loops = max(1, math.ceil(MIN_SAMPLE / first)) if first > 0 else 1
+    latencies = [first] if loops == 1 else []
+    while len(latencies) < repeat:
+        start = time.perf_counter()
+        for _ in range(loops):
+            bench.run()
+        latencies.append((time.perf_counter() - start) / loops)
+    mean = float(np.mean(latencies))
+    return Result(name, bench.items, bench.unit, repeat, *percentiles(latencies), mean,
+                  bench.items / mean if mean > 0 else float("inf"), peak_rss_mb(), skipped=None)
+
+
+def run_isolated(name, size, resolution, workdir, repeat=None, warmup=1):
+    """``run_case`` in a new spawned process, so its peak RSS is its own"""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(run_case, name, size, resolution, workdir, repeat, warmup).result()
+
+
+def machine():
+    """What the numbers were measured on, stored with every baseline"""
+    return {"platform": platform.platform(), "python": platform.python_version(),
+            "processor": platform.processor() or platform.machine(), "cpus": os.cpu_count()}
+
+
+def save_baseline(path, results, settings):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    payload = {
+        "settings": settings,
+        "machine": machine(),
+        "saved_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": {result.name: result._asdict() for result in results if result.skipped is None},
+    }
+    with open(path + ".tmp", "w") as f:
+        json.dump(payload, f, indent=2, sort_keys=True)
+        f.write("\n")
+    os.replace(path + ".tmp", path)
+
+
+def load_baseline(path):
+    """Baseline results by case name, or None if there is no baseline yet"""
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)["results"]
+
+
+def compare(results, baseline, tolerance):
+    """Regressions as ``(case, metric, baseline, current)`` tuples
+
+    A metric regresses when it exceeds its baseline by more than
+    ``tolerance`` (a fraction). Cases missing from either side are skipped.
+    """
+    regressions = []
+    for result in results:
+        previous = (baseline or {}).get(result.name)
+        if result.skipped is not None or previous is None:
+            continue
+        for metric in COMPARED:
+            current, before = getattr(result, metric), previous.get(metric)
+            if before and current > before * (1 + tolerance):
+                regressions.append((result.name, metric, before, current))
+    return regressions
+
+
+def format_table(results, baseline=None):
+    """Plain-text table of the results, with the change from the baseline"""
+    header = (f"{'case':<18} {'p50 s':>9} {'p90 s':>9} {'p99 s':>9} {'throughput':>20} "
+              f"{'peak MiB':>9} {'vs base':>8}")
+    lines = [header, "-" * len(header)]
+    for result in results:
+        if result.skipped is not None:
+            lines.append(f"{result.name:<18} skipped: {result.skipped}")
+            continue
+        previous = (baseline or {}).get(result.name)
+        change = f"{result.p50 / previous['p50'] - 1:+.0%}" if previous and previous.get("p50") else ""
+        throughput = f"{result.throughput:,.0f} {result.unit}/s"
+        lines.append(f"{result.name:<18} {result.p50:9.4f} {result.p90:9.4f} {result.p99:9.4f} "
+                     f"{throughput:>20} {result.peak_rss_mb:9.0f} {change:>8}")
+    return "\n".join(lines)
@@ -0,0 +1,68 @@
+"""Command line of the benchmark suite (see the package docstring)."""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+from .cases import CASES, RESOLUTIONS, SIZES
+from .harness import compare, format_table, load_baseline, run_isolated, save_baseline
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+
+
+def baseline_path(size, resolution):
+    return os.path.join(BASELINE_DIR, f"{size}-{resolution}.json")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks",
+                                     description="Time the hot paths on synthetic data and compare "
+                                                 "with the stored baseline")
+    parser.add_argument("--size", choices=list(SIZES), default="small")
+    parser.add_argument("--resolution", choices=RESOLUTIONS, default="daily",
+                        help="series the feature and model cases run on")
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES))
+    parser.add_argument("--repeat", type=int, default=None,
+                        help="timed runs per case (default: the case's own, or 5)")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed runs before the timed ones")
+    parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "ontario-energy-benchmarks"),
+                        help="where generated inputs are kept between runs")
+    parser.add_argument("--baseline", default=None,
+                        help="baseline JSON (default: benchmarks/baselines/<size>-<resolution>.json)")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="fraction a case may exceed its baseline p50 or peak RSS by")
+    parser.add_argument("--save", action="store_true", help="store this run as the new baseline")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    workdir = os.path.join(os.path.abspath(args.workdir), args.size)
+    # Caches and saved models start empty; generated inputs are reused
+    for stale in ("data", "scratch"):
+        shutil.rmtree(os.path.join(workdir, stale), ignore_errors=True)
+    path = args.baseline or baseline_path(args.size, args.resolution)
+    baseline = load_baseline(path)
+
+    results = []
+    try:
+        for name in args.cases:
+            print(f"{name}...", file=sys.stderr, flush=True)
+            results.append(run_isolated(name, args.size, args.resolution, workdir, args.repeat, args.warmup))
+    finally:
+        shutil.rmtree(os.path.join(workdir, "scratch"), ignore_errors=True)
+
+    print(format_table(results, baseline))
+    if args.save:
+        save_baseline(path, results, {"size": args.size, "resolution": args.resolution,
+                                      "repeat": args.repeat, "warmup": args.warmup})
+        print(f"Saved baseline to {path}")
+        return 0
+    if baseline is None:
+        print(f"No baseline at {path}; run with --save to store one")
+        return 0
+    regressions = compare(results, baseline, args.tolerance)
+    for case, metric, before, current in regressions:
+        print(f"REGRESSION {case}: {metric} {before:.4g} -> {current:.4g} (+{current / before - 1:.0%})")
+    return 1 if regressions else 0
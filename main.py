@@ -2,6 +2,54 @@ import tkinter as tk
 from tkinter import ttk, messagebox
 from PIL import Image, ImageTk
 
+from ontario_energy import backtest
+from ontario_energy import data as energy_data
+from ontario_energy import instrumentation
+from ontario_energy import options
+from ontario_energy.downsample import downsample
+from ontario_energy.jobs import JobRunner
+from ontario_energy.models import MODELS
+from ontario_energy.service import ForecastService
+
+
+def prediction_job(context, service, model, target, duration):
+    """Fit (or fetch) the model and return its monthly forecast"""
+    context.report(None, f"Running {model} for {target} ({duration})...")
+    with instrumentation.request("predict"):
+        forecast = service.forecast(model, target, duration)
+        context.check_cancelled()
+        issued_at = energy_data.load_series(target).index[-1]
+        return service.store.monthly(model, target, issued_at, end=forecast.index[-1])["forecast"]
+
+
+def visualization_job(context, data_source, period, visualization_type):
+    """Load what the Visualization page plots for one chart type
+
+    Bar charts and heat maps are sliced from the source's calendar cube;
+    line and scatter charts get the full-resolution history.
+    """
+    context.report(None, f"Loading {data_source}...")
+    with instrumentation.request("visualization"):
+        if visualization_type == "Bar Chart":
+            return energy_data.load_cube(data_source).monthly(months=energy_data.PERIOD_MONTHS[period])
+        if visualization_type == "Heat Map":
+            return energy_data.load_cube(data_source).heatmap(
+                "month", "hour", months=energy_data.PERIOD_MONTHS[period])
+        return energy_data.load_source(data_source, period)
+
+
+def evaluation_job(context, model, test_period):
+    """Backtest one model over one test period on the demand series"""
+    def progress(completed, total):
+        context.check_cancelled()
+        context.report(completed / total if total else None,
+                       f"Backtesting {model}: {completed} of {total} folds")
+
+    with instrumentation.request("evaluation"):
+        return backtest.run_sweep(models=[model], targets=["Electricity Demand"],
+                                  test_periods=[test_period], progress=progress)
+
+
 class EnergyPredictionGUI:
     def __init__(self, root):
         self.root = root
@@ -13,6 +61,13 @@ class EnergyPredictionGUI:
         self.menu_visible = False
         self.current_page = None
         
+        # Long-running work goes to background jobs so the window stays responsive
+        self.service = ForecastService()
+        self.jobs = JobRunner(max_workers=2)
+        self.jobs.attach(self.root)
+        self.page_jobs = {}
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        
         # Top bar mimicking Ontario website style
         self.top_frame = tk.Frame(root, bg="#000000", height=100)
         self.top_frame.pack(fill="x", side="top")
@@ -58,9 +113,8 @@ class EnergyPredictionGUI:
         self.dropdown_frame = tk.Frame(self.root, bg="white", relief="solid", borderwidth=2)
         self.dropdown_buttons = []
         
-        # Change "Train" to "Visualization" in the options list
-        options = ["Home", "Visualization", "Predict", "Evaluation"]
-        for option in options:
+        # One menu entry per page
+        for option in options.PAGES:
             btn = tk.Button(self.dropdown_frame, text=option, anchor="w", relief="flat", 
                           bg="white", fg="black", width=20, height=2, font=("Arial", 10),
                           command=lambda opt=option: self.handle_menu_selection(opt))
@@ -74,6 +128,9 @@ class EnergyPredictionGUI:
         # Add event to close menu when clicking elsewhere
         self.root.bind("<Button-1>", self.close_menu_if_outside)
         
+        # Status bar for background jobs (packed before the content so it keeps its space)
+        self.create_status_bar()
+        
         # Create frames for different sections
         self.create_section_frames()
         
@@ -92,6 +149,21 @@ class EnergyPredictionGUI:
         # Show welcome screen initially
         self.show_page("Welcome")
     
+    def create_status_bar(self):
+        """Create the bottom bar showing the current page's job progress"""
+        self.status_frame = tk.Frame(self.root, bg="#e0e0e0")
+        self.status_frame.pack(fill="x", side="bottom")
+        
+        self.status_label = tk.Label(self.status_frame, text="Ready", anchor="w", bg="#e0e0e0")
+        self.status_label.pack(side="left", fill="x", expand=True, padx=10, pady=3)
+        
+        self.cancel_button = ttk.Button(self.status_frame, text="Cancel", command=self.cancel_page_job,
+                                        state="disabled")
+        self.cancel_button.pack(side="right", padx=10, pady=3)
+        
+        self.progress_bar = ttk.Progressbar(self.status_frame, length=200, mode="determinate")
+        self.progress_bar.pack(side="right", padx=10, pady=3)
+    
     def create_section_frames(self):
         """Create frames for Visualization, Predict, and Evaluation sections"""
         # Content container
@@ -107,35 +179,37 @@ class EnergyPredictionGUI:
         visualization_config_frame.pack(pady=10)
         
         ttk.Label(visualization_config_frame, text="Data Source:").grid(row=0, column=0, sticky="w", padx=10, pady=5)
-        data_source_var = tk.StringVar()
-        data_source_combo = ttk.Combobox(visualization_config_frame, textvariable=data_source_var, 
-                                       values=["IESO Historical Data", "Weather Data", "Economic Indicators"], 
+        self.data_source_var = tk.StringVar()
+        data_source_combo = ttk.Combobox(visualization_config_frame, textvariable=self.data_source_var, 
+                                       values=options.SOURCE_OPTIONS, 
                                        state='readonly', width=30)
         data_source_combo.grid(row=0, column=1, padx=10, pady=5)
         
         ttk.Label(visualization_config_frame, text="Visualization Type:").grid(row=1, column=0, sticky="w", padx=10, pady=5)
-        visualization_type_var = tk.StringVar()
-        visualization_type_combo = ttk.Combobox(visualization_config_frame, textvariable=visualization_type_var, 
-                                      values=["Line Chart", "Bar Chart", "Heat Map", "Scatter Plot"], 
+        self.visualization_type_var = tk.StringVar()
+        visualization_type_combo = ttk.Combobox(visualization_config_frame, textvariable=self.visualization_type_var, 
+                                      values=options.VISUALIZATION_TYPES, 
                                       state='readonly', width=30)
         visualization_type_combo.grid(row=1, column=1, padx=10, pady=5)
         
         ttk.Label(visualization_config_frame, text="Time Period:").grid(row=2, column=0, sticky="w", padx=10, pady=5)
-        period_var = tk.StringVar()
-        period_combo = ttk.Combobox(visualization_config_frame, textvariable=period_var, 
-                                   values=["Last Month", "Last 6 Months", "Last Year", "Last 5 Years"], 
+        self.period_var = tk.StringVar()
+        period_combo = ttk.Combobox(visualization_config_frame, textvariable=self.period_var, 
+                                   values=options.PERIOD_OPTIONS, 
                                    state='readonly', width=30)
         period_combo.grid(row=2, column=1, padx=10, pady=5)
         
-        visualization_button = ttk.Button(visualization_config_frame, text="Generate Visualization")
-        visualization_button.grid(row=3, column=0, columnspan=2, pady=10)
+        self.visualization_button = ttk.Button(visualization_config_frame, text="Generate Visualization",
+                                               command=self.run_visualization)
+        self.visualization_button.grid(row=3, column=0, columnspan=2, pady=10)
         
         # Chart display area
-        chart_frame = ttk.Frame(self.visualization_frame, padding=10, relief="ridge")
-        chart_frame.pack(pady=10, fill="both", expand=True)
+        self.chart_frame = ttk.Frame(self.visualization_frame, padding=10, relief="ridge")
+        self.chart_frame.pack(pady=10, fill="both", expand=True)
         
-        chart_placeholder = tk.Label(chart_frame, text="Chart will appear here", height=10)
-        chart_placeholder.pack(pady=20, fill="both", expand=True)
+        self.chart_placeholder = tk.Label(self.chart_frame, text="Chart will appear here", height=10)
+        self.chart_placeholder.pack(pady=20, fill="both", expand=True)
+        self.chart_canvas = None
         
         # Predict section (the original prediction form)
         self.predict_frame = tk.Frame(self.content_frame, bg="#f5f5f5")
@@ -148,21 +222,21 @@ class EnergyPredictionGUI:
         ttk.Label(predict_config_frame, text="Select Model:").grid(row=0, column=0, sticky="w", padx=10, pady=5)
         self.model_var = tk.StringVar()
         self.model_combo = ttk.Combobox(predict_config_frame, textvariable=self.model_var, 
-                                        values=["ARIMA", "XGBoost", "LSTM", "ARIMA + LSTM + XGBoost"], 
+                                        values=options.MODEL_OPTIONS, 
                                         state='readonly', width=30)
         self.model_combo.grid(row=0, column=1, padx=10, pady=5)
         
         ttk.Label(predict_config_frame, text="Prediction Target:").grid(row=1, column=0, sticky="w", padx=10, pady=5)
         self.target_var = tk.StringVar()
         self.target_combo = ttk.Combobox(predict_config_frame, textvariable=self.target_var, 
-                                         values=["Electricity Demand", "Price"], 
+                                         values=options.TARGET_OPTIONS, 
                                          state='readonly', width=30)
         self.target_combo.grid(row=1, column=1, padx=10, pady=5)
         
         ttk.Label(predict_config_frame, text="Forecast Duration:").grid(row=2, column=0, sticky="w", padx=10, pady=5)
         self.duration_var = tk.StringVar()
         self.duration_combo = ttk.Combobox(predict_config_frame, textvariable=self.duration_var, 
-                                           values=["2 Years", "5 Years", "10 Years"], 
+                                           values=options.DURATION_OPTIONS, 
                                            state='readonly', width=30)
         self.duration_combo.grid(row=2, column=1, padx=10, pady=5)
         
@@ -182,28 +256,28 @@ class EnergyPredictionGUI:
         eval_config_frame.pack(pady=10)
         
         ttk.Label(eval_config_frame, text="Select Model:").grid(row=0, column=0, sticky="w", padx=10, pady=5)
-        eval_model_var = tk.StringVar()
-        eval_model_combo = ttk.Combobox(eval_config_frame, textvariable=eval_model_var, 
-                                      values=["ARIMA", "XGBoost", "LSTM", "Ensemble"], 
+        self.eval_model_var = tk.StringVar()
+        eval_model_combo = ttk.Combobox(eval_config_frame, textvariable=self.eval_model_var, 
+                                      values=options.MODEL_OPTIONS, 
                                       state='readonly', width=30)
         eval_model_combo.grid(row=0, column=1, padx=10, pady=5)
         
         ttk.Label(eval_config_frame, text="Evaluation Metric:").grid(row=1, column=0, sticky="w", padx=10, pady=5)
-        metric_var = tk.StringVar()
-        metric_combo = ttk.Combobox(eval_config_frame, textvariable=metric_var, 
-                                   values=["RMSE", "MAE", "MAPE", "All Metrics"], 
+        self.metric_var = tk.StringVar()
+        metric_combo = ttk.Combobox(eval_config_frame, textvariable=self.metric_var, 
+                                   values=options.METRIC_OPTIONS, 
                                    state='readonly', width=30)
         metric_combo.grid(row=1, column=1, padx=10, pady=5)
         
         ttk.Label(eval_config_frame, text="Test Period:").grid(row=2, column=0, sticky="w", padx=10, pady=5)
-        test_period_var = tk.StringVar()
-        test_period_combo = ttk.Combobox(eval_config_frame, textvariable=test_period_var, 
-                                        values=["Last 3 Months", "Last 6 Months", "Last Year"], 
+        self.test_period_var = tk.StringVar()
+        test_period_combo = ttk.Combobox(eval_config_frame, textvariable=self.test_period_var, 
+                                        values=options.TEST_PERIOD_OPTIONS, 
                                         state='readonly', width=30)
         test_period_combo.grid(row=2, column=1, padx=10, pady=5)
         
-        evaluate_button = ttk.Button(eval_config_frame, text="Run Evaluation")
-        evaluate_button.grid(row=3, column=0, columnspan=2, pady=10)
+        self.evaluate_button = ttk.Button(eval_config_frame, text="Run Evaluation", command=self.run_evaluation)
+        self.evaluate_button.grid(row=3, column=0, columnspan=2, pady=10)
         
         # Evaluation results area
         eval_result_frame = ttk.Frame(self.evaluation_frame, padding=10)
@@ -212,8 +286,8 @@ class EnergyPredictionGUI:
         eval_result_label = ttk.Label(eval_result_frame, text="Evaluation Results:")
         eval_result_label.pack(anchor="w")
         
-        eval_output = tk.Text(eval_result_frame, height=10, width=80, state="disabled")
-        eval_output.pack(pady=5, fill="both", expand=True)
+        self.eval_output = tk.Text(eval_result_frame, height=10, width=80, state="disabled")
+        self.eval_output.pack(pady=5, fill="both", expand=True)
     
     def on_icon_enter(self, event):
         """Handle mouse entering the icon area"""
@@ -247,9 +321,6 @@ class EnergyPredictionGUI:
             self.dropdown_frame.lift()
             
             self.menu_visible = True
-            
-            # Print debug info
-            print(f"Dropdown shown at x={x}, y={y}, width={dropdown_width}")
     
     def hide_dropdown_menu(self):
         """Hide the dropdown menu"""
@@ -257,7 +328,6 @@ class EnergyPredictionGUI:
             self.dropdown_frame.place_forget()
             self.right_icon_label.config(image=self.menu_icon)
             self.menu_visible = False
-            print("Dropdown hidden")
     
     def toggle_dropdown_menu(self, event):
         """Toggle the dropdown menu visibility"""
@@ -307,13 +377,71 @@ class EnergyPredictionGUI:
             self.evaluation_frame.pack(in_=self.content_frame, fill="both", expand=True)
         
         self.current_page = page_name
-        print(f"Changed to page: {page_name}")
+        self.update_status()
+        instrumentation.count(f"page.{page_name}")
     
     def handle_menu_selection(self, option):
         """Handle menu option selection"""
         self.hide_dropdown_menu()
         self.show_page(option)
-        print(f"Selected option: {option}")
+    
+    def start_page_job(self, page, button, fn, *args, on_done):
+        """Run ``fn`` in the background on behalf of ``page``"""
+        def finished():
+            button.config(state="normal")
+            self.page_jobs.pop(page, None)
+            self.update_status()
+        
+        def done(result):
+            finished()
+            on_done(result)
+        
+        def failed(error):
+            finished()
+            messagebox.showerror("Error", str(error))
+        
+        def progress(fraction, message):
+            self.page_jobs[page]["fraction"] = fraction
+            self.page_jobs[page]["message"] = message
+            self.update_status()
+        
+        button.config(state="disabled")
+        job = self.jobs.submit(fn, *args, on_done=done, on_error=failed, on_progress=progress)
+        self.page_jobs[page] = {"job": job, "button": button, "fraction": None, "message": "Queued..."}
+        self.update_status()
+    
+    def update_status(self):
+        """Show the progress of the current page's job in the status bar"""
+        entry = self.page_jobs.get(self.current_page)
+        if entry is None:
+            running = len(self.jobs.active)
+            self.status_label.config(text=f"{running} background job(s) running" if running else "Ready")
+            self.progress_bar.stop()
+            self.progress_bar.config(mode="determinate", value=0)
+            self.cancel_button.config(state="disabled")
+            return
+        
+        self.status_label.config(text=entry["message"] or "Working...")
+        if entry["fraction"] is None:
+            if str(self.progress_bar.cget("mode")) != "indeterminate":
+                self.progress_bar.config(mode="indeterminate")
+                self.progress_bar.start(15)
+        else:
+            self.progress_bar.stop()
+            self.progress_bar.config(mode="determinate", value=entry["fraction"] * 100)
+        self.cancel_button.config(state="normal")
+    
+    def cancel_page_job(self):
+        """Cancel the current page's background job"""
+        entry = self.page_jobs.pop(self.current_page, None)
+        if entry is not None:
+            entry["job"].cancel()
+            entry["button"].config(state="normal")
+        self.update_status()
+    
+    def on_close(self):
+        self.jobs.shutdown()
+        self.root.destroy()
     
     def run_prediction(self):
         selected_model = self.model_var.get()
@@ -323,15 +451,105 @@ class EnergyPredictionGUI:
         if not selected_model or not selected_target or not selected_duration:
             messagebox.showerror("Error", "Please select all options before running prediction.")
             return
+        if selected_model not in MODELS:
+            messagebox.showerror("Error", f"{selected_model} forecasting is not available yet.")
+            return
         
-        result_text = f"Running {selected_model} for {selected_target} ({selected_duration})...\nPrediction results will be displayed here."
-        
+        self.show_prediction_text(f"Running {selected_model} for {selected_target} ({selected_duration})...\n")
+        self.start_page_job("Predict", self.run_button, prediction_job, self.service,
+                            selected_model, selected_target, selected_duration,
+                            on_done=lambda forecast: self.show_prediction(
+                                forecast, selected_model, selected_target, selected_duration))
+    
+    def show_prediction_text(self, result_text):
         self.output_text.config(state="normal")
         self.output_text.delete("1.0", tk.END)
         self.output_text.insert(tk.END, result_text)
         self.output_text.config(state="disabled")
+    
+    def show_prediction(self, forecast, model, target, duration):
+        """Write a finished forecast into the prediction output box"""
+        lines = [f"{model} forecast for {target} ({duration})",
+                 f"Mean: {forecast.mean():.2f}   Max: {forecast.max():.2f}   Min: {forecast.min():.2f}",
+                 ""]
+        lines += [f"{date:%Y-%m}: {value:.2f}" for date, value in forecast.items()]
+        self.show_prediction_text("\n".join(lines))
+    
+    def run_visualization(self):
+        data_source = self.data_source_var.get()
+        visualization_type = self.visualization_type_var.get()
+        period = self.period_var.get()
+        
+        if not data_source or not visualization_type or not period:
+            messagebox.showerror("Error", "Please select all options before generating a visualization.")
+            return
+        
+        self.start_page_job("Visualization", self.visualization_button, visualization_job, data_source, period,
+                            visualization_type,
+                            on_done=lambda data: self.show_chart(data, data_source, visualization_type))
+    
+    def show_chart(self, data, data_source, visualization_type):
+        """Draw the loaded series or aggregate in the chart area"""
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        from matplotlib.figure import Figure
+        
+        figure = Figure(figsize=(7, 3.5))
+        ax = figure.add_subplot()
+        if visualization_type == "Bar Chart":
+            ax.bar(data.index, data.to_numpy(), width=20)
+        elif visualization_type == "Heat Map":
+            image = ax.imshow(data.to_numpy(), aspect="auto", cmap="YlOrRd")
+            ax.set_yticks(range(len(data.index)), data.index)
+            ax.set_xlabel("Hour of Day")
+            ax.set_ylabel("Month")
+            figure.colorbar(image, ax=ax)
+        elif visualization_type == "Scatter Plot":
+            points = downsample(data, points=700, method="minmax")
+            ax.scatter(points.index, points.to_numpy(), s=4, alpha=0.5)
+        else:
+            # About one point per pixel of the 7-inch figure
+            points = downsample(data, points=700)
+            ax.plot(points.index, points.to_numpy(), linewidth=1)
+        ax.set_title(f"{data_source}: {visualization_type}")
+        figure.tight_layout()
+        
+        self.chart_placeholder.pack_forget()
+        if self.chart_canvas is not None:
+            self.chart_canvas.get_tk_widget().destroy()
+        self.chart_canvas = FigureCanvasTkAgg(figure, master=self.chart_frame)
+        with instrumentation.span("visualization.render"):
+            self.chart_canvas.draw()
+        self.chart_canvas.get_tk_widget().pack(fill="both", expand=True)
+    
+    def run_evaluation(self):
+        model = self.eval_model_var.get()
+        metric = self.metric_var.get()
+        test_period = self.test_period_var.get()
+        
+        if not model or not metric or not test_period:
+            messagebox.showerror("Error", "Please select all options before running evaluation.")
+            return
+        if model not in MODELS:
+            messagebox.showerror("Error", f"{model} evaluation is not available yet.")
+            return
+        
+        self.start_page_job("Evaluation", self.evaluate_button, evaluation_job, model, test_period,
+                            on_done=lambda metrics: self.show_evaluation(metrics, model, metric, test_period))
+    
+    def show_evaluation(self, metrics, model, metric, test_period):
+        """Write backtest scores into the evaluation output box"""
+        if metric != "All Metrics":
+            metrics = metrics[metrics["metric"] == metric]
+        lines = [f"{model} backtest on Electricity Demand, {test_period}:"]
+        lines += [f"{row.metric}: {row.value:.2f}" for row in metrics.itertuples()]
+        
+        self.eval_output.config(state="normal")
+        self.eval_output.delete("1.0", tk.END)
+        self.eval_output.insert(tk.END, "\n".join(lines))
+        self.eval_output.config(state="disabled")
         
 if __name__ == "__main__":
+    instrumentation.set_process("desktop")
     root = tk.Tk()
     app = EnergyPredictionGUI(root)
     root.mainloop()
\ No newline at end of file
@@ -0,0 +1 @@
+"""Data and modelling core shared by the Ontario energy notebook and front ends."""
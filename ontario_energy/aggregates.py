@@ -0,0 +1,340 @@
+"""Persistent per-day energy totals and household counts.
+
+The notebook normalises energy by the number of households reporting each
+day, which used to mean a ``nunique`` plus a ``groupby('day').sum()`` over
+the whole history on every refresh. ``DailyAggregateStore`` keeps those two
+numbers per day on disk and folds new blocks in, touching only the days (and
+the month partitions holding them) that the new rows cover.
+
+Distinct households are counted exactly by keeping the hashed
+``(day, LCLid)`` pairs seen so far, or approximately with one HyperLogLog
+sketch per day when ``distinct="hll"``. Energy is summed over every row in
+both modes; only the household counts are de-duplicated.
+
+Each applied block's contribution (its hashed ``(day, LCLid)`` rows and
+the energy it added per day) is kept next to the aggregates, with the
+block's manifest fingerprint. A block that comes back rewritten is taken
+out again before its new rows are folded in: its energy is subtracted and
+its pairs dropped unless another block holds them, or with ``"hll"`` the
+sketches of the months it covers are rebuilt from the other blocks.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from .config import DATA_DIR
+from .ingest import DEFAULT_DATASET_DIR, block_fingerprints, load_energy
+
+DEFAULT_STORE_DIR = os.path.join(DATA_DIR, "daily_aggregates")
+
+STATE_NAME = "_state.json"
+DAILY_NAME = "daily.parquet"
+
+# Odd 64-bit constant used to mix the day into the household hash
+_DAY_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _hash_households(households):
+    """Hash household ids to uint64, hashing each distinct id only once"""
+    households = pd.Series(households)
+    if isinstance(households.dtype, pd.CategoricalDtype):
+        categories = np.asarray(households.cat.categories, dtype=object)
+        return pd.util.hash_array(categories)[households.cat.codes.to_numpy()]
+    return pd.util.hash_array(households.to_numpy(dtype=object))
+
+
+def _pairs(days, hashes):
+    """Mix the day into the household hashes, one uint64 per ``(day, LCLid)``"""
+    return hashes ^ (days.astype(np.int64).astype(np.uint64) * _DAY_MIX)
+
+
+def _bit_length(values):
+    """Vectorised ``int.bit_length`` for uint64 arrays"""
+    values = values.copy()
+    length = np.zeros(values.shape, dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        mask = values >= np.uint64(1 << shift)
+        length[mask] += shift
+        values[mask] >>= np.uint64(shift)
+    return length + (values > 0)
+
+
+def hll_update(registers, rows, hashes, precision):
+    """Fold 64-bit hashes into the HyperLogLog registers at ``rows``"""
+    width = 64 - precision
+    index = (hashes >> np.uint64(width)).astype(np.int64)
+    remainder = hashes & np.uint64((1 << width) - 1)
+    rank = (width - _bit_length(remainder) + 1).astype(np.uint8)
+    np.maximum.at(registers, (rows, index), rank)
+
+
+def hll_estimate(registers):
+    """Cardinality estimate for each row of HyperLogLog registers"""
+    m = registers.shape[-1]
+    alpha = 0.7213 / (1 + 1.079 / m)
+    raw = alpha * m * m / np.exp2(-registers.astype(np.float64)).sum(axis=-1)
+    zeros = (registers == 0).sum(axis=-1)
+    # Linear counting is more accurate while most registers are still empty
+    small = (raw <= 2.5 * m) & (zeros > 0)
+    linear = m * np.log(m / np.maximum(zeros, 1))
+    return np.where(small, linear, raw)
+
+
+class DailyAggregateStore:
+    """Day-keyed energy sum and distinct household count, kept on disk"""
+
+    def __init__(self, path=DEFAULT_STORE_DIR, distinct="exact", precision=12):
+        if distinct not in ("exact", "hll"):
+            raise ValueError(f"distinct must be 'exact' or 'hll', not {distinct!r}")
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+        state = self._read_state()
+        if state and (state["distinct"], state["precision"]) != (distinct, precision):
+            raise ValueError(
+                f"Store at {path!r} was built with distinct={state['distinct']!r}, "
+                f"precision={state['precision']}"
+            )
+        self.distinct = distinct
+        self.precision = precision
+        self.applied_blocks = {int(number): fingerprint
+                               for number, fingerprint in state.get("blocks", {}).items()}
+        self.daily = self._read_daily()
+
+    def _read_state(self):
+        try:
+            with open(os.path.join(self.path, STATE_NAME)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _write_state(self):
+        path = os.path.join(self.path, STATE_NAME)
+        state = {
+            "distinct": self.distinct,
+            "precision": self.precision,
+            "blocks": {str(number): self.applied_blocks[number] for number in sorted(self.applied_blocks)},
+        }
+        with open(path + ".tmp", "w") as f:
+            json.dump(state, f, indent=2)
+        os.replace(path + ".tmp", path)
+
+    def _read_daily(self):
+        path = os.path.join(self.path, DAILY_NAME)
+        if not os.path.exists(path):
+            return pd.DataFrame(
+                {"energy_sum": pd.Series(dtype="float64"),
+                 "household_count": pd.Series(dtype="int64")},
+                index=pd.DatetimeIndex([], name="day"),
+            )
+        return pd.read_parquet(path)
+
+    def _write_daily(self):
+        path = os.path.join(self.path, DAILY_NAME)
+        self.daily.to_parquet(path + ".tmp")
+        os.replace(path + ".tmp", path)
+
+    def _partition(self, kind, month):
+        return os.path.join(self.path, kind, f"{month}.npy")
+
+    def _contribution_path(self, block):
+        return os.path.join(self.path, "blocks", f"{block}.npz")
+
+    def _write_contribution(self, block, days, hashes, added_days, added):
+        """Keep the block's distinct ``(day, LCLid)`` rows and the energy it added per day"""
+        keys = np.unique(_pairs(days, hashes), return_index=True)[1]
+        path = self._contribution_path(block)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "wb") as f:
+            np.savez(f, days=days[keys], hashes=hashes[keys], added_days=added_days, added=added)
+        os.replace(path + ".tmp", path)
+
+    def _read_contribution(self, block):
+        path = self._contribution_path(block)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as contribution:
+            return {name: contribution[name] for name in contribution.files}
+
+    def _other_contributions(self, block, months):
+        """Contributions of the other applied blocks, restricted to ``months``"""
+        for other in self.applied_blocks:
+            contribution = None if other == block else self._read_contribution(other)
+            if contribution is None:
+                continue
+            keep = np.isin(contribution["days"].astype("datetime64[M]"), months)
+            if keep.any():
+                yield contribution["days"][keep], contribution["hashes"][keep]
+
+    def _remove_block(self, block):
+        """Take an applied block's contribution out of the store; return the changed days"""
+        contribution = self._read_contribution(block)
+        if contribution is None:
+            raise ValueError(
+                f"Block {block} was applied without recording its contribution; "
+                f"rebuild the store at {self.path!r} to revise it"
+            )
+        days, hashes = contribution["days"], contribution["hashes"]
+        months = np.unique(days.astype("datetime64[M]"))
+        daily = self.daily.copy()
+
+        added = pd.Series(contribution["added"], index=pd.DatetimeIndex(
+            contribution["added_days"].astype("datetime64[ns]"), name="day"))
+        daily.loc[added.index, "energy_sum"] -= added.to_numpy()
+
+        if self.distinct == "exact":
+            held = [_pairs(*other) for other in self._other_contributions(block, months)]
+            pairs = _pairs(days, hashes)
+            dropped = ~np.isin(pairs, np.concatenate(held)) if held else np.ones(len(pairs), bool)
+            for month in months:
+                path = self._partition("members", month)
+                in_month = dropped & (days.astype("datetime64[M]") == month)
+                np.save(path, np.setdiff1d(np.load(path), pairs[in_month], assume_unique=True))
+            day_keys, removed = np.unique(days[dropped], return_counts=True)
+            index = pd.DatetimeIndex(day_keys.astype("datetime64[ns]"))
+            daily.loc[index, "household_count"] -= removed
+        else:
+            others = list(self._other_contributions(block, months))
+            for month in months:
+                first_day = np.datetime64(month, "D")
+                registers = np.zeros_like(np.load(self._partition("registers", month)))
+                for other_days, other_hashes in others:
+                    in_month = other_days.astype("datetime64[M]") == month
+                    hll_update(registers, (other_days[in_month] - first_day).astype(np.int64),
+                               other_hashes[in_month], self.precision)
+                np.save(self._partition("registers", month), registers)
+                month_days = daily.index[daily.index.to_period("M") == pd.Period(str(month), "M")]
+                rows = (month_days.to_numpy().astype("datetime64[D]") - first_day).astype(np.int64)
+                daily.loc[month_days, "household_count"] = np.rint(
+                    hll_estimate(registers[rows])).astype(np.int64)
+
+        changed = added.index.union(pd.DatetimeIndex(days.astype("datetime64[ns]")).unique())
+        self.daily = daily[daily["household_count"] > 0]
+        os.remove(self._contribution_path(block))
+        del self.applied_blocks[block]
+        return changed.rename("day")
+
+    def _count_exact(self, month, days, hashes, energy):
+        """Sum every row's energy; count only pairs not already stored for ``month``"""
+        unique_pairs, first = np.unique(_pairs(days, hashes), return_index=True)
+        path = self._partition("members", month)
+        known = np.load(path) if os.path.exists(path) else np.empty(0, dtype=np.uint64)
+
+        position = np.searchsorted(known, unique_pairs).clip(max=max(len(known) - 1, 0))
+        fresh = ~(known[position] == unique_pairs) if len(known) else np.ones(len(unique_pairs), bool)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.save(path, np.union1d(known, unique_pairs))
+
+        day_keys, inverse = np.unique(days, return_inverse=True)
+        sums = np.bincount(inverse, weights=energy, minlength=len(day_keys))
+        new_households = np.bincount(inverse[first[fresh]], minlength=len(day_keys))
+        counts = self.daily["household_count"].reindex(day_keys, fill_value=0).to_numpy()
+        return day_keys, sums, counts + new_households
+
+    def _count_hll(self, month, days, hashes, energy):
+        """Merge the month's sketches with the new hashes and re-estimate"""
+        path = self._partition("registers", month)
+        first_day = np.datetime64(month, "D")
+        month_days = (np.datetime64(month, "M") + 1).astype("datetime64[D]") - first_day
+        if os.path.exists(path):
+            registers = np.load(path)
+        else:
+            registers = np.zeros((month_days.astype(int), 1 << self.precision), dtype=np.uint8)
+
+        rows = (days - first_day).astype(np.int64)
+        hll_update(registers, rows, hashes, self.precision)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.save(path, registers)
+
+        day_keys, inverse = np.unique(days, return_inverse=True)
+        sums = np.bincount(inverse, weights=energy, minlength=len(day_keys))
+        counts = np.rint(hll_estimate(registers[(day_keys - first_day).astype(np.int64)]))
+        return day_keys, sums, counts.astype(np.int64)
+
+    def append(self, frame, block=None, fingerprint=None):
+        """Fold ``day``/``LCLid``/``energy_sum`` rows into the store
+
+        When ``block`` is given, a block that was already applied is skipped
+        so re-running a refresh never double counts energy, unless it comes
+        with a different ``fingerprint``: then ``frame`` is a revision of
+        the block and replaces its earlier rows. Returns the days whose
+        aggregates changed.
+        """
+        removed = pd.DatetimeIndex([], name="day")
+        if block is not None and block in self.applied_blocks:
+            if fingerprint is None or fingerprint == self.applied_blocks[block]:
+                return removed
+            removed = self._remove_block(block)
+
+        days = pd.to_datetime(frame["day"]).to_numpy().astype("datetime64[D]")
+        hashes = _hash_households(frame["LCLid"])
+        energy = frame["energy_sum"].to_numpy(dtype=np.float64, na_value=0.0)
+
+        months = days.astype("datetime64[M]")
+        order = np.argsort(months, kind="stable")
+        days, hashes, energy, months = days[order], hashes[order], energy[order], months[order]
+        boundaries = np.flatnonzero(months[1:] != months[:-1]) + 1
+
+        count = self._count_exact if self.distinct == "exact" else self._count_hll
+        updates = []
+        added_days, added = [], []
+        for chunk in np.split(np.arange(len(days)), boundaries):
+            if not len(chunk):
+                continue
+            day_keys, sums, counts = count(
+                str(months[chunk[0]]), days[chunk], hashes[chunk], energy[chunk]
+            )
+            added_days.append(day_keys)
+            added.append(sums)
+            updates.append(pd.DataFrame(
+                {"energy_sum": sums, "household_count": counts},
+                index=pd.DatetimeIndex(day_keys.astype("datetime64[ns]"), name="day"),
+            ))
+
+        if updates:
+            update = pd.concat(updates)
+            energy_sum = self.daily["energy_sum"].reindex(update.index, fill_value=0.0)
+            update["energy_sum"] += energy_sum.to_numpy()
+            daily = self.daily.drop(update.index, errors="ignore")
+            self.daily = pd.concat([daily, update]).sort_index()
+            changed = update.index.union(removed)
+        else:
+            changed = removed
+        if len(changed):
+            self._write_daily()
+
+        if block is not None:
+            empty = np.empty(0, dtype="datetime64[D]")
+            self._write_contribution(block, days, hashes,
+                                     np.concatenate(added_days) if added_days else empty,
+                                     np.concatenate(added) if added else np.empty(0))
+            self.applied_blocks[block] = fingerprint
+        self._write_state()
+        return changed
+
+    def append_blocks(self, dataset_dir=DEFAULT_DATASET_DIR, blocks=None):
+        """Apply ingested blocks that are new or were rewritten since applied
+
+        ``blocks`` defaults to every block listed in the dataset manifest;
+        pass the numbers returned by ``ingest_blocks`` to refresh nightly.
+        A block is rewritten when its manifest fingerprint differs from the
+        one it was applied with.
+        """
+        fingerprints = block_fingerprints(dataset_dir)
+        if blocks is None:
+            blocks = sorted(fingerprints)
+        applied = []
+        for number in blocks:
+            fingerprint = fingerprints.get(number)
+            if number in self.applied_blocks and fingerprint in (None, self.applied_blocks[number]):
+                continue
+            self.append(load_energy(dataset_dir, blocks=[number]), block=number, fingerprint=fingerprint)
+            applied.append(number)
+        return applied
+
+    def to_frame(self):
+        """Return ``day``, ``energy_sum`` and the household count as ``LCLid``"""
+        frame = self.daily.rename(columns={"household_count": "LCLid"})
+        return frame.reset_index()
@@ -0,0 +1,241 @@
+"""Rolling-origin backtests of every model over the Evaluation test periods.
+
+Each test period is split into consecutive 30-day folds counted back from
+the end of the history; for every fold the model is fitted on the data
+before the fold origin and scored on the 30 days after it. Folds are
+aligned so the three test periods share them, and each distinct
+(model, target, origin) fold is fitted once in a process pool. The
+ensemble is not fitted at all: its folds stack the members' fold
+predictions with weights learned from the earlier folds only.
+
+Models are built with the settings ``order_search`` saved for each target
+(the SARIMAX order). Scores and fold predictions are appended to Parquet tables under
+``<DATA_DIR>/results``. The folds are also recorded in the ``ForecastStore``,
+issued at the last day before their origin, together with the actuals, so
+the Evaluation page scores them with SQL. ``BacktestScheduler`` runs a
+sweep on a background thread so the caller never waits for it.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from . import data, order_search
+from .cache import hash_series
+from .config import RESULTS_DIR
+from .ensemble import rolling_stack
+from .metrics import score
+from .models import MODELS, EnsembleForecaster, create_model, limit_threads
+from .store import BACKTEST, ForecastStore, describe_model
+
+METRICS_NAME = "backtest_metrics.parquet"
+PREDICTIONS_NAME = "backtest_predictions.parquet"
+
+# Days forecast from each origin, matching the notebook's 30-day test window
+HORIZON = 30
+
+TEST_PERIODS = {
+    "Last 3 Months": 3,
+    "Last 6 Months": 6,
+    "Last Year": 12,
+}
+
+TARGETS = ["Electricity Demand", "Price"]
+
+
+def fold_origins(length, folds, horizon=HORIZON):
+    """Positions of the last ``folds`` origins in a series of ``length``"""
+    origins = [length - horizon * k for k in range(folds, 0, -1)]
+    if origins[0] <= horizon:
+        raise ValueError(f"History of {length} points is too short for {folds} folds")
+    return origins
+
+
+def run_fold(model, series, origin, horizon=HORIZON, settings=None):
+    """Fit ``model`` before ``origin`` and forecast the following fold with an interval"""
+    actual = series.iloc[origin:origin + horizon]
+    fitted = create_model(model, **(settings or {})).fit(series.iloc[:origin])
+    forecast = fitted.forecast_interval(len(actual))
+    return pd.DataFrame({
+        "day": actual.index,
+        "actual": actual.to_numpy(dtype=np.float64),
+        "predicted": forecast["forecast"].to_numpy(dtype=np.float64),
+        "lower": forecast["lower"].to_numpy(dtype=np.float64),
+        "upper": forecast["upper"].to_numpy(dtype=np.float64),
+    })
+
+
+def run_sweep(models=None, targets=None, test_periods=None, workers=None,
+              results_dir=RESULTS_DIR, progress=None):
+    """Backtest every model x target x test period combination
+
+    ``workers`` defaults to one process per core. ``progress`` is called
+    with ``(completed, total)`` folds as they finish and may raise to abort
+    the sweep. Returns the metrics rows appended to the results table.
+    Requesting the ensemble also backtests (and records) its members.
+    """
+    models = list(models or MODELS)
+    targets = list(targets or TARGETS)
+    test_periods = list(test_periods or TEST_PERIODS)
+    most_folds = max(TEST_PERIODS[period] for period in test_periods)
+
+    ensemble = EnsembleForecaster.name
+    members = [name for name in EnsembleForecaster().members if name in MODELS]
+    fitted = [model for model in models if model != ensemble]
+    if ensemble in models:
+        fitted += [member for member in members if member not in fitted]
+        models = fitted + [ensemble]
+
+    histories = {target: data.load_series(target) for target in targets}
+    settings = {(model, target): order_search.model_settings(model, target, results_dir)
+                for model in models for target in targets}
+    origins = {target: fold_origins(len(series), most_folds) for target, series in histories.items()}
+    tasks = [(model, target, origin) for model in fitted for target in targets
+             for origin in origins[target]]
+
+    folds = {}
+    if progress is not None:
+        progress(0, len(tasks))
+    # Spawned workers avoid inheriting Streamlit's or TensorFlow's threads via fork
+    context = multiprocessing.get_context("spawn")
+    workers = workers or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=limit_threads, initargs=(workers,)) as pool:
+        futures = {pool.submit(run_fold, model, histories[target], origin, HORIZON,
+                               settings[(model, target)]): (model, target, origin)
+                   for model, target, origin in tasks}
+        try:
+            for done, future in enumerate(as_completed(futures), start=1):
+                folds[futures[future]] = future.result()
+                if progress is not None:
+                    progress(done, len(tasks))
+        except BaseException:
+            # A failed fold or a progress callback that raises (e.g. to
+            # cancel) drops the folds that have not started yet
+            for future in futures:
+                future.cancel()
+            raise
+
+    if ensemble in models:
+        for target in targets:
+            member_folds = [
+                folds[(members[0], target, origin)][["day", "actual"]].assign(**{
+                    member: folds[(member, target, origin)]["predicted"] for member in members})
+                for origin in origins[target]
+            ]
+            for origin, stacked in zip(origins[target], rolling_stack(member_folds)):
+                folds[(ensemble, target, origin)] = stacked
+
+    run_at = pd.Timestamp.now()
+    metric_rows, prediction_frames = [], []
+    for model in models:
+        for target in targets:
+            for period in test_periods:
+                used = origins[target][-TEST_PERIODS[period]:]
+                predictions = pd.concat([folds[(model, target, origin)] for origin in used],
+                                        ignore_index=True)
+                # Stacked ensemble folds have no interval to score
+                for metric, value in score(predictions["actual"], predictions["predicted"],
+                                           predictions.get("lower"), predictions.get("upper")).items():
+                    metric_rows.append((model, target, period, metric, value, run_at))
+                prediction_frames.append(predictions.assign(
+                    model=model, target=target, test_period=period, run_at=run_at))
+
+    _record(ForecastStore(results_dir), models, histories, origins, folds, settings)
+
+    metrics = pd.DataFrame(metric_rows, columns=["model", "target", "test_period",
+                                                 "metric", "value", "run_at"])
+    _append(os.path.join(results_dir, METRICS_NAME), metrics)
+    _append(os.path.join(results_dir, PREDICTIONS_NAME), pd.concat(prediction_frames, ignore_index=True))
+    return metrics
+
+
+def _record(store, models, histories, origins, folds, settings):
+    """Replace each model's stored folds with this sweep's"""
+    for target, series in histories.items():
+        store.record_actuals(target, series)
+        history = hash_series(series)
+        for model in models:
+            store.drop_stale(model, target, BACKTEST, history)
+            store.record(model, target, pd.concat([
+                folds[(model, target, origin)].rename(columns={"day": "valid_at", "predicted": "forecast"})
+                .assign(issued_at=series.index[origin - 1])
+                for origin in origins[target]
+            ], ignore_index=True), kind=BACKTEST, history=history,
+                metadata={**describe_model(create_model(model, **settings[(model, target)])),
+                          "horizon": HORIZON})
+
+
+def _append(path, frame):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if os.path.exists(path):
+        frame = pd.concat([pd.read_parquet(path), frame], ignore_index=True)
+    frame.to_parquet(path + ".tmp", index=False)
+    os.replace(path + ".tmp", path)
+
+
+def _latest(path, keys):
+    if not os.path.exists(path):
+        return None
+    frame = pd.read_parquet(path)
+    latest = frame.groupby(keys)["run_at"].transform("max")
+    return frame[frame["run_at"] == latest].reset_index(drop=True)
+
+
+def load_metrics(results_dir=RESULTS_DIR):
+    """Latest backtest score of every model/target/period/metric, or None"""
+    return _latest(os.path.join(results_dir, METRICS_NAME),
+                   ["model", "target", "test_period", "metric"])
+
+
+def load_predictions(results_dir=RESULTS_DIR):
+    """Fold predictions of the latest backtest of every combination, or None"""
+    return _latest(os.path.join(results_dir, PREDICTIONS_NAME),
+                   ["model", "target", "test_period"])
+
+
+class BacktestScheduler:
+    """Runs one backtest sweep at a time on a background thread"""
+
+    def __init__(self, workers=None, results_dir=RESULTS_DIR):
+        self.workers = workers
+        self.results_dir = results_dir
+        self._lock = threading.Lock()
+        self._thread = None
+        self._status = {"running": False, "completed": 0, "total": 0,
+                        "error": None, "finished_at": None}
+
+    def start(self, models=None, targets=None, test_periods=None):
+        """Start a sweep and return immediately; False if one is running"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+            self._status.update(running=True, completed=0, total=0, error=None)
+            self._thread = threading.Thread(
+                target=self._run, args=(models, targets, test_periods),
+                name="backtest-sweep", daemon=True,
+            )
+            self._thread.start()
+        return True
+
+    def status(self):
+        """Snapshot of the current or last sweep's progress"""
+        with self._lock:
+            return dict(self._status)
+
+    def _progress(self, completed, total):
+        with self._lock:
+            self._status.update(completed=completed, total=total)
+
+    def _run(self, models, targets, test_periods):
+        error = None
+        try:
+            run_sweep(models, targets, test_periods, workers=self.workers,
+                      results_dir=self.results_dir, progress=self._progress)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        with self._lock:
+            self._status.update(running=False, error=error, finished_at=pd.Timestamp.now())
@@ -0,0 +1,106 @@
+"""Batch forecasts of every model x target x duration for the front ends.
+
+Each (model, target) pair is forecast once in a process pool through
+``ForecastService`` (reusing the on-disk ``ModelCache`` when the history
+has not changed) over the longest requested duration; shorter durations
+are prefixes of it. Ensemble pairs run in a second wave, once their
+members' fits are in the cache, so they only load and stack them. The
+rows replace that pair's previous rows in ``<RESULTS_DIR>/forecasts.parquet``,
+which ``ForecastService`` serves from while the history they were made
+from is still current.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from . import data, order_search
+from .backtest import TARGETS
+from .cache import hash_series, hash_settings
+from .config import RESULTS_DIR
+from .models import MODELS, EnsembleForecaster, limit_threads
+from .service import DURATION_DAYS, FORECASTS_NAME, ForecastService, load_forecasts
+
+
+def forecast_pair(model, target, durations, results_dir=RESULTS_DIR):
+    """Forecast ``target`` with ``model`` over every duration in ``durations``"""
+    history = hash_series(data.load_series(target))
+    settings = hash_settings(order_search.model_settings(model, target, results_dir))
+    longest = ForecastService(results_dir=results_dir).forecast_interval(
+        model, target, max(durations, key=DURATION_DAYS.get))
+    frames = []
+    for duration in durations:
+        forecast = longest.iloc[:DURATION_DAYS[duration]]
+        frames.append(pd.DataFrame({
+            "model": model,
+            "target": target,
+            "duration": duration,
+            "history": history,
+            "settings": settings,
+            "day": forecast.index,
+            "forecast": forecast["forecast"].to_numpy(),
+            "lower": forecast["lower"].to_numpy(),
+            "upper": forecast["upper"].to_numpy(),
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def run_batch(models=None, targets=None, durations=None, workers=None,
+              results_dir=RESULTS_DIR, progress=None):
+    """Forecast every model x target x duration and store the results
+
+    ``workers`` defaults to one process per core. ``progress`` is called
+    with ``(completed, total)`` (model, target) pairs as they finish and may
+    raise to abort the run. Returns the rows written.
+    """
+    models = list(models or MODELS)
+    targets = list(targets or TARGETS)
+    durations = list(durations or DURATION_DAYS)
+    for duration in durations:
+        if duration not in DURATION_DAYS:
+            raise ValueError(f"Unknown forecast duration {duration!r}")
+    waves = [[(model, target) for model in models if model != EnsembleForecaster.name
+              for target in targets],
+             [(model, target) for model in models if model == EnsembleForecaster.name
+              for target in targets]]
+    total = sum(len(wave) for wave in waves)
+
+    frames = []
+    if progress is not None:
+        progress(0, total)
+    # Spawned workers avoid inheriting Streamlit's or TensorFlow's threads via fork
+    context = multiprocessing.get_context("spawn")
+    workers = workers or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=limit_threads, initargs=(workers,)) as pool:
+        for wave in waves:
+            futures = [pool.submit(forecast_pair, model, target, durations, results_dir)
+                       for model, target in wave]
+            try:
+                for future in as_completed(futures):
+                    frames.append(future.result())
+                    if progress is not None:
+                        progress(len(frames), total)
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+
+    forecasts = pd.concat(frames, ignore_index=True).assign(run_at=pd.Timestamp.now())
+    _replace(results_dir, forecasts)
+    return forecasts
+
+
+def _replace(results_dir, forecasts):
+    """Swap in the new rows of every (model, target, duration) they cover"""
+    keys = ["model", "target", "duration"]
+    previous = load_forecasts(results_dir)
+    if previous is not None:
+        fresh = pd.MultiIndex.from_frame(forecasts[keys].drop_duplicates())
+        stale = pd.MultiIndex.from_frame(previous[keys]).isin(fresh)
+        forecasts = pd.concat([previous[~stale], forecasts], ignore_index=True)
+    path = os.path.join(results_dir, FORECASTS_NAME)
+    os.makedirs(results_dir, exist_ok=True)
+    forecasts.to_parquet(path + ".tmp", index=False)
+    os.replace(path + ".tmp", path)
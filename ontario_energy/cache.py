@@ -0,0 +1,198 @@
+"""Two-level cache of fitted models keyed by (model, target, settings, data hash).
+
+Fitted models are held in process memory and pickled under
+``<CACHE_DIR>/models/v<version>/``. Bumping ``CACHE_VERSION`` when a model's
+definition changes makes every old entry unreachable without having to
+clean the directory by hand.
+
+``FeatureCache`` keeps model feature matrices under
+``<CACHE_DIR>/features/v<version>/`` for the models that are fitted on
+them over and over (every backtest fold, every refresh).
+"""
+import functools
+import glob
+import hashlib
+import json
+import os
+import pickle
+import threading
+
+import numpy as np
+import pandas as pd
+
+from .config import CACHE_DIR
+from .features import FeatureMatrix
+from .instrumentation import count, span
+
+CACHE_VERSION = 4
+
+
+def hash_series(series):
+    """Stable content hash of a Series, including its index"""
+    digest = hashlib.sha256(pd.util.hash_pandas_object(series, index=True).to_numpy().tobytes())
+    return digest.hexdigest()[:16]
+
+
+def hash_settings(settings):
+    """Stable short hash of a model's constructor arguments, ``"default"`` without any"""
+    if not settings:
+        return "default"
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()[:8]
+
+
+class ModelCache:
+    """Fitted-model cache shared by every caller in the process"""
+
+    def __init__(self, directory=os.path.join(CACHE_DIR, "models"), version=CACHE_VERSION):
+        self.directory = os.path.join(directory, f"v{version}")
+        self._memory = {}
+        self._lock = threading.Lock()
+        self._fit_locks = {}
+
+    def _path(self, key):
+        return os.path.join(self.directory, "-".join(str(part) for part in key) + ".pkl")
+
+    def get(self, key):
+        """Return the cached model for ``key`` or None"""
+        with self._lock:
+            if key in self._memory:
+                count("cache.model.memory_hit")
+                return self._memory[key]
+        try:
+            f = open(self._path(key), "rb")
+        except FileNotFoundError:
+            return None
+        with f, span("cache.model.load"):
+            fitted = pickle.load(f)
+        count("cache.model.disk_hit")
+        with self._lock:
+            self._memory[key] = fitted
+        return fitted
+
+    def put(self, key, fitted):
+        path = self._path(key)
+        os.makedirs(self.directory, exist_ok=True)
+        with span("cache.model.save"), open(path + ".tmp", "wb") as f:
+            pickle.dump(fitted, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + ".tmp", path)
+        with self._lock:
+            self._memory[key] = fitted
+
+    def latest(self, prefix):
+        """Most recently stored model whose key starts with ``prefix``, or None
+
+        Used to find the previous fit of a (model, target) pair after its
+        data changed, so it can be updated instead of refitted.
+        """
+        stem = "-".join(str(part) for part in prefix) + "-"
+        paths = glob.glob(os.path.join(glob.escape(self.directory), glob.escape(stem) + "*.pkl"))
+        if not paths:
+            return None
+        newest = os.path.basename(max(paths, key=os.path.getmtime))
+        return self.get(tuple(prefix) + (newest[len(stem):-len(".pkl")],))
+
+    def get_or_fit(self, key, fit):
+        """Return the model for ``key``, calling ``fit()`` only on a miss
+
+        Concurrent requests for the same key wait for a single fit instead
+        of each starting their own.
+        """
+        fitted = self.get(key)
+        if fitted is not None:
+            return fitted
+        with self._lock:
+            fit_lock = self._fit_locks.setdefault(key, threading.Lock())
+        with fit_lock:
+            fitted = self.get(key)
+            if fitted is None:
+                count("cache.model.miss")
+                fitted = fit()
+                self.put(key, fitted)
+        return fitted
+
+    def clear_memory(self):
+        with self._lock:
+            self._memory.clear()
+
+
+class FeatureCache:
+    """Feature matrices on disk, memory-mapped and shared between fits
+
+    Feature rows only depend on earlier values, so the matrix of a series
+    is a prefix of the matrix of any longer series with the same history.
+    A matrix is therefore keyed by the feature ``settings`` and the start
+    of the series, not its full content: a backtest fold (a prefix of the
+    history) is served as a slice of the cached matrix without copying it,
+    and a history that grew by a day only builds the new rows. A history
+    that was revised is rebuilt and replaces the cached matrix.
+    """
+
+    def __init__(self, directory=os.path.join(CACHE_DIR, "features"), version=CACHE_VERSION):
+        self.directory = os.path.join(directory, f"v{version}")
+
+    def _stem(self, values, index, settings, depth):
+        spacing = index[1] - index[0] if len(index) > 1 else None
+        digest = hashlib.sha256(repr((settings, str(index[0]), str(spacing))).encode())
+        digest.update(values[:depth].tobytes())
+        return os.path.join(self.directory, digest.hexdigest()[:16])
+
+    def _load(self, stem):
+        try:
+            with np.load(stem + ".npz") as meta:
+                history, start, names = meta["values"], int(meta["start"]), meta["names"].tolist()
+            X = np.load(stem + ".npy", mmap_mode="r")
+        except (FileNotFoundError, ValueError):
+            return None
+        # A writer may have replaced one file but not yet the other
+        if len(X) != len(history) - start:
+            return None
+        return history, start, names, X
+
+    def _save(self, stem, values, start, names, X):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = f"{stem}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, np.ascontiguousarray(X))
+        os.replace(tmp, stem + ".npy")
+        with open(tmp, "wb") as f:
+            np.savez(f, values=values, start=start, names=np.array(names))
+        os.replace(tmp, stem + ".npz")
+
+    def get(self, series, build, settings, depth):
+        """``FeatureMatrix`` of ``series``, reading and extending the cache
+
+        ``build(series)`` computes a matrix whose rows start after the
+        first ``depth`` values; ``settings`` are the arguments it depends on.
+        """
+        values = series.to_numpy(dtype=np.float64)
+        stem = self._stem(values, series.index, settings, depth)
+        cached = self._load(stem)
+        if cached is not None:
+            history, start, names, X = cached
+            if len(values) <= start:
+                # No cached row covers a history this short; keep the longer matrix
+                count("cache.features.miss")
+                return build(series)
+            overlap = min(len(history), len(values))
+            if np.array_equal(history[:overlap], values[:overlap], equal_nan=True):
+                if len(values) <= len(history):
+                    count("cache.features.hit")
+                    X = X[:len(values) - start]
+                else:
+                    count("cache.features.extend")
+                    # Only the new rows are built, from the ``start`` values before them
+                    new = build(series.iloc[len(history) - start:])
+                    X = np.concatenate([X, new.X])
+                    self._save(stem, values, start, names, X)
+                return FeatureMatrix(X, values[start:].astype(np.float32), series.index[start:], names)
+        count("cache.features.miss")
+        features = build(series)
+        start = len(values) - len(features.X)
+        self._save(stem, values, start, features.names, features.X)
+        return features
+
+
+@functools.lru_cache(maxsize=1)
+def feature_cache():
+    """``FeatureCache`` shared by every model in the process"""
+    return FeatureCache()
@@ -0,0 +1,201 @@
+"""Precomputed calendar events for Ontario as one flag byte per day.
+
+``CalendarService`` evaluates the statutory holiday, DST and school-break
+rules once for a span of days and keeps the result as a ``uint8`` bitset
+indexed by day offset. Flags for a date range are a slice of that array,
+and flags for any DatetimeIndex, including hourly ones, are a single
+integer gather. No merge or per-date Python comparison is needed.
+
+School breaks follow the usual public-board pattern (winter break from
+the Saturday before Christmas until classes resume on the first Monday
+on or after January 3, March break in the week of the first Monday on or
+after March 11, summer from Canada Day to Labour Day); pass ``breaks`` for
+a specific board's calendar.
+"""
+import datetime
+import functools
+
+import numpy as np
+import pandas as pd
+
+HOLIDAY = 1
+HOLIDAY_OBSERVED = 2
+DST_START = 4
+DST_END = 8
+SCHOOL_BREAK = 16
+SCHOOL_DAY = 32
+WEEKEND = 64
+
+# Feature column name of every flag, in column order
+EVENT_FLAGS = {
+    "holiday": HOLIDAY,
+    "holiday_observed": HOLIDAY_OBSERVED,
+    "dst_start": DST_START,
+    "dst_end": DST_END,
+    "school_break": SCHOOL_BREAK,
+    "school_day": SCHOOL_DAY,
+}
+
+DAY_NS = 24 * 3600 * 10 ** 9
+
+
+def easter(year):
+    """Easter Sunday of ``year`` (anonymous Gregorian algorithm)"""
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = b // 4, b % 4
+    g = (b - (b + 8) // 25 + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return datetime.date(year, month, day + 1)
+
+
+def nth_weekday(year, month, weekday, n):
+    """The ``n``-th ``weekday`` (Monday is 0) of a month; ``n=-1`` for the last"""
+    if n > 0:
+        first = datetime.date(year, month, 1)
+        return first + datetime.timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    following = datetime.date(year + month // 12, month % 12 + 1, 1)
+    last = following - datetime.timedelta(days=1)
+    return last - datetime.timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def ontario_holidays(year):
+    """Ontario statutory holidays of ``year`` by name"""
+    may_24 = datetime.date(year, 5, 24)
+    holidays = {
+        "New Year's Day": datetime.date(year, 1, 1),
+        "Good Friday": easter(year) - datetime.timedelta(days=2),
+        "Victoria Day": may_24 - datetime.timedelta(days=may_24.weekday()),
+        "Canada Day": datetime.date(year, 7, 1),
+        "Labour Day": nth_weekday(year, 9, 0, 1),
+        "Thanksgiving": nth_weekday(year, 10, 0, 2),
+        "Christmas Day": datetime.date(year, 12, 25),
+        "Boxing Day": datetime.date(year, 12, 26),
+    }
+    if year >= 2008:
+        holidays["Family Day"] = nth_weekday(year, 2, 0, 3)
+    return holidays
+
+
+def dst_transitions(year):
+    """Days Ontario clocks go forward and back in ``year``"""
+    if year >= 2007:
+        return nth_weekday(year, 3, 6, 2), nth_weekday(year, 11, 6, 1)
+    return nth_weekday(year, 4, 6, 1), nth_weekday(year, 10, 6, -1)
+
+
+def school_breaks(year):
+    """Approximate public-school breaks starting in ``year`` as (first, last) days
+
+    The winter break starting in ``year`` runs into January of the next year.
+    """
+    march_break = nth_weekday(year, 3, 0, 2)
+    if march_break.day < 11:
+        march_break += datetime.timedelta(days=7)
+    christmas = datetime.date(year, 12, 25)
+    winter_break = christmas - datetime.timedelta(days=(christmas.weekday() - 5) % 7 or 7)
+    # Classes resume on the first Monday on or after January 3, so a Sunday
+    # New Year's Day (observed on the 2nd) still gets a full week off
+    january_3 = datetime.date(year + 1, 1, 3)
+    resume = january_3 + datetime.timedelta(days=-january_3.weekday() % 7)
+    return [
+        (march_break, march_break + datetime.timedelta(days=4)),
+        (datetime.date(year, 7, 1), nth_weekday(year, 9, 0, 1)),
+        (winter_break, resume - datetime.timedelta(days=1)),
+    ]
+
+
+class CalendarService:
+    """Flag byte for every day from ``start`` to ``end``
+
+    ``holidays`` replaces the Ontario statutory holidays with a list of
+    dates (e.g. UK bank holidays) and ``breaks`` the school breaks with
+    (first, last) pairs; pass ``breaks=()`` for none.
+    """
+
+    def __init__(self, start="1990-01-01", end="2060-12-31", holidays=None, breaks=None):
+        self.start = pd.Timestamp(start).normalize()
+        self.end = pd.Timestamp(end).normalize()
+        days = pd.date_range(self.start, self.end, freq="D")
+        years = range(self.start.year, self.end.year + 1)
+        self._length = len(days)
+        flags = np.zeros(self._length, dtype=np.uint8)
+
+        if holidays is None:
+            holidays = [day for year in years for day in ontario_holidays(year).values()]
+        holiday_offsets = self._in_range(holidays)
+        flags[holiday_offsets] |= HOLIDAY
+
+        weekend = days.dayofweek.to_numpy() >= 5
+        flags[weekend] |= WEEKEND
+        # A holiday on a weekend is observed on the next free weekday
+        taken = set(holiday_offsets.tolist())
+        for offset in sorted(holiday_offsets[weekend[holiday_offsets]].tolist()):
+            observed = offset + 1
+            while observed < self._length and (weekend[observed] or observed in taken):
+                observed += 1
+            if observed < self._length:
+                flags[observed] |= HOLIDAY_OBSERVED
+                taken.add(observed)
+
+        for year in years:
+            spring, fall = dst_transitions(year)
+            flags[self._in_range([spring])] |= DST_START
+            flags[self._in_range([fall])] |= DST_END
+
+        if breaks is None:
+            # The previous year's winter break runs into the first January
+            breaks = [period for year in range(self.start.year - 1, self.end.year + 1)
+                      for period in school_breaks(year)]
+        for first, last in breaks:
+            lo = max(self._offset(first), 0)
+            hi = min(self._offset(last), self._length - 1)
+            if lo <= hi:
+                flags[lo:hi + 1] |= SCHOOL_BREAK
+
+        off = (flags & (HOLIDAY | HOLIDAY_OBSERVED | SCHOOL_BREAK | WEEKEND)) != 0
+        flags[~off] |= SCHOOL_DAY
+        flags.flags.writeable = False
+        self.flags = flags
+
+    def _offset(self, day):
+        return (pd.Timestamp(day).normalize() - self.start).days
+
+    def _in_range(self, days):
+        offsets = np.array([self._offset(day) for day in days], dtype=np.intp)
+        return offsets[(offsets >= 0) & (offsets < self._length)]
+
+    def range(self, start, end):
+        """Flags of every day from ``start`` to ``end`` inclusive, as a view"""
+        lo, hi = self._offset(start), self._offset(end)
+        if lo < 0 or hi >= self._length:
+            raise ValueError(f"{start} to {end} is outside the calendar's "
+                             f"{self.start.date()} to {self.end.date()}")
+        return self.flags[lo:hi + 1]
+
+    def lookup(self, index):
+        """Flags of the day of every timestamp in ``index`` (any frequency)"""
+        index = pd.DatetimeIndex(index)
+        offsets = (index.as_unit("ns").asi8 - self.start.value) // DAY_NS
+        if len(offsets) and (offsets.min() < 0 or offsets.max() >= self._length):
+            raise ValueError(f"{index.min()} to {index.max()} is outside the calendar's "
+                             f"{self.start.date()} to {self.end.date()}")
+        return self.flags[offsets]
+
+    def features(self, index, out=None):
+        """0/1 float32 column per ``EVENT_FLAGS`` entry for every row of ``index``"""
+        flags = self.lookup(index)
+        if out is None:
+            out = np.empty((len(flags), len(EVENT_FLAGS)), dtype=np.float32)
+        bits = np.array(list(EVENT_FLAGS.values()), dtype=np.uint8)
+        np.not_equal(flags[:, None] & bits[None, :], 0, out=out, casting="unsafe")
+        return out
+
+
+@functools.lru_cache(maxsize=1)
+def ontario_calendar():
+    """Shared ``CalendarService`` with the default Ontario rules"""
+    return CalendarService()
@@ -0,0 +1,232 @@
+"""Command-line entry point for running the core without a front end.
+
+    python -m ontario_energy forecast [--models ARIMA LSTM] [--workers 4]
+    python -m ontario_energy backtest [--test-periods "Last Year"]
+    python -m ontario_energy orders [--targets Price]
+    python -m ontario_energy ingest <csv_dir>
+    python -m ontario_energy hourly ingest <zonal_csv_dir>
+    python -m ontario_energy hourly fit [--months 6] [--full]
+    python -m ontario_energy hourly forecast [--hours 168]
+    python -m ontario_energy hourly reconcile [--groups clusters.csv] [--method mint]
+    python -m ontario_energy hourly train-lstm [--series "Zone 1"] [--replicas 4]
+    python -m ontario_energy diagnostics [--format prometheus]
+    python -m ontario_energy --profile cpu,memory <command> ...
+
+Schedule ``forecast`` (e.g. nightly from cron) and both front ends serve
+its results instead of fitting on request. Every command's stage timings
+are exported under ``<DATA_DIR>/diagnostics/`` (see ``instrumentation``);
+``diagnostics`` prints what every process exported last.
+"""
+import argparse
+import json
+import os
+import sys
+
+import pandas as pd
+
+from . import backtest, batch, hierarchy, hourly, instrumentation, order_search, training
+from .aggregates import DailyAggregateStore
+from .ingest import DEFAULT_DATASET_DIR, ingest_blocks
+from .models import MODELS
+from .service import DURATION_DAYS
+from .store import ForecastStore
+
+
+def _print_progress(label):
+    def progress(completed, total):
+        print(f"{label}: {completed}/{total}", file=sys.stderr, flush=True)
+    return progress
+
+
+def _forecast(args):
+    forecasts = batch.run_batch(args.models, args.targets, args.durations, workers=args.workers,
+                                results_dir=args.results_dir, progress=_print_progress("forecast"))
+    summary = forecasts.groupby(["model", "target", "duration"], sort=False)["forecast"].agg(["mean", "min", "max"])
+    print(summary.to_string())
+
+
+def _backtest(args):
+    metrics = backtest.run_sweep(args.models, args.targets, args.test_periods, workers=args.workers,
+                                 results_dir=args.results_dir, progress=_print_progress("backtest"))
+    print(metrics.pivot_table(index=["model", "target", "test_period"], columns="metric",
+                              values="value").to_string())
+
+
+def _orders(args):
+    results = order_search.search_targets(
+        args.targets, workers=args.workers, results_dir=args.results_dir,
+        progress=lambda target, done: print(f"{target}: {done} candidates", file=sys.stderr, flush=True))
+    for target, result in results.items():
+        print(f"{target}: SARIMAX{result.order}x{result.seasonal_order} trend={result.trend!r} "
+              f"AIC={result.aic:.1f} ({len(result.candidates)} candidates fitted)")
+
+
+def _ingest(args):
+    written = ingest_blocks(args.source_dir, args.dataset_dir, force=args.force)
+    print(f"Ingested {len(written)} block(s): {written}")
+    if not args.skip_aggregates:
+        applied = DailyAggregateStore().append_blocks(args.dataset_dir, written)
+        print(f"Added {len(applied)} block(s) to the daily aggregates")
+
+
+def _hourly_ingest(args):
+    written = hourly.ingest_hourly(args.source_dir, args.dataset_dir, pattern=args.pattern,
+                                   force=args.force)
+    print(f"Ingested {len(written)} month(s)" + (f": {written[0]} to {written[-1]}" if written else ""))
+
+
+def _hourly_fit(args):
+    model = hourly.fit_hourly(
+        args.dataset_dir, months=args.months, path=args.model_path, refresh=not args.full,
+        progress=lambda end: print(f"hourly fit: through {end}", file=sys.stderr, flush=True))
+    print(f"Fitted {len(model.series_)} series through {model.end_}")
+
+
+def _hourly_forecast(args):
+    model = hourly.HourlyForecaster.load(args.model_path)
+    forecasts = hourly.forecast_hourly(model, args.hours, ForecastStore(args.results_dir))
+    print(forecasts.agg(["mean", "min", "max"]).T.to_string())
+
+
+def _hourly_reconcile(args):
+    tree = hierarchy.load_groups(args.groups) if args.groups else hierarchy.default_hierarchy(args.dataset_dir)
+    model = hierarchy.fit_hierarchy(
+        tree, args.dataset_dir, months=args.months, path=args.model_path, refresh=not args.full,
+        progress=lambda end: print(f"hierarchy fit: through {end}", file=sys.stderr, flush=True))
+    base, reconciled = hierarchy.forecast_hierarchy(model, tree, args.hours, args.dataset_dir,
+                                                    method=args.method, store=ForecastStore(args.results_dir))
+    summary = pd.DataFrame({"base": base.mean(), "reconciled": reconciled.mean()})
+    print(summary.loc[tree.aggregates].to_string())
+    print(f"Reconciled {len(tree.bottom)} series to {tree.aggregates[0]} ({args.method})")
+
+
+def _hourly_train_lstm(args):
+    strategy = training.cpu_strategy(args.replicas)
+    for name in args.series or hourly.hourly_series(args.dataset_dir):
+        forecaster = training.train_zone_lstm(
+            name, args.dataset_dir, lags=args.lags, epochs=args.epochs, batch_size=args.batch_size,
+            patience=args.patience, strategy=strategy, directory=args.lstm_dir)
+        losses = forecaster.history_["val_loss"]
+        print(f"{name}: {len(losses)} epoch(s), best validation MAE {min(losses):.4f}", flush=True)
+
+
+def _diagnostics(args):
+    if args.format == "prometheus":
+        for name in sorted(os.listdir(args.directory)) if os.path.isdir(args.directory) else []:
+            if name.endswith(".prom"):
+                with open(os.path.join(args.directory, name)) as f:
+                    sys.stdout.write(f.read())
+        return
+    snapshots = instrumentation.load_exports(args.directory)
+    if args.format == "json":
+        print(json.dumps(snapshots, indent=1))
+        return
+    if not snapshots:
+        print(f"Nothing exported under {args.directory} yet")
+    for process, snapshot in snapshots.items():
+        exported = pd.Timestamp(snapshot["exported_at"], unit="s").floor("s")
+        print(f"== {process} (pid {snapshot['pid']}, exported {exported} UTC)")
+        spans = pd.DataFrame.from_dict(snapshot["spans"], orient="index")
+        if not spans.empty:
+            print(spans.sort_values("total", ascending=False).to_string(float_format="{:.4f}".format))
+        for name, value in snapshot["counters"].items():
+            print(f"{name}: {value}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="ontario_energy", description=__doc__.splitlines()[0])
+    parser.add_argument("--profile", help="capture cpu and/or memory profiles, e.g. cpu,memory")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_common(command):
+        command.add_argument("--models", nargs="+", choices=list(MODELS), help="default: all")
+        command.add_argument("--targets", nargs="+", choices=backtest.TARGETS, help="default: all")
+        command.add_argument("--workers", type=int, help="worker processes (default: one per core)")
+        command.add_argument("--results-dir", default=backtest.RESULTS_DIR)
+
+    forecast = commands.add_parser("forecast", help="batch forecasts for the Predict pages")
+    add_common(forecast)
+    forecast.add_argument("--durations", nargs="+", choices=list(DURATION_DAYS), help="default: all")
+    forecast.set_defaults(handler=_forecast)
+
+    sweep = commands.add_parser("backtest", help="rolling-origin backtests for the Evaluation pages")
+    add_common(sweep)
+    sweep.add_argument("--test-periods", nargs="+", choices=list(backtest.TEST_PERIODS),
+                       help="default: all")
+    sweep.set_defaults(handler=_backtest)
+
+    orders = commands.add_parser("orders", help="stepwise SARIMA order search per target")
+    orders.add_argument("--targets", nargs="+", choices=backtest.TARGETS, help="default: all")
+    orders.add_argument("--workers", type=int, help="worker processes (default: one per core)")
+    orders.add_argument("--results-dir", default=backtest.RESULTS_DIR)
+    orders.set_defaults(handler=_orders)
+
+    ingest = commands.add_parser("ingest", help="convert smart-meter CSV blocks to Parquet")
+    ingest.add_argument("source_dir")
+    ingest.add_argument("--dataset-dir", default=DEFAULT_DATASET_DIR)
+    ingest.add_argument("--force", action="store_true", help="rewrite unchanged blocks too")
+    ingest.add_argument("--skip-aggregates", action="store_true",
+                        help="do not update the daily aggregate store")
+    ingest.set_defaults(handler=_ingest)
+
+    hourly_parser = commands.add_parser("hourly", help="hourly zonal pipeline, one chunk at a time")
+    steps = hourly_parser.add_subparsers(dest="step", required=True)
+    hourly_ingest = steps.add_parser("ingest", help="convert IESO zonal demand CSVs to Parquet")
+    hourly_ingest.add_argument("source_dir")
+    hourly_ingest.add_argument("--pattern", default="*.csv")
+    hourly_ingest.add_argument("--force", action="store_true", help="rewrite unchanged files too")
+    hourly_ingest.set_defaults(handler=_hourly_ingest)
+    hourly_fit = steps.add_parser("fit", help="fit or extend the hourly model")
+    hourly_fit.add_argument("--months", type=int, default=6, help="months read per chunk")
+    hourly_fit.add_argument("--full", action="store_true", help="refit from the first month")
+    hourly_fit.set_defaults(handler=_hourly_fit)
+    hourly_forecast = steps.add_parser("forecast", help="forecast every zone and store the results")
+    hourly_forecast.add_argument("--hours", type=int, default=168)
+    hourly_forecast.add_argument("--results-dir", default=backtest.RESULTS_DIR)
+    hourly_forecast.set_defaults(handler=_hourly_forecast)
+    hourly_reconcile = steps.add_parser(
+        "reconcile", help="forecast every zone and the total, reconciled to add up")
+    hourly_reconcile.add_argument("--groups", help="CSV of series,group rows (e.g. household clusters)")
+    hourly_reconcile.add_argument("--method", choices=hierarchy.METHODS, default="mint")
+    hourly_reconcile.add_argument("--hours", type=int, default=168)
+    hourly_reconcile.add_argument("--months", type=int, default=6, help="months read per chunk")
+    hourly_reconcile.add_argument("--full", action="store_true", help="refit from the first month")
+    hourly_reconcile.add_argument("--model-path", default=hierarchy.DEFAULT_MODEL_PATH)
+    hourly_reconcile.add_argument("--results-dir", default=backtest.RESULTS_DIR)
+    hourly_reconcile.set_defaults(handler=_hourly_reconcile)
+    hourly_lstm = steps.add_parser("train-lstm", help="train a sequence LSTM per zone, data-parallel")
+    hourly_lstm.add_argument("--series", nargs="+", help="default: every series in the dataset")
+    hourly_lstm.add_argument("--lags", type=int, default=168, help="hours in each input sequence")
+    hourly_lstm.add_argument("--epochs", type=int, default=50)
+    hourly_lstm.add_argument("--batch-size", type=int, default=256)
+    hourly_lstm.add_argument("--patience", type=int, default=5, help="epochs without improvement")
+    hourly_lstm.add_argument("--replicas", type=int, help="data-parallel replicas (default: one per core)")
+    hourly_lstm.add_argument("--lstm-dir", default=training.LSTM_DIR)
+    hourly_lstm.set_defaults(handler=_hourly_train_lstm)
+    for step in (hourly_ingest, hourly_fit, hourly_reconcile, hourly_lstm):
+        step.add_argument("--dataset-dir", default=hourly.HOURLY_DIR)
+    for step in (hourly_fit, hourly_forecast):
+        step.add_argument("--model-path", default=hourly.DEFAULT_MODEL_PATH)
+
+    diagnostics = commands.add_parser("diagnostics", help="stage timings and cache counters exported so far")
+    diagnostics.add_argument("--format", choices=["table", "json", "prometheus"], default="table")
+    diagnostics.add_argument("--directory", default=instrumentation.DIAGNOSTICS_DIR)
+    diagnostics.set_defaults(handler=_diagnostics)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == "diagnostics":
+        args.handler(args)
+        return 0
+    try:
+        profile = instrumentation.profile_setting(args.profile)
+    except ValueError as error:
+        parser.error(str(error))
+    instrumentation.set_process("cli")
+    name = ".".join(part for part in ("cli", args.command, getattr(args, "step", None)) if part)
+    with instrumentation.request(name, profile=profile):
+        args.handler(args)
+    return 0
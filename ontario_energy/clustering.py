@@ -0,0 +1,125 @@
+"""Weather-regime clustering of daily weather rows.
+
+``elbow_scores`` runs the notebook's k = 1..19 elbow search as one chain of
+single-initialisation KMeans fits, each warm-started from the previous k's
+centroids plus the worst-fitted day, instead of 19 independent fits with
+fresh k-means++ seeding. Large inputs switch to mini-batch KMeans.
+
+``WeatherClusterer`` keeps only the min-max scaling and the centroids, so
+it can be saved as a few small arrays. ``assign`` labels new days by their
+nearest centroid and ``partial_fit`` folds them into the centroids with the
+mini-batch running-mean update, both in time proportional to the new days.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from .config import DATA_DIR
+
+CLUSTER_FEATURES = ["temperatureMax", "humidity", "windSpeed"]
+
+DEFAULT_PATH = os.path.join(DATA_DIR, "models", "weather_clusters.npz")
+
+
+def _squared_distances(X, centers):
+    """(rows, clusters) squared Euclidean distances without a 3-D temporary"""
+    return ((X * X).sum(axis=1)[:, None] - 2 * X @ centers.T
+            + (centers * centers).sum(axis=1)[None, :])
+
+
+def elbow_scores(X, ks=range(1, 20), mini_batch=None, batch_size=4096, seed=0):
+    """KMeans score (negative inertia) of ``X`` for every k in ``ks``
+
+    Each k starts from the centroids of the previous k plus the row that
+    was furthest from them, so every fit converges in a few iterations.
+    ``mini_batch`` defaults to True above 50,000 rows.
+    """
+    from sklearn.cluster import KMeans, MiniBatchKMeans
+
+    X = np.asarray(X, dtype=np.float64)
+    if mini_batch is None:
+        mini_batch = len(X) > 50_000
+    scores = {}
+    centers = None
+    for k in sorted(ks):
+        if centers is None or len(centers) >= k:
+            init = "k-means++"
+        else:
+            distances = _squared_distances(X, centers).min(axis=1)
+            init = np.vstack([centers, X[np.argmax(distances)]])
+        if mini_batch:
+            model = MiniBatchKMeans(n_clusters=k, init=init, n_init=1,
+                                    batch_size=batch_size, random_state=seed)
+        else:
+            model = KMeans(n_clusters=k, init=init, n_init=1, random_state=seed)
+        centers = model.fit(X).cluster_centers_
+        scores[k] = -float(np.maximum(_squared_distances(X, centers), 0).min(axis=1).sum())
+    return pd.Series(scores, name="score").rename_axis("k")
+
+
+class WeatherClusterer:
+    """Min-max scaling plus KMeans centroids over ``features``"""
+
+    def __init__(self, n_clusters=3, features=CLUSTER_FEATURES, max_iter=600, seed=0):
+        self.n_clusters = n_clusters
+        self.features = list(features)
+        self.max_iter = max_iter
+        self.seed = seed
+
+    def _scaled(self, frame):
+        values = frame[self.features].to_numpy(dtype=np.float64)
+        return (values - self.data_min_) / self.data_range_
+
+    def fit(self, frame):
+        """Fit the scaling and centroids on every row of ``frame``"""
+        from sklearn.cluster import KMeans
+
+        values = frame[self.features].to_numpy(dtype=np.float64)
+        self.data_min_ = values.min(axis=0)
+        data_range = values.max(axis=0) - self.data_min_
+        # Constant columns are left unscaled, as MinMaxScaler does
+        self.data_range_ = np.where(data_range == 0, 1.0, data_range)
+        model = KMeans(n_clusters=self.n_clusters, max_iter=self.max_iter,
+                       random_state=self.seed).fit(self._scaled(frame))
+        self.centers_ = model.cluster_centers_
+        self.counts_ = np.bincount(model.labels_, minlength=self.n_clusters).astype(np.int64)
+        return self
+
+    def fit_predict(self, frame):
+        return self.fit(frame).assign(frame)
+
+    def assign(self, frame):
+        """Index of the nearest centroid for every row of ``frame``"""
+        return _squared_distances(self._scaled(frame), self.centers_).argmin(axis=1)
+
+    def partial_fit(self, frame):
+        """Assign new rows and move each centroid to the running mean of its days
+
+        Returns the labels of the new rows; the earlier days keep theirs.
+        """
+        X = self._scaled(frame)
+        labels = _squared_distances(X, self.centers_).argmin(axis=1)
+        added = np.bincount(labels, minlength=self.n_clusters)
+        sums = np.zeros_like(self.centers_)
+        np.add.at(sums, labels, X)
+        self.counts_ += added
+        touched = added > 0
+        self.centers_[touched] += (sums[touched] - added[touched, None] * self.centers_[touched]) \
+            / self.counts_[touched, None]
+        return labels
+
+    def save(self, path=DEFAULT_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez(path, features=np.array(self.features), data_min=self.data_min_,
+                 data_range=self.data_range_, centers=self.centers_, counts=self.counts_)
+
+    @classmethod
+    def load(cls, path=DEFAULT_PATH):
+        with np.load(path) as arrays:
+            clusterer = cls(n_clusters=len(arrays["centers"]), features=arrays["features"].tolist())
+            clusterer.data_min_ = arrays["data_min"]
+            clusterer.data_range_ = arrays["data_range"]
+            clusterer.centers_ = arrays["centers"].copy()
+            clusterer.counts_ = arrays["counts"].copy()
+        return clusterer
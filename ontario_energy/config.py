@@ -0,0 +1,12 @@
+"""Default locations for data, caches and results.
+
+Everything lives under ``ONTARIO_ENERGY_DATA`` (``data/`` by default) so a
+server deployment can point the front ends and batch jobs at one directory.
+"""
+import os
+
+DATA_DIR = os.environ.get("ONTARIO_ENERGY_DATA", "data")
+
+CACHE_DIR = os.path.join(DATA_DIR, "cache")
+
+RESULTS_DIR = os.path.join(DATA_DIR, "results")
@@ -0,0 +1,199 @@
+"""Pre-aggregated (year, month, day-of-week, hour) cube of a series.
+
+Heat maps, monthly bar charts and seasonal profiles only ever need sums,
+counts and extremes over those four calendar keys, so ``AggregationCube``
+keeps exactly that in dense arrays and answers every query by reducing a
+slice of them. Each calendar month's rows are fingerprinted, and an update
+re-folds only the months whose fingerprint changed: the month holding new
+rows, new months, and months whose history was revised. Keeping the cube
+current costs one hash per row plus time proportional to those months.
+
+Periods are whole calendar months (see ``month_window``), so line charts of
+the raw series and the cube's tables cover the same days.
+"""
+import numpy as np
+import pandas as pd
+
+AXES = ("year", "month", "dayofweek", "hour")
+
+STATS = ("mean", "sum", "count", "min", "max")
+
+
+def month_window(first, last, months):
+    """``[start, stop)`` of the last ``months`` complete calendar months of data
+
+    The data runs from ``first`` to ``last``. The month of ``last`` counts
+    as complete when ``last`` falls on its final day, or when the data does
+    not hold any complete month.
+    """
+    stop = last.to_period("M").to_timestamp()
+    if last.normalize() == stop + pd.offsets.MonthEnd(0) or first >= stop:
+        stop += pd.DateOffset(months=1)
+    return stop - pd.DateOffset(months=months), stop
+
+
+def _month_digests(index, row_hashes):
+    """(year, month) keys and the combined row hashes of each month of a sorted index"""
+    serial = index.year.to_numpy() * 12 + index.month.to_numpy() - 1
+    starts = np.flatnonzero(np.r_[True, serial[1:] != serial[:-1]])
+    return serial[starts], np.add.reduceat(row_hashes, starts)
+
+
+class AggregationCube:
+    """Sum, count, min and max of a series by year, month, weekday and hour"""
+
+    def __init__(self):
+        self.first_year = None
+        self.watermark = None
+        shape = (0, 12, 7, 24)
+        self.sum = np.zeros(shape)
+        self.count = np.zeros(shape, dtype=np.int64)
+        self.min = np.full(shape, np.inf)
+        self.max = np.full(shape, -np.inf)
+        self.digests = np.zeros(shape[:2], dtype=np.uint64)
+
+    def _grow(self, first_year, last_year):
+        if self.first_year is None:
+            self.first_year = first_year
+        elif first_year < self.first_year:
+            raise ValueError("Cannot add observations older than the cube's first year")
+        extra = last_year - self.first_year + 1 - self.sum.shape[0]
+        if extra > 0:
+            padding = ((0, extra), (0, 0), (0, 0), (0, 0))
+            self.sum = np.pad(self.sum, padding)
+            self.count = np.pad(self.count, padding)
+            self.min = np.pad(self.min, padding, constant_values=np.inf)
+            self.max = np.pad(self.max, padding, constant_values=-np.inf)
+            self.digests = np.pad(self.digests, padding[:2])
+
+    def update(self, series):
+        """Re-fold the months of ``series`` that changed; return how many rows were folded
+
+        ``series`` is the whole history, sorted by time. Months whose rows
+        differ from the ones folded before (or that no longer have any) are
+        cleared and folded again from ``series``.
+        """
+        series = series.dropna()
+        if series.empty:
+            return 0
+        index = series.index
+        self._grow(int(index[0].year), int(index[-1].year))
+
+        keys, digests = _month_digests(index, pd.util.hash_pandas_object(series, index=True).to_numpy())
+        offset = self.first_year * 12
+        current = np.zeros_like(self.digests)
+        current.reshape(-1)[keys - offset] = digests
+        stale = current != self.digests
+        if not stale.any():
+            return 0
+        self.sum[stale], self.count[stale] = 0.0, 0
+        self.min[stale], self.max[stale] = np.inf, -np.inf
+        self.digests = current
+        self.watermark = index[-1]
+
+        serial = index.year.to_numpy() * 12 + index.month.to_numpy() - 1
+        series = series[stale.reshape(-1)[serial - offset]]
+        index = series.index
+        years = index.year.to_numpy()
+        cells = np.ravel_multi_index(
+            (years - self.first_year, index.month.to_numpy() - 1,
+             index.dayofweek.to_numpy(), index.hour.to_numpy()),
+            self.sum.shape,
+        )
+        values = series.to_numpy(dtype=np.float64)
+
+        size = self.sum.size
+        self.sum += np.bincount(cells, weights=values, minlength=size).reshape(self.sum.shape)
+        self.count += np.bincount(cells, minlength=size).reshape(self.count.shape)
+
+        # Extremes per touched cell via one sort and a segmented reduce
+        order = np.argsort(cells, kind="stable")
+        cells, values = cells[order], values[order]
+        starts = np.flatnonzero(np.r_[True, cells[1:] != cells[:-1]])
+        touched = cells[starts]
+        flat_min, flat_max = self.min.reshape(-1), self.max.reshape(-1)
+        flat_min[touched] = np.minimum(flat_min[touched], np.minimum.reduceat(values, starts))
+        flat_max[touched] = np.maximum(flat_max[touched], np.maximum.reduceat(values, starts))
+        return len(series)
+
+    def _month_mask(self, months):
+        """(year, month) cells within the last ``months`` complete calendar months"""
+        years = self.first_year + np.arange(self.sum.shape[0])
+        serial = years[:, None] * 12 + np.arange(12)[None, :]
+        if months is None:
+            return np.ones(serial.shape, dtype=bool)
+        first = serial.reshape(-1)[np.flatnonzero(self.count.sum(axis=(2, 3)))[0]]
+        start, stop = month_window(pd.Timestamp(year=first // 12, month=first % 12 + 1, day=1),
+                                   self.watermark, months)
+        return (serial >= start.year * 12 + start.month - 1) & (serial < stop.year * 12 + stop.month - 1)
+
+    def reduce(self, keep, months=None, stat="mean"):
+        """Reduce every axis not in ``keep`` over the last ``months`` months
+
+        Returns an array with one dimension per name in ``keep`` (in cube
+        axis order). Cells without observations are NaN.
+        """
+        if stat not in STATS:
+            raise ValueError(f"stat must be one of {STATS}, not {stat!r}")
+        if self.first_year is None:
+            raise ValueError("The cube is empty")
+        axes = tuple(i for i, name in enumerate(AXES) if name not in keep)
+        mask = self._month_mask(months)[:, :, None, None]
+
+        count = np.where(mask, self.count, 0).sum(axis=axes)
+        if stat == "count":
+            return count.astype(np.float64)
+        if stat == "min":
+            result = np.where(mask, self.min, np.inf).min(axis=axes)
+        elif stat == "max":
+            result = np.where(mask, self.max, -np.inf).max(axis=axes)
+        else:
+            result = np.where(mask, self.sum, 0.0).sum(axis=axes)
+            if stat == "mean":
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    result = result / count
+        return np.where(count > 0, result, np.nan)
+
+    def heatmap(self, rows="month", columns="hour", months=None, stat="mean"):
+        """2-D table of ``stat`` by two calendar keys, e.g. month by hour"""
+        keep = (rows, columns)
+        table = self.reduce(keep, months, stat)
+        if AXES.index(rows) > AXES.index(columns):
+            table = table.T
+        frame = pd.DataFrame(table, index=self._labels(rows), columns=self._labels(columns))
+        return frame.dropna(how="all").dropna(axis=1, how="all")
+
+    def monthly(self, months=None, stat="mean"):
+        """``stat`` per calendar month, indexed by month start"""
+        table = self.reduce(("year", "month"), months, stat).reshape(-1)
+        index = pd.date_range(f"{self.first_year}-01-01", periods=len(table), freq="MS")
+        return pd.Series(table, index=index).dropna()
+
+    def profile(self, by="hour", months=None, stat="mean"):
+        """Seasonal profile: ``stat`` by one calendar key"""
+        return pd.Series(self.reduce((by,), months, stat), index=self._labels(by)).dropna()
+
+    def _labels(self, axis):
+        if axis == "year":
+            return pd.Index(self.first_year + np.arange(self.sum.shape[0]), name="year")
+        if axis == "month":
+            return pd.Index(np.arange(1, 13), name="month")
+        if axis == "dayofweek":
+            return pd.Index(np.arange(7), name="dayofweek")
+        return pd.Index(np.arange(24), name="hour")
+
+    def save(self, path):
+        np.savez(path, sum=self.sum, count=self.count, min=self.min, max=self.max,
+                 digests=self.digests, first_year=self.first_year, watermark=self.watermark.value)
+
+    @classmethod
+    def load(cls, path):
+        cube = cls()
+        with np.load(path) as arrays:
+            cube.sum, cube.count = arrays["sum"], arrays["count"]
+            cube.min, cube.max = arrays["min"], arrays["max"]
+            # Cubes saved without digests have every month folded again
+            cube.digests = arrays["digests"] if "digests" in arrays else np.zeros(cube.sum.shape[:2], np.uint64)
+            cube.first_year = int(arrays["first_year"])
+            cube.watermark = pd.Timestamp(int(arrays["watermark"]))
+        return cube
@@ -0,0 +1,173 @@
+"""Loading of the forecast targets and the Visualization data sources.
+
+Real series are read from ``<DATA_DIR>/targets/<slug>.parquet`` with ``day``
+and ``value`` columns (e.g. daily IESO demand or HOEP price), and from
+``<DATA_DIR>/sources/<slug>.parquet`` with ``time`` and ``value`` columns
+(e.g. hourly IESO demand). When a series has not been loaded yet the
+deterministic demo history is used instead, so the front ends keep working
+on a fresh checkout.
+
+Loads are memoised per file version, and per (source, period) for the
+Visualization sources, so repeated requests never re-read or re-slice.
+Calendar aggregates of a source come from an ``AggregationCube`` that is
+kept under ``<DATA_DIR>/cache/cubes`` and only re-folds the months that
+changed. Periods are whole calendar months for every chart, so the raw
+series and the cube cover the same days.
+"""
+import functools
+import os
+
+import pandas as pd
+
+from . import synthetic
+from .config import CACHE_DIR, DATA_DIR
+from .cube import AggregationCube, month_window
+from .instrumentation import timed
+
+TARGETS_DIR = os.path.join(DATA_DIR, "targets")
+SOURCES_DIR = os.path.join(DATA_DIR, "sources")
+CUBES_DIR = os.path.join(CACHE_DIR, "cubes")
+
+SOURCES = {
+    "IESO Historical Data": {"title": "Ontario Energy Demand", "y_label": "Energy Demand (MW)",
+                             "demo": synthetic.hourly_demand},
+    "Weather Data": {"title": "Ontario Temperature", "y_label": "Temperature (°C)",
+                     "demo": synthetic.daily_temperature},
+    "Economic Indicators": {"title": "Ontario Economic Index", "y_label": "Index Value",
+                            "demo": synthetic.economic_index},
+}
+
+# Periods in complete calendar months (see ``cube.month_window``), the
+# resolution of the cubes
+PERIOD_MONTHS = {
+    "Last Month": 1,
+    "Last 6 Months": 6,
+    "Last Year": 12,
+    "Last 5 Years": 60,
+}
+
+
+def slugify(name):
+    """Turn a display name like ``"Electricity Demand"`` into a file stem"""
+    return "".join(c if c.isalnum() else "_" for c in name.lower()).strip("_")
+
+
+def target_path(target, targets_dir=TARGETS_DIR):
+    return os.path.join(targets_dir, f"{slugify(target)}.parquet")
+
+
+@functools.lru_cache(maxsize=32)
+@timed("data.read_target")
+def _read_target(path, mtime):
+    # ``mtime`` is only part of the cache key, so a rewritten file is reloaded
+    frame = pd.read_parquet(path, columns=["day", "value"])
+    series = frame.set_index(pd.DatetimeIndex(frame["day"], name="day"))["value"]
+    return series.sort_index().asfreq("D")
+
+
+@functools.lru_cache(maxsize=32)
+@timed("data.demo_target")
+def _demo_target(target, end):
+    return synthetic.target_series(target, end=end)
+
+
+def load_series(target, targets_dir=TARGETS_DIR):
+    """Return the daily history of ``target`` as a float Series
+
+    The returned Series is shared between callers and must not be modified.
+    """
+    path = target_path(target, targets_dir)
+    if os.path.exists(path):
+        series = _read_target(path, os.path.getmtime(path))
+    else:
+        series = _demo_target(target, pd.Timestamp.now().normalize() - pd.Timedelta(days=1))
+    return series.rename(target)
+
+
+def is_demo(target, targets_dir=TARGETS_DIR):
+    """True when ``target`` has no real data and the demo series is used"""
+    return not os.path.exists(target_path(target, targets_dir))
+
+
+def source_path(source, sources_dir=SOURCES_DIR):
+    return os.path.join(sources_dir, f"{slugify(source)}.parquet")
+
+
+def source_version(source, sources_dir=SOURCES_DIR):
+    """Token that changes whenever the data behind ``source`` changes"""
+    path = source_path(source, sources_dir)
+    if os.path.exists(path):
+        return f"file:{os.path.getmtime(path)}"
+    return f"demo:{pd.Timestamp.now().floor('h')}"
+
+
+@functools.lru_cache(maxsize=16)
+@timed("data.read_source")
+def _read_source(path, mtime, name):
+    frame = pd.read_parquet(path, columns=["time", "value"])
+    series = frame.set_index(pd.DatetimeIndex(frame["time"], name="time"))["value"]
+    return series.sort_index().rename(name)
+
+
+@functools.lru_cache(maxsize=64)
+def _load_source(source, period, version, sources_dir):
+    path = source_path(source, sources_dir)
+    if version.startswith("file:"):
+        series = _read_source(path, os.path.getmtime(path), SOURCES[source]["y_label"])
+    else:
+        series = SOURCES[source]["demo"](end=pd.Timestamp(version[len("demo:"):]))
+    if period is None:
+        return series
+    start, stop = month_window(series.index[0], series.index[-1], PERIOD_MONTHS[period])
+    # Positional slicing of a sorted index is a view, not a copy
+    first, last = series.index.searchsorted([start, stop])
+    return series.iloc[first:last]
+
+
+def load_source(source, period=None, sources_dir=SOURCES_DIR):
+    """Full-resolution history of a Visualization source over ``period``
+
+    Results are memoised per (source, period, data version) and shared
+    between callers, so they must not be modified.
+    """
+    if source not in SOURCES:
+        raise ValueError(f"Unknown data source {source!r}")
+    if period is not None and period not in PERIOD_MONTHS:
+        raise ValueError(f"Unknown time period {period!r}")
+    return _load_source(source, period, source_version(source, sources_dir), sources_dir)
+
+
+@functools.lru_cache(maxsize=16)
+@timed("data.load_cube")
+def _load_cube(source, version, sources_dir, cubes_dir):
+    series = _load_source(source, None, version, sources_dir)
+    if not version.startswith("file:"):
+        # The demo history moves with the clock, so it is rebuilt, not extended
+        cube = AggregationCube()
+        cube.update(series)
+        return cube
+    path = os.path.join(cubes_dir, f"{slugify(source)}.npz")
+    cube = AggregationCube.load(path) if os.path.exists(path) else AggregationCube()
+    try:
+        added = cube.update(series)
+    except ValueError:
+        # History was rewritten before the cube's first year; start over
+        cube = AggregationCube()
+        added = cube.update(series)
+    if added:
+        os.makedirs(cubes_dir, exist_ok=True)
+        cube.save(path + ".tmp.npz")
+        os.replace(path + ".tmp.npz", path)
+    return cube
+
+
+def load_cube(source, sources_dir=SOURCES_DIR, cubes_dir=CUBES_DIR):
+    """(year, month, weekday, hour) ``AggregationCube`` of a source
+
+    The persisted cube of a file-backed source re-folds only the months
+    whose rows were added or revised instead of being rebuilt. Cubes are
+    shared between callers and must not be modified.
+    """
+    if source not in SOURCES:
+        raise ValueError(f"Unknown data source {source!r}")
+    return _load_cube(source, source_version(source, sources_dir), sources_dir, cubes_dir)
@@ -0,0 +1,74 @@
+"""Reduce long series to roughly one point per horizontal pixel before plotting.
+
+``lttb`` (Largest-Triangle-Three-Buckets) keeps the visual shape of a line
+chart; ``minmax`` keeps every bucket's extremes, which suits scatter plots
+and spiky data. Both return the series unchanged when it is already short.
+"""
+import numpy as np
+import pandas as pd
+
+# A 10-inch matplotlib figure at the default 100 dpi
+PLOT_POINTS = 1000
+
+
+def _bucket_edges(length, buckets):
+    # First and last points are kept on their own, the rest split evenly
+    return np.linspace(1, length - 1, buckets + 1).astype(np.intp)
+
+
+def lttb(series, points=PLOT_POINTS):
+    """Largest-Triangle-Three-Buckets downsampling to ``points`` points"""
+    if len(series) <= points or points < 3:
+        return series
+    x = series.index.asi8.astype(np.float64) if isinstance(series.index, pd.DatetimeIndex) \
+        else np.arange(len(series), dtype=np.float64)
+    y = series.to_numpy(dtype=np.float64)
+
+    edges = _bucket_edges(len(series), points - 2)
+    # Average of every bucket, used as the third vertex for the bucket before it
+    counts = np.diff(edges)
+    mean_x = np.add.reduceat(x[:-1], edges[:-1])[:len(counts)] / counts
+    mean_y = np.add.reduceat(y[:-1], edges[:-1])[:len(counts)] / counts
+
+    selected = np.empty(points, dtype=np.intp)
+    selected[0], selected[-1] = 0, len(series) - 1
+    previous = 0
+    for bucket in range(points - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        if bucket + 1 < len(counts):
+            next_x, next_y = mean_x[bucket + 1], mean_y[bucket + 1]
+        else:
+            next_x, next_y = x[-1], y[-1]
+        # Twice the triangle area for every candidate in the bucket at once
+        area = np.abs((x[previous] - next_x) * (y[start:stop] - y[previous])
+                      - (x[previous] - x[start:stop]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(area))
+        selected[bucket + 1] = previous
+    return series.iloc[selected]
+
+
+def minmax(series, points=PLOT_POINTS):
+    """Keep the minimum and maximum of ``points // 2`` equal-width buckets"""
+    if len(series) <= points:
+        return series
+    y = series.to_numpy(dtype=np.float64)
+    size = -(-len(y) // (points // 2))
+    rows = -(-len(y) // size)
+    # Pad the last bucket so every bucket is one row of a 2-D view
+    padded = np.full(rows * size, np.nan)
+    padded[:len(y)] = y
+    blocks = padded.reshape(rows, size)
+    missing = np.isnan(blocks)
+    offsets = np.arange(rows) * size
+    lows = offsets + np.where(missing, np.inf, blocks).argmin(axis=1)
+    highs = offsets + np.where(missing, -np.inf, blocks).argmax(axis=1)
+    return series.iloc[np.unique(np.concatenate([lows, highs]))]
+
+
+def downsample(series, points=PLOT_POINTS, method="lttb"):
+    """Downsample with ``"lttb"`` or ``"minmax"``"""
+    if method == "lttb":
+        return lttb(series, points)
+    if method == "minmax":
+        return minmax(series, points)
+    raise ValueError(f"Unknown downsampling method {method!r}")
@@ -0,0 +1,82 @@
+"""Stacked "ARIMA + LSTM + XGBoost" ensemble weights and combination.
+
+The ensemble never fits anything of its own: it combines member forecasts
+that are cached elsewhere (``ModelCache``, the batch forecasts table, the
+backtest folds) with non-negative weights learned from the members'
+backtest predictions. Changing the weights is a weighted sum, not a refit.
+"""
+import numpy as np
+import pandas as pd
+
+MEMBERS = ("ARIMA", "LSTM", "XGBoost")
+
+
+def stacking_weights(actual, predictions):
+    """Non-negative weights summing to one that best fit ``actual``
+
+    ``predictions`` has one column per member. Falls back to equal weights
+    when there is nothing to learn from.
+    """
+    from scipy.optimize import nnls
+
+    predictions = pd.DataFrame(predictions)
+    frame = predictions.assign(_actual=np.asarray(actual, dtype=np.float64)).dropna()
+    equal = pd.Series(1.0 / predictions.shape[1], index=predictions.columns)
+    if len(frame) < predictions.shape[1]:
+        return equal
+    weights, _ = nnls(frame[predictions.columns].to_numpy(dtype=np.float64),
+                      frame["_actual"].to_numpy())
+    if weights.sum() <= 0:
+        return equal
+    return pd.Series(weights / weights.sum(), index=predictions.columns)
+
+
+def combine_forecasts(forecasts, weights=None):
+    """Weighted sum of member forecasts (one column each)
+
+    Weights of members missing from ``forecasts`` are dropped and the rest
+    renormalised; ``weights=None`` averages the members equally.
+    """
+    forecasts = pd.DataFrame(forecasts)
+    if weights is None:
+        weights = pd.Series(1.0, index=forecasts.columns)
+    weights = pd.Series(weights, dtype=np.float64).reindex(forecasts.columns).fillna(0.0)
+    if weights.sum() <= 0:
+        weights[:] = 1.0
+    combined = forecasts.to_numpy(dtype=np.float64) @ (weights / weights.sum()).to_numpy()
+    return pd.Series(combined, index=forecasts.index, name="forecast")
+
+
+def combine_intervals(frames, weights=None):
+    """Weighted average of member ``forecast``/``lower``/``upper`` frames
+
+    ``frames`` maps member names to frames on the same index. Averaging the
+    bounds (quantile averaging) gives an interval between the members'.
+    """
+    return pd.DataFrame({
+        column: combine_forecasts({name: frame[column] for name, frame in frames.items()}, weights)
+        for column in ("forecast", "lower", "upper")
+    })
+
+
+def rolling_stack(folds):
+    """Ensemble prediction of every backtest fold from the folds before it
+
+    ``folds`` is a list of frames in origin order, each with ``day``,
+    ``actual`` and one prediction column per member. Weights for a fold are
+    learned only from earlier folds, so the scores are out of sample.
+    """
+    stacked = []
+    for i, fold in enumerate(folds):
+        members = fold.columns.drop(["day", "actual"])
+        if i == 0:
+            weights = None
+        else:
+            history = pd.concat(folds[:i], ignore_index=True)
+            weights = stacking_weights(history["actual"], history[members])
+        stacked.append(pd.DataFrame({
+            "day": fold["day"],
+            "actual": fold["actual"],
+            "predicted": combine_forecasts(fold[members], weights).to_numpy(),
+        }))
+    return stacked
@@ -0,0 +1,267 @@
+"""Vectorised feature engineering for the forecasting models.
+
+Lag, difference and rolling-window features are read out of a single
+``sliding_window_view`` of the series, so no Python loop runs per row or
+per lag and no intermediate DataFrames are built. ``build_features`` writes
+every feature straight into one preallocated float32 matrix.
+
+All features for row ``t`` only use values up to ``t - 1``, so the matrix
+can be used for one-step-ahead training without leaking the target.
+``panel_features`` builds the same columns for many series at once, along
+the time axis of a (time x series) array.
+"""
+import collections
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .calendars import EVENT_FLAGS
+from .instrumentation import timed
+
+FeatureMatrix = collections.namedtuple("FeatureMatrix", ["X", "y", "index", "names"])
+
+CALENDAR_DAILY = ["dayofweek", "weekend", "month", "doy_sin", "doy_cos"]
+CALENDAR_HOURLY = CALENDAR_DAILY + ["hour", "hour_sin", "hour_cos"]
+
+
+def difference(values, interval=1):
+    """``values[i] - values[i - interval]`` for every ``i >= interval``"""
+    values = np.asarray(values)
+    return values[interval:] - values[:-interval]
+
+
+def lag_matrix(values, lags, out=None):
+    """Matrix whose column ``j`` holds ``values[t - lags[j]]``
+
+    Rows start at ``t = max(lags)``. The lags are gathered from a strided
+    view in one ``np.take``, straight into ``out`` when it is
+    given with the same dtype.
+    """
+    values = np.asarray(values)
+    lags = np.asarray(lags, dtype=np.intp)
+    depth = int(lags.max())
+    # Row i of the view is values[i:i + depth], the lags of t = i + depth
+    windows = sliding_window_view(values[:len(values) - 1], depth)
+    if out is None:
+        return np.take(windows, depth - lags, axis=1)
+    if out.dtype != values.dtype:
+        # np.take would cast the uninitialised ``out`` into a temporary first
+        out[...] = np.take(windows, depth - lags, axis=1)
+        return out
+    return np.take(windows, depth - lags, axis=1, out=out)
+
+
+def _running_sums(values):
+    """Running sums of the values, their squares and their NaNs along axis 0
+
+    NaNs count as zero in the sums, so a gap does not poison every later
+    window; windows containing one are found from the NaN counts.
+    """
+    missing = np.isnan(values)
+    filled = np.where(missing, 0.0, values)
+    zeros = np.zeros((1,) + values.shape[1:])
+    return (np.concatenate([zeros, np.cumsum(filled, axis=0)]),
+            np.concatenate([zeros, np.cumsum(filled * filled, axis=0)]),
+            np.concatenate([zeros, np.cumsum(missing, axis=0)]))
+
+
+def rolling_features(values, windows, start, out):
+    """Trailing mean, std, min and max over each window, ending at ``t - 1``
+
+    Writes four columns per window into ``out`` for rows ``t >= start``.
+    Means and standard deviations come from running sums and extremes from
+    a strided view, so no window is ever copied out of the series. Only
+    windows that contain a NaN are NaN.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    rows = len(values) - start
+    cumulative, squares, gaps = _running_sums(values)
+    end = np.arange(start, start + rows)
+    for k, window in enumerate(windows):
+        total = cumulative[end] - cumulative[end - window]
+        mean = np.where(gaps[end] > gaps[end - window], np.nan, total / window)
+        variance = (squares[end] - squares[end - window]) / window - mean * mean
+        view = sliding_window_view(values[start - window:len(values) - 1], window)
+        out[:, 4 * k] = mean
+        out[:, 4 * k + 1] = np.sqrt(np.maximum(variance, 0.0))
+        out[:, 4 * k + 2] = view.min(axis=1)
+        out[:, 4 * k + 3] = view.max(axis=1)
+    return out
+
+
+def calendar_features(index, hourly=False, out=None):
+    """Day-of-week, weekend, month and cyclic day-of-year (and hour) columns"""
+    index = pd.DatetimeIndex(index)
+    names = CALENDAR_HOURLY if hourly else CALENDAR_DAILY
+    if out is None:
+        out = np.empty((len(index), len(names)), dtype=np.float32)
+    dayofweek = index.dayofweek.to_numpy()
+    angle = 2 * np.pi * (index.dayofyear.to_numpy() - 1) / 365.25
+    out[:, 0] = dayofweek
+    out[:, 1] = dayofweek >= 5
+    out[:, 2] = index.month.to_numpy()
+    out[:, 3] = np.sin(angle)
+    out[:, 4] = np.cos(angle)
+    if hourly:
+        hour = index.hour.to_numpy()
+        out[:, 5] = hour
+        out[:, 6] = np.sin(2 * np.pi * hour / 24)
+        out[:, 7] = np.cos(2 * np.pi * hour / 24)
+    return out
+
+
+def is_subdaily(index):
+    """True when a regular DatetimeIndex is spaced less than a day apart"""
+    freq = index.freq or pd.infer_freq(index)
+    if freq is None:
+        return False
+    offset = pd.tseries.frequencies.to_offset(freq)
+    return isinstance(offset, pd.offsets.Tick) and offset.nanos < pd.Timedelta("1D").value
+
+
+@timed("features.build")
+def build_features(series, lags=range(1, 8), diffs=(1,), windows=(7, 30),
+                   calendar=True, events=None):
+    """Assemble the model feature matrix for ``series`` in one float32 array
+
+    ``events`` is a ``CalendarService`` whose holiday, DST and school flags
+    are added as columns. Returns a ``FeatureMatrix`` whose rows start once
+    every lag and window is available. ``y`` is the series value each row
+    predicts.
+    """
+    values = series.to_numpy(dtype=np.float64)
+    lags = list(lags)
+    diffs = list(diffs)
+    windows = list(windows)
+    hourly = is_subdaily(series.index)
+
+    start = max(lags + [d + 1 for d in diffs] + windows)
+    if start >= len(values):
+        raise ValueError(f"Need more than {start} observations to build features")
+
+    names = [f"lag_{lag}" for lag in lags]
+    names += [f"diff_{d}" for d in diffs]
+    for window in windows:
+        names += [f"roll{window}_{stat}" for stat in ("mean", "std", "min", "max")]
+    if calendar:
+        names += CALENDAR_HOURLY if hourly else CALENDAR_DAILY
+    if events is not None:
+        names += list(EVENT_FLAGS)
+
+    rows = len(values) - start
+    X = np.empty((rows, len(names)), dtype=np.float32)
+    column = 0
+
+    # Trim the front so the lag matrix rows line up with ``start``
+    lag_matrix(values[start - max(lags):], lags, out=X[:, :len(lags)])
+    column += len(lags)
+
+    for d in diffs:
+        # Change over the last d steps, ending at t - 1
+        X[:, column] = values[start - 1:-1] - values[start - 1 - d:len(values) - 1 - d]
+        column += 1
+
+    if windows:
+        rolling_features(values, windows, start, X[:, column:column + 4 * len(windows)])
+        column += 4 * len(windows)
+
+    index = series.index[start:]
+    if calendar:
+        width = len(CALENDAR_HOURLY if hourly else CALENDAR_DAILY)
+        calendar_features(index, hourly=hourly, out=X[:, column:column + width])
+        column += width
+    if events is not None:
+        events.features(index, out=X[:, column:column + len(EVENT_FLAGS)])
+
+    y = values[start:].astype(np.float32)
+    return FeatureMatrix(X, y, index, names)
+
+
+@timed("features.panel")
+def panel_features(values, index, lags=range(1, 8), diffs=(1,), windows=(7, 30), calendar=True,
+                   events=None):
+    """``build_features`` for every column of a (time x series) array at once
+
+    Returns ``(X, y)`` with ``X`` of shape (rows, series, features), in
+    ``build_features`` column order, and ``y`` of shape (rows, series).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    index = pd.DatetimeIndex(index)
+    lags = list(lags)
+    diffs = list(diffs)
+    windows = list(windows)
+    hourly = is_subdaily(index)
+
+    start = max(lags + [d + 1 for d in diffs] + windows)
+    if start >= len(values):
+        raise ValueError(f"Need more than {start} observations to build features")
+    length, series = values.shape
+    shared = []
+    if calendar:
+        shared.append(calendar_features(index[start:], hourly=hourly))
+    if events is not None:
+        shared.append(events.features(index[start:]))
+    width = len(lags) + len(diffs) + 4 * len(windows) + sum(block.shape[1] for block in shared)
+    X = np.empty((length - start, series, width), dtype=np.float32)
+
+    for column, lag in enumerate(lags):
+        X[:, :, column] = values[start - lag:length - lag]
+    column = len(lags)
+    for d in diffs:
+        X[:, :, column] = values[start - 1:-1] - values[start - 1 - d:length - 1 - d]
+        column += 1
+
+    cumulative, squares, gaps = _running_sums(values)
+    end = np.arange(start, length)
+    for window in windows:
+        mean = np.where(gaps[end] > gaps[end - window], np.nan,
+                        (cumulative[end] - cumulative[end - window]) / window)
+        variance = (squares[end] - squares[end - window]) / window - mean * mean
+        view = sliding_window_view(values[start - window:length - 1], window, axis=0)
+        X[:, :, column] = mean
+        X[:, :, column + 1] = np.sqrt(np.maximum(variance, 0.0))
+        X[:, :, column + 2] = view.min(axis=-1)
+        X[:, :, column + 3] = view.max(axis=-1)
+        column += 4
+
+    for block in shared:
+        X[:, :, column:column + block.shape[1]] = block[:, None, :]
+        column += block.shape[1]
+    return X, values[start:].astype(np.float32)
+
+
+def series_to_supervised(data, n_in=1, n_out=1, dropnan=True):
+    """Frame a series as a supervised learning problem
+
+    Drop-in replacement for the notebook helper of the same name, with the
+    same ``var1(t-7) ... var1(t)`` columns, built from one strided view
+    instead of a shifted copy per lag.
+    """
+    index = data.index if isinstance(data, (pd.Series, pd.DataFrame)) else None
+    values = np.asarray(data)
+    if values.ndim == 1:
+        values = values.reshape(-1, 1)
+    values = values.astype(np.result_type(values.dtype, np.float32), copy=False)
+    n_vars = values.shape[1]
+    width = n_in + n_out
+
+    if dropnan:
+        rows = np.arange(n_in, len(values) - n_out + 1)
+    else:
+        padded = np.full((len(values) + width - 1, n_vars), np.nan, dtype=values.dtype)
+        padded[n_in:n_in + len(values)] = values
+        values = padded
+        rows = np.arange(len(data))
+    # (rows, n_vars, width) -> (rows, width, n_vars) -> one column per (offset, var)
+    windows = sliding_window_view(values, width, axis=0).transpose(0, 2, 1)
+    matrix = windows.reshape(len(windows), width * n_vars)
+
+    names = []
+    for i in range(n_in, 0, -1):
+        names += [f"var{j + 1}(t-{i})" for j in range(n_vars)]
+    for i in range(n_out):
+        suffix = "(t)" if i == 0 else f"(t+{i})"
+        names += [f"var{j + 1}{suffix}" for j in range(n_vars)]
+    frame_index = index[rows] if index is not None else rows
+    return pd.DataFrame(matrix, index=frame_index, columns=names)
@@ -0,0 +1,206 @@
+"""Hierarchical forecasts of zones (or household clusters) and their total.
+
+A ``Hierarchy`` has the bottom series of the hourly dataset (IESO zones,
+or households ingested in long form), optional groups of them (e.g.
+household clusters) and the provincial total. Every level is forecast at
+once by one ``HourlyForecaster``, which fits and forecasts all its series
+as batched array operations, and the base forecasts are then made to add
+up with a MinT/OLS reconciliation.
+
+Reconciliation is applied without forming the (series x series)
+projection. With ``C`` the aggregation matrix (aggregates x bottom),
+``U' = [I, -C]`` maps forecasts to their incoherence, which is zero when
+every aggregate equals the sum of its members. The reconciled forecasts
+are
+
+    y~ = y^ - W U (U' W U)^-1 U' y^
+
+(Wickramasuriya et al.), so only an (aggregates x aggregates) system is
+solved, however many bottom series there are, and all forecast hours are
+reconciled in one matrix product. ``W`` is the identity for OLS, the
+diagonal of the one-step residual variances for WLS, and their shrunk
+covariance for MinT.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from .config import DATA_DIR
+from .hourly import HOURLY_DIR, fit_hourly, hourly_series, iter_chunks
+
+TOTAL = "Ontario"
+
+METHODS = ("ols", "wls", "mint")
+
+DEFAULT_MODEL_PATH = os.path.join(DATA_DIR, "models", "hierarchy.npz")
+
+
+class Hierarchy:
+    """Bottom series, groups of them and their total
+
+    ``groups`` maps each group name to its bottom series. Series are
+    ordered total, groups, bottom, in every matrix and frame.
+    """
+
+    def __init__(self, bottom, groups=None, total=TOTAL):
+        self.bottom = list(bottom)
+        self.groups = {name: list(members) for name, members in (groups or {}).items()}
+        self.aggregates = [total] + list(self.groups)
+        position = {name: i for i, name in enumerate(self.bottom)}
+        self.C = np.zeros((len(self.aggregates), len(self.bottom)))
+        self.C[0] = 1.0
+        for row, members in enumerate(self.groups.values(), start=1):
+            unknown = [name for name in members if name not in position]
+            if unknown:
+                raise ValueError(f"Unknown series in group: {unknown}")
+            self.C[row, [position[name] for name in members]] = 1.0
+
+    @classmethod
+    def from_labels(cls, labels, total=TOTAL):
+        """Hierarchy whose groups are given by a Series of bottom -> group labels"""
+        labels = pd.Series(labels)
+        return cls(labels.index, labels.groupby(labels, sort=True).groups, total)
+
+    @property
+    def names(self):
+        return self.aggregates + self.bottom
+
+    @property
+    def S(self):
+        """Summing matrix: every series as a combination of the bottom ones"""
+        return np.vstack([self.C, np.eye(len(self.bottom))])
+
+    def aggregate(self, frame):
+        """Add the aggregate columns to a (time x bottom) frame"""
+        bottom = frame.reindex(columns=self.bottom)
+        aggregates = bottom.to_numpy(dtype=np.float64) @ self.C.T
+        return pd.concat([pd.DataFrame(aggregates.astype(bottom.dtypes.iloc[0]), index=frame.index,
+                                       columns=self.aggregates), bottom], axis=1)
+
+    def incoherence(self, values):
+        """``U' y``: aggregates minus the sums of their members, per row"""
+        values = np.asarray(values, dtype=np.float64)
+        split = len(self.aggregates)
+        return values[:, :split] - values[:, split:] @ self.C.T
+
+
+def shrunk_covariance(residuals):
+    """Covariance of ``residuals`` (rows x series) shrunk towards its diagonal
+
+    The shrinkage intensity is Schäfer and Strimmer's estimate for the
+    correlations, computed with matrix products over all pairs at once.
+    """
+    residuals = np.asarray(residuals, dtype=np.float64)
+    residuals = residuals[~np.isnan(residuals).any(axis=1)]
+    n = len(residuals)
+    if n < 3:
+        raise ValueError("Need at least 3 complete residual rows to estimate a covariance")
+    centered = residuals - residuals.mean(axis=0)
+    covariance = centered.T @ centered / (n - 1)
+    scale = np.sqrt(np.diag(covariance))
+    scale[scale == 0] = 1.0
+    z = centered / scale
+    products = z.T @ z
+    correlation = products / (n - 1)
+    # Variance of each sample correlation from the spread of z_i * z_j
+    variance = n / (n - 1) ** 3 * ((z * z).T @ (z * z) - products * products / n)
+    off = ~np.eye(len(covariance), dtype=bool)
+    denominator = (correlation[off] ** 2).sum()
+    shrinkage = 1.0 if denominator == 0 else float(np.clip(variance[off].sum() / denominator, 0.0, 1.0))
+    shrunk = (1 - shrinkage) * covariance
+    shrunk[np.diag_indices_from(shrunk)] = np.diag(covariance)
+    return shrunk
+
+
+class Reconciler:
+    """Reconciles base forecasts of every series in a ``Hierarchy``
+
+    ``method`` is ``"ols"``, ``"wls"`` or ``"mint"``; the last two need
+    one-step ``residuals`` (rows x series, in ``hierarchy.names`` order).
+    """
+
+    def __init__(self, hierarchy, method="mint", residuals=None):
+        if method not in METHODS:
+            raise ValueError(f"Unknown reconciliation method {method!r}; choose from {METHODS}")
+        if method != "ols" and residuals is None:
+            raise ValueError(f"{method} reconciliation needs one-step residuals")
+        self.hierarchy = hierarchy
+        self.method = method
+        split = len(hierarchy.aggregates)
+        U = np.vstack([np.eye(split), -hierarchy.C.T])
+        if method == "ols":
+            WU = U
+        elif method == "wls":
+            variance = np.nanvar(np.asarray(residuals, dtype=np.float64), axis=0)
+            WU = np.where(variance > 0, variance, 1.0)[:, None] * U
+        else:
+            W = shrunk_covariance(residuals)
+            WU = W[:, :split] - W[:, split:] @ hierarchy.C.T
+        # y~ = y^ - (U' y^) K, with K = (U' W U)^-1 (W U)'
+        self.K = np.linalg.solve(U.T @ WU, WU.T)
+
+    def reconcile(self, base):
+        """Coherent forecasts from base forecasts (hours x series)"""
+        frame = pd.DataFrame(base)[self.hierarchy.names]
+        values = frame.to_numpy(dtype=np.float64)
+        reconciled = values - self.hierarchy.incoherence(values) @ self.K
+        return pd.DataFrame(reconciled, index=frame.index, columns=frame.columns)
+
+
+def one_step_residuals(model, frame, hours):
+    """In-sample one-step errors of ``model`` over the last ``hours`` of ``frame``
+
+    Every hour and series is predicted in one product of the feature panel
+    with the per-series coefficients.
+    """
+    coef = model.coefficients()
+    frame = frame.reindex(columns=model.series_).iloc[-(hours + model.depth):]
+    X, y = model._features(frame)
+    predicted = coef[:, 0] + np.einsum("tsf,sf->ts", X, coef[:, 1:])
+    return pd.DataFrame(y - predicted, index=frame.index[model.depth:], columns=model.series_)
+
+
+def fit_hierarchy(hierarchy, dataset_dir=HOURLY_DIR, months=6, path=DEFAULT_MODEL_PATH, refresh=True,
+                  progress=None):
+    """Fit (or extend) one ``HourlyForecaster`` on every series of ``hierarchy``"""
+    return fit_hourly(dataset_dir, hierarchy.bottom, months=months, path=path, refresh=refresh,
+                      progress=progress, transform=hierarchy.aggregate)
+
+
+def forecast_hierarchy(model, hierarchy, hours, dataset_dir=HOURLY_DIR, method="mint",
+                       residual_hours=28 * 24, store=None):
+    """Reconciled forecasts of every series, ``hours`` ahead
+
+    The residuals behind WLS and MinT are the model's one-step errors over
+    the last ``residual_hours`` of the dataset. Returns the base and the
+    reconciled forecasts; the reconciled ones are recorded in ``store``.
+    """
+    base = model.forecast(hours)[hierarchy.names]
+    residuals = None
+    if method != "ols":
+        start = model.end_ - pd.Timedelta(hours=residual_hours + model.depth)
+        recent = pd.concat(iter_chunks(dataset_dir, hierarchy.bottom, start=start, end=model.end_,
+                                       overlap=0))
+        residuals = one_step_residuals(model, hierarchy.aggregate(recent), residual_hours)[hierarchy.names]
+    reconciled = Reconciler(hierarchy, method, residuals).reconcile(base)
+    if store is not None:
+        for name in reconciled.columns:
+            store.record(f"Hourly {method.upper()}", name, pd.DataFrame({
+                "issued_at": model.end_,
+                "valid_at": reconciled.index,
+                "forecast": reconciled[name].to_numpy(),
+            }), metadata={"method": method, "hours": hours, "residual_hours": residual_hours,
+                          "groups": list(hierarchy.groups), "bottom": len(hierarchy.bottom)})
+    return base, reconciled
+
+
+def load_groups(path):
+    """``Hierarchy`` of every series in a ``series,group`` CSV"""
+    labels = pd.read_csv(path, dtype=str).set_index("series")["group"]
+    return Hierarchy.from_labels(labels)
+
+
+def default_hierarchy(dataset_dir=HOURLY_DIR):
+    """Every series in the hourly dataset under one total"""
+    return Hierarchy(hourly_series(dataset_dir))
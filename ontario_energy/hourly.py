@@ -0,0 +1,424 @@
+"""Hourly pipeline over a month-partitioned Parquet dataset, one chunk at a time.
+
+Hourly histories (IESO zonal demand, weather stations) are stored in long
+form, one ``time``/``series``/``value`` row per hour and series, under
+``<DATA_DIR>/hourly/month=YYYY-MM/<source>.parquet``. Ingestion streams each
+CSV in fixed-size reads and appends every batch to the month files it
+covers, so no source file is ever held in memory whole.
+
+Everything downstream walks that dataset in time order with ``iter_chunks``,
+which reads a few months at a time as a (time x series) float32 frame and
+prepends the last hours of the previous chunk, so lag and rolling-window
+features are exact across chunk boundaries. Peak memory is set by the chunk
+length and the number of series, not by the length of the history.
+
+``HourlyForecaster`` is a per-series linear model on the hourly lag,
+rolling, calendar and event features. It is fitted by accumulating each
+series' normal equations chunk by chunk, so a refresh only reads the new
+months. Features and normal equations are computed for blocks of series
+with batched array operations, and every series is forecast at once by
+rolling the feature rows forward as arrays.
+"""
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+
+from .calendars import EVENT_FLAGS, ontario_calendar
+from .config import DATA_DIR
+from .features import CALENDAR_HOURLY, calendar_features, panel_features
+from .ingest import DEFAULT_CHUNK_BYTES, _fingerprint, _read_manifest, _write_manifest
+
+HOURLY_DIR = os.path.join(DATA_DIR, "hourly")
+
+DEFAULT_MODEL_PATH = os.path.join(DATA_DIR, "models", "hourly.npz")
+
+SCHEMA = pa.schema([
+    ("time", pa.timestamp("s")),
+    ("series", pa.string()),
+    ("value", pa.float32()),
+])
+
+# The last three hours, the same hour on the previous two days and a week ago
+HOURLY_LAGS = (1, 2, 3, 24, 48, 168)
+HOURLY_DIFFS = (1, 24)
+HOURLY_WINDOWS = (24, 168)
+
+# Columns of the IESO zonal demand reports that are not zones
+IESO_TOTALS = ("Ontario Demand", "Zones Total", "Diff")
+
+
+def _comment_lines(path):
+    """Number of ``\\``-prefixed header lines, as in IESO public reports"""
+    count = 0
+    with open(path) as f:
+        for line in f:
+            if not line.startswith("\\"):
+                break
+            count += 1
+    return count
+
+
+def iter_zonal_batches(path, chunk_bytes=DEFAULT_CHUNK_BYTES, zones=None):
+    """Yield long-form record batches of an IESO zonal demand CSV
+
+    The report has one row per ``Date`` and hour-ending ``Hour`` (1-24)
+    with a column per zone. Each hour is stamped with the time it starts.
+    ``zones`` restricts the zones kept; provincial totals are dropped.
+    """
+    reader = pacsv.open_csv(
+        path,
+        read_options=pacsv.ReadOptions(block_size=chunk_bytes, skip_rows=_comment_lines(path)),
+        convert_options=pacsv.ConvertOptions(column_types={"Date": pa.date32(), "Hour": pa.int64()}),
+    )
+    for batch in reader:
+        names = [name for name in batch.schema.names if name not in ("Date", "Hour")
+                 and name not in IESO_TOTALS and (zones is None or name in zones)]
+        days = batch.column("Date").to_numpy(zero_copy_only=False).astype("datetime64[s]")
+        times = days + (batch.column("Hour").to_numpy() - 1).astype("timedelta64[h]")
+        values = np.column_stack([batch.column(name).to_numpy(zero_copy_only=False)
+                                  for name in names]).astype(np.float32)
+        yield pa.RecordBatch.from_arrays([
+            pa.array(np.repeat(times, len(names)), pa.timestamp("s")),
+            pa.array(np.tile(np.array(names, dtype=object), len(times)), pa.string()),
+            pa.array(values.ravel()),
+        ], schema=SCHEMA)
+
+
+def iter_long_batches(path, chunk_bytes=DEFAULT_CHUNK_BYTES):
+    """Yield record batches of a CSV already in ``time,series,value`` form"""
+    reader = pacsv.open_csv(
+        path,
+        read_options=pacsv.ReadOptions(block_size=chunk_bytes),
+        convert_options=pacsv.ConvertOptions(include_columns=SCHEMA.names,
+                                             column_types={field.name: field.type for field in SCHEMA}),
+    )
+    for batch in reader:
+        yield batch.select(SCHEMA.names)
+
+
+def _month_path(dataset_dir, month, stem):
+    return os.path.join(dataset_dir, f"month={month}", f"{stem}.parquet")
+
+
+def write_source(path, dataset_dir=HOURLY_DIR, reader=iter_zonal_batches,
+                 chunk_bytes=DEFAULT_CHUNK_BYTES):
+    """Stream one CSV into the month partitions it covers
+
+    Returns ``(rows, months)``. Each month gets its own file per source, so
+    re-ingesting a source replaces only that source's rows.
+    """
+    stem = os.path.splitext(os.path.basename(path))[0]
+    writers = {}
+    rows = 0
+    try:
+        for batch in reader(path, chunk_bytes):
+            months = batch.column("time").to_numpy().astype("datetime64[M]")
+            order = np.argsort(months, kind="stable")
+            boundaries = np.flatnonzero(months[order][1:] != months[order][:-1]) + 1
+            for positions in np.split(order, boundaries):
+                if not len(positions):
+                    continue
+                month = str(months[positions[0]])
+                if month not in writers:
+                    target = _month_path(dataset_dir, month, stem)
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    # Dot-prefixed so readers never pick up a half-written file
+                    temporary = os.path.join(os.path.dirname(target), f".{stem}.parquet.tmp")
+                    writers[month] = (pq.ParquetWriter(temporary, SCHEMA, compression="zstd"),
+                                      temporary, target)
+                writers[month][0].write_batch(batch.take(pa.array(positions)))
+            rows += batch.num_rows
+    except BaseException:
+        for writer, temporary, _ in writers.values():
+            writer.close()
+            os.remove(temporary)
+        raise
+    for writer, temporary, target in writers.values():
+        writer.close()
+        os.replace(temporary, target)
+    return rows, sorted(writers)
+
+
+def ingest_hourly(source_dir, dataset_dir=HOURLY_DIR, pattern="*.csv", reader=iter_zonal_batches,
+                  chunk_bytes=DEFAULT_CHUNK_BYTES, force=False):
+    """Write every new or changed hourly CSV under ``source_dir`` into the dataset
+
+    Returns the months that were (re)written, so callers can refresh the
+    models from those months only.
+    """
+    os.makedirs(dataset_dir, exist_ok=True)
+    manifest = _read_manifest(dataset_dir)
+
+    written = set()
+    for path in sorted(glob.glob(os.path.join(source_dir, pattern))):
+        stem = os.path.splitext(os.path.basename(path))[0]
+        fingerprint = _fingerprint(path)
+        previous = manifest.get(stem)
+        if not force and previous is not None and \
+           {k: previous.get(k) for k in fingerprint} == fingerprint:
+            continue
+
+        fingerprint["rows"], fingerprint["months"] = write_source(path, dataset_dir, reader, chunk_bytes)
+        # A corrected source may no longer cover every month it used to
+        for month in set(previous["months"] if previous else []) - set(fingerprint["months"]):
+            stale = _month_path(dataset_dir, month, stem)
+            if os.path.exists(stale):
+                os.remove(stale)
+        manifest[stem] = fingerprint
+        _write_manifest(dataset_dir, manifest)
+        written.update(fingerprint["months"])
+    return sorted(written)
+
+
+def hourly_months(dataset_dir=HOURLY_DIR):
+    """Months present in the dataset, as ``YYYY-MM`` strings in order"""
+    paths = glob.glob(os.path.join(glob.escape(dataset_dir), "month=*"))
+    return sorted(os.path.basename(path)[len("month="):] for path in paths
+                  if glob.glob(os.path.join(glob.escape(path), "*.parquet")))
+
+
+def open_hourly(dataset_dir=HOURLY_DIR):
+    """Open the hourly dataset with memory-mapped reads"""
+    return ds.dataset(os.path.abspath(dataset_dir), format="parquet",
+                      partitioning=ds.partitioning(pa.schema([("month", pa.string())]), flavor="hive"),
+                      filesystem=pafs.LocalFileSystem(use_mmap=True))
+
+
+def hourly_series(dataset_dir=HOURLY_DIR):
+    """Names of the series in the dataset, in order"""
+    return sorted(pc.unique(open_hourly(dataset_dir).to_table(columns=["series"])["series"]).to_pylist())
+
+
+def iter_chunks(dataset_dir=HOURLY_DIR, series=None, start=None, end=None, months=6, overlap=169):
+    """Yield the history as (time x series) float32 frames, ``months`` at a time
+
+    Each frame starts with the last ``overlap`` hours of the previous one,
+    which is enough history for the default hourly features. Missing hours
+    are NaN. Where two sources cover the same hour and series, the source
+    whose file name sorts last wins.
+    """
+    available = hourly_months(dataset_dir)
+    if start is not None:
+        available = [m for m in available if m >= pd.Timestamp(start).strftime("%Y-%m")]
+    if end is not None:
+        available = [m for m in available if m <= pd.Timestamp(end).strftime("%Y-%m")]
+    if not available:
+        return
+    dataset = open_hourly(dataset_dir)
+
+    carry = None
+    for first in range(0, len(available), months):
+        condition = ds.field("month").isin(available[first:first + months])
+        if series is not None:
+            condition &= ds.field("series").isin(list(series))
+        if start is not None:
+            condition &= ds.field("time") >= pa.scalar(pd.Timestamp(start), pa.timestamp("s"))
+        if end is not None:
+            condition &= ds.field("time") <= pa.scalar(pd.Timestamp(end), pa.timestamp("s"))
+        frame = dataset.to_table(columns=SCHEMA.names, filter=condition).to_pandas()
+        if frame.empty:
+            continue
+        chunk = (frame.drop_duplicates(["time", "series"], keep="last")
+                 .pivot(index="time", columns="series", values="value"))
+        if carry is not None:
+            chunk = pd.concat([carry, chunk])
+        chunk = chunk.sort_index(axis=1).asfreq("h").astype(np.float32)
+        chunk.columns.name = "series"
+        yield chunk
+        carry = chunk.iloc[-overlap:] if overlap else None
+
+
+class HourlyForecaster:
+    """Linear model per series on the hourly features of ``panel_features``
+
+    ``alpha`` is a ridge penalty relative to each feature's own scale, so
+    it does not depend on the units of the series. The model keeps each
+    series' normal equations, and ``partial_fit`` folds the hours after the
+    last fitted one into them.
+    """
+
+    name = "Hourly"
+
+    # Series whose normal equations are accumulated in one batch
+    block = 64
+
+    def __init__(self, lags=HOURLY_LAGS, diffs=HOURLY_DIFFS, windows=HOURLY_WINDOWS, events=True,
+                 alpha=1e-4):
+        self.lags = tuple(lags)
+        self.diffs = tuple(diffs)
+        self.windows = tuple(windows)
+        self.events = events
+        self.alpha = alpha
+
+    @property
+    def depth(self):
+        """Hours of history behind each feature row"""
+        return max(list(self.lags) + [d + 1 for d in self.diffs] + list(self.windows))
+
+    def _features(self, frame):
+        return panel_features(frame.to_numpy(), frame.index, self.lags, self.diffs, self.windows,
+                              calendar=True, events=ontario_calendar() if self.events else None)
+
+    def _grow(self, names):
+        """Add empty normal equations for series seen for the first time"""
+        new = [name for name in names if name not in self.series_]
+        if new:
+            width = self.xtx_.shape[-1]
+            self.series_ = self.series_ + new
+            self.xtx_ = np.concatenate([self.xtx_, np.zeros((len(new), width, width))])
+            self.xty_ = np.concatenate([self.xty_, np.zeros((len(new), width))])
+            self.counts_ = np.concatenate([self.counts_, np.zeros(len(new), dtype=np.int64)])
+
+    def partial_fit(self, chunk):
+        """Fold the hours of ``chunk`` (time x series) after the last fitted hour in"""
+        if not hasattr(self, "series_"):
+            width = (1 + len(self.lags) + len(self.diffs) + 4 * len(self.windows)
+                     + len(CALENDAR_HOURLY) + (len(EVENT_FLAGS) if self.events else 0))
+            self.series_ = []
+            self.xtx_ = np.zeros((0, width, width))
+            self.xty_ = np.zeros((0, width))
+            self.counts_ = np.zeros(0, dtype=np.int64)
+            self.end_ = None
+        self._grow(list(chunk.columns))
+        position = {name: i for i, name in enumerate(self.series_)}
+        for first in range(0, len(chunk.columns) if len(chunk) > self.depth else 0, self.block):
+            names = chunk.columns[first:first + self.block]
+            X, y = self._features(chunk[names])
+            keep = ~np.isnan(X).any(axis=2) & ~np.isnan(y)
+            if self.end_ is not None:
+                keep &= (chunk.index[len(chunk) - len(X):] > self.end_)[:, None]
+            # (series, rows, 1 + features), with dropped rows zeroed out
+            design = np.empty((len(names), len(X), X.shape[2] + 1))
+            design[:, :, 0] = 1.0
+            design[:, :, 1:] = X.transpose(1, 0, 2)
+            design[~keep.T] = 0.0
+            target = np.where(keep, y, 0.0).T[..., None]
+            rows = [position[name] for name in names]
+            transposed = design.transpose(0, 2, 1)
+            self.xtx_[rows] += transposed @ design
+            self.xty_[rows] += (transposed @ target)[..., 0]
+            self.counts_[rows] += keep.sum(axis=0)
+
+        tail = chunk.reindex(columns=self.series_).iloc[-self.depth:]
+        if self.end_ is None or chunk.index[-1] > self.end_:
+            self.end_ = chunk.index[-1]
+            self.tails_ = tail.to_numpy(dtype=np.float64).T
+        self.coef_ = None
+        return self
+
+    def fit(self, chunks):
+        """Fit on a (time x series) frame or an iterable of chunks from ``iter_chunks``"""
+        for name in ("series_", "coef_"):
+            self.__dict__.pop(name, None)
+        for chunk in [chunks] if isinstance(chunks, pd.DataFrame) else chunks:
+            self.partial_fit(chunk)
+        return self
+
+    def coefficients(self):
+        """(series, 1 + features) ridge solution of the accumulated equations"""
+        if getattr(self, "coef_", None) is None:
+            A = self.xtx_.copy()
+            diagonal = np.einsum("sii->si", A)
+            penalty = self.alpha * np.where(diagonal > 0, diagonal, 1.0)
+            penalty[:, 0] = 0.0
+            # Series without any rows yet get an all-zero model
+            penalty[self.counts_ == 0, 0] = 1.0
+            diagonal += penalty
+            self.coef_ = np.linalg.solve(A, self.xty_[..., None])[..., 0]
+        return self.coef_
+
+    def _next_rows(self, tails, calendar_row, event_row):
+        """Feature rows of the hour after ``tails``, in ``build_features`` order"""
+        columns = [np.ones(len(tails))]
+        columns += [tails[:, -lag] for lag in self.lags]
+        columns += [tails[:, -1] - tails[:, -1 - d] for d in self.diffs]
+        for window in self.windows:
+            values = tails[:, -window:]
+            mean = values.mean(axis=1)
+            columns += [mean, np.sqrt(np.maximum((values * values).mean(axis=1) - mean * mean, 0.0)),
+                        values.min(axis=1), values.max(axis=1)]
+        rows = np.column_stack(columns)
+        fixed = calendar_row if event_row is None else np.concatenate([calendar_row, event_row])
+        return np.hstack([rows, np.broadcast_to(fixed, (len(tails), len(fixed)))])
+
+    def forecast(self, steps):
+        """Next ``steps`` hours of every series, one column each"""
+        coef = self.coefficients()
+        index = pd.date_range(self.end_ + pd.Timedelta(hours=1), periods=steps, freq="h", name="time")
+        calendar = calendar_features(index, hourly=True).astype(np.float64)
+        events = ontario_calendar().features(index).astype(np.float64) if self.events else None
+
+        tails = self.tails_.copy()
+        out = np.empty((steps, len(self.series_)))
+        for step in range(steps):
+            rows = self._next_rows(tails, calendar[step], None if events is None else events[step])
+            out[step] = np.einsum("sp,sp->s", rows, coef)
+            tails = np.concatenate([tails[:, 1:], out[step][:, None]], axis=1)
+        return pd.DataFrame(out, index=index, columns=pd.Index(self.series_, name="series"))
+
+    def save(self, path=DEFAULT_MODEL_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez(path + ".tmp.npz", lags=self.lags, diffs=self.diffs, windows=self.windows,
+                 events=self.events, alpha=self.alpha, series=np.array(self.series_),
+                 xtx=self.xtx_, xty=self.xty_, counts=self.counts_, tails=self.tails_,
+                 end=np.datetime64(self.end_, "s"))
+        os.replace(path + ".tmp.npz", path)
+
+    @classmethod
+    def load(cls, path=DEFAULT_MODEL_PATH):
+        with np.load(path) as arrays:
+            model = cls(lags=arrays["lags"].tolist(), diffs=arrays["diffs"].tolist(),
+                        windows=arrays["windows"].tolist(), events=bool(arrays["events"]),
+                        alpha=float(arrays["alpha"]))
+            model.series_ = arrays["series"].tolist()
+            model.xtx_ = arrays["xtx"]
+            model.xty_ = arrays["xty"]
+            model.counts_ = arrays["counts"]
+            model.tails_ = arrays["tails"]
+            model.end_ = pd.Timestamp(arrays["end"][()])
+        model.coef_ = None
+        return model
+
+
+def fit_hourly(dataset_dir=HOURLY_DIR, series=None, months=6, path=DEFAULT_MODEL_PATH, refresh=True,
+               progress=None, transform=None):
+    """Fit (or, with ``refresh``, extend) the saved hourly model chunk by chunk
+
+    A refresh reads only the months from the model's last fitted hour on.
+    ``transform`` maps each chunk to the frame that is fitted (e.g. adding
+    aggregate series). ``progress`` is called with the end of each chunk
+    folded in.
+    """
+    if refresh and os.path.exists(path):
+        model = HourlyForecaster.load(path)
+        start = model.end_ - pd.Timedelta(hours=model.depth)
+    else:
+        model, start = HourlyForecaster(), None
+    for chunk in iter_chunks(dataset_dir, series, start=start, months=months, overlap=model.depth):
+        model.partial_fit(chunk if transform is None else transform(chunk))
+        if progress is not None:
+            progress(chunk.index[-1])
+    model.save(path)
+    return model
+
+
+def forecast_hourly(model, hours, store=None):
+    """Forecast every series ``hours`` ahead and record the forecasts in ``store``"""
+    forecasts = model.forecast(hours)
+    if store is not None:
+        for name in forecasts.columns:
+            store.record(model.name, name, pd.DataFrame({
+                "issued_at": model.end_,
+                "valid_at": forecasts.index,
+                "forecast": forecasts[name].to_numpy(),
+            }), metadata={"lags": model.lags, "diffs": model.diffs, "windows": model.windows,
+                          "alpha": model.alpha, "hours": hours})
+    return forecasts
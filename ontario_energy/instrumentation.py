@@ -0,0 +1,308 @@
+"""Span timings, counters and optional profiles of the pipeline stages.
+
+``span(name)`` times a stage (data loading, feature building, a model fit,
+chart rendering) as a context manager, and ``timed(name)`` does the same
+as a decorator. ``count(name)`` bumps a counter, e.g. the model and
+feature caches count their hits and misses. Both record into one
+``Metrics`` registry per process (``metrics()``), which keeps each span's
+count, total and a window of recent durations for percentiles. Recording
+a span costs two ``perf_counter`` calls and a lock, so spans stay on in
+production.
+
+``request(name)`` wraps one user-facing run (a Predict or Evaluation
+request, a batch command). It is itself a span, keeps the breakdown of
+the spans nested in it, and can capture a cProfile profile and a
+tracemalloc peak (``profile={"cpu", "memory"}``, or the comma-separated
+``ONTARIO_ENERGY_PROFILE``). The last requests are kept in the registry,
+and the registry is exported when each request ends as JSON and as
+Prometheus text under ``<DATA_DIR>/diagnostics/``, one pair of files per
+process name. The Streamlit app shows the same numbers on its hidden
+Diagnostics page.
+
+Spans recorded in worker processes (backtest folds, batch fits) stay in
+those processes; their parent's request sees the time they took as a whole.
+"""
+import collections
+import contextlib
+import contextvars
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+
+from .config import DATA_DIR
+
+DIAGNOSTICS_DIR = os.path.join(DATA_DIR, "diagnostics")
+
+PROFILES = ("cpu", "memory")
+
+# Durations kept per span for percentiles, and requests kept for the breakdowns
+WINDOW = 1024
+HISTORY = 50
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+# Spans of the request running in this context, and the names of the open spans
+_request = contextvars.ContextVar("request", default=None)
+_path = contextvars.ContextVar("path", default=())
+
+# cProfile and tracemalloc are process-wide, so only one request profiles at a time
+_profiling = threading.Lock()
+
+
+class Metrics:
+    """Span durations, counters and recent requests of one process"""
+
+    def __init__(self, process="ontario_energy", window=WINDOW, history=HISTORY):
+        self.process = process
+        self.window = window
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._spans = {}
+        self._counters = collections.Counter()
+        self._requests = collections.deque(maxlen=history)
+
+    def observe(self, name, seconds):
+        with self._lock:
+            stats = self._spans.get(name)
+            if stats is None:
+                stats = self._spans[name] = {"count": 0, "total": 0.0, "max": 0.0,
+                                             "recent": collections.deque(maxlen=self.window)}
+            stats["count"] += 1
+            stats["total"] += seconds
+            stats["max"] = max(stats["max"], seconds)
+            stats["recent"].append(seconds)
+
+    def count(self, name, value=1):
+        with self._lock:
+            self._counters[name] += value
+
+    def add_request(self, record):
+        with self._lock:
+            self._requests.append(record)
+
+    def reset(self):
+        with self._lock:
+            self._spans.clear()
+            self._counters.clear()
+            self._requests.clear()
+            self.started_at = time.time()
+
+    def spans(self):
+        """Count, total, mean, max and recent percentiles of every span, by name"""
+        with self._lock:
+            spans = {name: dict(stats, recent=np.array(stats["recent"])) for name, stats in self._spans.items()}
+        summary = {}
+        for name, stats in sorted(spans.items()):
+            quantiles = np.quantile(stats["recent"], QUANTILES)
+            summary[name] = {"count": stats["count"], "total": stats["total"],
+                             "mean": stats["total"] / stats["count"], "max": stats["max"],
+                             **{f"p{q * 100:g}": float(v) for q, v in zip(QUANTILES, quantiles)}}
+        return summary
+
+    def counters(self):
+        with self._lock:
+            return dict(sorted(self._counters.items()))
+
+    def requests(self):
+        """Recent request records, newest first"""
+        with self._lock:
+            return list(reversed(self._requests))
+
+    def snapshot(self):
+        return {"process": self.process, "pid": os.getpid(), "started_at": self.started_at,
+                "exported_at": time.time(), "spans": self.spans(), "counters": self.counters(),
+                "requests": self.requests()}
+
+    def prometheus(self):
+        """Spans as a summary and counters as counters, in Prometheus text format"""
+        process = _label(self.process)
+        lines = ["# HELP ontario_energy_span_seconds Wall time of instrumented stages.",
+                 "# TYPE ontario_energy_span_seconds summary"]
+        for name, stats in self.spans().items():
+            labels = f'process="{process}",span="{_label(name)}"'
+            for q in QUANTILES:
+                lines.append(f'ontario_energy_span_seconds{{{labels},quantile="{q:g}"}} '
+                             f'{stats[f"p{q * 100:g}"]:.6g}')
+            lines.append(f"ontario_energy_span_seconds_sum{{{labels}}} {stats['total']:.6g}")
+            lines.append(f"ontario_energy_span_seconds_count{{{labels}}} {stats['count']}")
+        lines += ["# HELP ontario_energy_events_total Instrumented events, e.g. cache hits and misses.",
+                  "# TYPE ontario_energy_events_total counter"]
+        for name, value in self.counters().items():
+            lines.append(f'ontario_energy_events_total{{process="{process}",event="{_label(name)}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def export(self, directory=DIAGNOSTICS_DIR):
+        """Write ``<process>.json`` and ``<process>.prom`` under ``directory``"""
+        os.makedirs(directory, exist_ok=True)
+        stem = os.path.join(directory, "".join(c if c.isalnum() or c in "-_" else "_" for c in self.process))
+        for path, text in ((stem + ".json", json.dumps(self.snapshot(), indent=1, default=str)),
+                           (stem + ".prom", self.prometheus())):
+            with open(path + ".tmp", "w") as f:
+                f.write(text)
+            os.replace(path + ".tmp", path)
+        return stem + ".json", stem + ".prom"
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+@functools.lru_cache(maxsize=1)
+def metrics():
+    """``Metrics`` registry shared by everything in the process"""
+    return Metrics()
+
+
+def set_process(name):
+    """Name this process's metrics and export files (e.g. ``"streamlit"``)"""
+    metrics().process = name
+
+
+def count(name, value=1):
+    metrics().count(name, value)
+
+
+@contextlib.contextmanager
+def span(name):
+    """Time the block under ``name``; nested in a request, also add it to its breakdown"""
+    spans = _request.get()
+    path = _path.get()
+    token = _path.set(path + (name,))
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        _path.reset(token)
+        metrics().observe(name, elapsed)
+        if spans is not None:
+            spans.append({"span": name, "depth": len(path), "start": start, "seconds": elapsed})
+
+
+def timed(name):
+    """Decorator form of ``span``"""
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def profile_setting(value=None):
+    """Profiles to capture: ``value`` or ``ONTARIO_ENERGY_PROFILE`` as a set of ``PROFILES``"""
+    if value is None:
+        value = os.environ.get("ONTARIO_ENERGY_PROFILE", "")
+    if isinstance(value, str):
+        value = [part.strip() for part in value.split(",") if part.strip()]
+    value = set(value)
+    if "all" in value:
+        value = set(PROFILES)
+    unknown = value - set(PROFILES)
+    if unknown:
+        raise ValueError(f"Unknown profile {sorted(unknown)}; choose from {PROFILES}")
+    return value
+
+
+@contextlib.contextmanager
+def request(name, profile=None, export=True, top=25):
+    """Time one user-facing run, keep its span breakdown and optional profiles
+
+    ``profile`` is a subset of ``PROFILES`` (see ``profile_setting``). The
+    cProfile statistics (the ``top`` functions by cumulative time, with the
+    full profile saved as a ``.prof`` file) and the tracemalloc peak and
+    largest allocation sites are kept in the request record. With
+    ``export`` the registry is written to ``DIAGNOSTICS_DIR`` afterwards.
+    """
+    profile = profile_setting(profile)
+    spans = []
+    token = _request.set(spans)
+    record = {"request": name, "started_at": time.time(), "profile": sorted(profile), "error": None}
+    profiling = bool(profile) and _profiling.acquire(blocking=False)
+    if profile and not profiling:
+        record["profile"] = []
+        record["skipped_profile"] = "another request was being profiled"
+    profiler = None
+    tracing = False
+    start = time.perf_counter()
+    try:
+        if profiling and "memory" in profile:
+            tracing = not tracemalloc.is_tracing()
+            if tracing:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        if profiling and "cpu" in profile:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        with span(name):
+            yield record
+    except Exception as error:
+        record["error"] = repr(error)
+        raise
+    finally:
+        record["seconds"] = time.perf_counter() - start
+        if profiler is not None:
+            profiler.disable()
+            record["cpu"] = _cpu_report(profiler, name, top)
+        if profiling and "memory" in profile:
+            record["memory"] = _memory_report(top)
+            if tracing:
+                tracemalloc.stop()
+        if profiling:
+            _profiling.release()
+        _request.reset(token)
+        origin = min((entry["start"] for entry in spans), default=0.0)
+        record["spans"] = [dict(entry, start=entry["start"] - origin) for entry in spans]
+        metrics().add_request(record)
+        if export:
+            try:
+                metrics().export()
+            except OSError:
+                pass
+
+
+def _cpu_report(profiler, name, top):
+    directory = os.path.join(DIAGNOSTICS_DIR, "profiles")
+    path = os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-"
+                                   + "".join(c if c.isalnum() else "_" for c in name) + ".prof")
+    try:
+        os.makedirs(directory, exist_ok=True)
+        profiler.dump_stats(path)
+    except OSError:
+        path = None
+    text = io.StringIO()
+    pstats.Stats(profiler, stream=text).sort_stats("cumulative").print_stats(top)
+    return {"path": path, "top": text.getvalue()}
+
+
+def _memory_report(top):
+    current, peak = tracemalloc.get_traced_memory()
+    statistics = tracemalloc.take_snapshot().statistics("lineno")[:top]
+    return {"current_mb": current / 2 ** 20, "peak_mb": peak / 2 ** 20,
+            "top": [{"where": str(stat.traceback), "size_mb": stat.size / 2 ** 20, "count": stat.count}
+                    for stat in statistics]}
+
+
+def load_exports(directory=DIAGNOSTICS_DIR):
+    """Snapshots exported by every process, by process name"""
+    if not os.path.isdir(directory):
+        return {}
+    snapshots = {}
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".json"):
+            try:
+                with open(os.path.join(directory, name)) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            snapshots[snapshot.get("process", name[:-len(".json")])] = snapshot
+    return snapshots
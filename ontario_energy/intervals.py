@@ -0,0 +1,51 @@
+"""Prediction intervals from calibration residuals.
+
+Models without an analytic forecast variance (the LSTM, and any other
+recursive model) keep a matrix of calibration residuals, one row per
+forecast origin and one column per horizon step, made with a single batched
+forecast when they are fitted. An interval is then the point forecast plus
+the empirical residual quantiles of each horizon, found for every horizon
+at once with one ``np.nanquantile`` along the origin axis. Forecasting
+with an interval therefore costs one point forecast plus a small array
+operation.
+"""
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Central coverage of the intervals shown on the Predict pages
+INTERVAL_LEVEL = 0.9
+
+
+def calibration_windows(values, lags, origins, horizon):
+    """Input windows and realized paths of the last ``origins`` forecast origins
+
+    Returns ``(windows, actual)`` of shapes ``(origins, lags)`` and
+    ``(origins, horizon)``, both views into ``values``. Fewer origins are
+    used when the history is too short.
+    """
+    values = np.asarray(values)
+    rows = sliding_window_view(values, lags + horizon)
+    rows = rows[-min(origins, len(rows)):]
+    return rows[:, :lags], rows[:, lags:]
+
+
+def residual_bounds(residuals, level=INTERVAL_LEVEL):
+    """Lower and upper residual quantiles of every calibrated horizon
+
+    Forecasts do not get more certain further out, so the bounds are
+    widened to be monotone in the horizon.
+    """
+    quantiles = np.nanquantile(residuals, [(1 - level) / 2, (1 + level) / 2], axis=0)
+    return np.minimum.accumulate(quantiles[0]), np.maximum.accumulate(quantiles[1])
+
+
+def conformal_interval(point, residuals, level=INTERVAL_LEVEL):
+    """``(lower, upper)`` around ``point`` from calibration ``residuals``
+
+    ``residuals`` are actual minus forecast, shaped (origins, horizons).
+    Steps past the last calibrated horizon keep its width.
+    """
+    point = np.asarray(point, dtype=np.float64)
+    lower, upper = residual_bounds(residuals, level)
+    steps = np.minimum(np.arange(len(point)), len(lower) - 1)
+    return point + lower[steps], point + upper[steps]
@@ -0,0 +1,160 @@
+"""Background jobs for the desktop client.
+
+``JobRunner`` runs functions on a bounded thread or process pool and sends
+their progress, results and errors back through a queue. The UI drains that
+queue on its own thread with ``poll()`` (``attach()`` schedules it with
+Tk's ``root.after``), so callbacks never touch widgets from a worker.
+
+Job functions take a ``JobContext`` as their first argument and may call
+``context.report(fraction, message)`` and ``context.check_cancelled()``.
+"""
+import itertools
+import multiprocessing
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+
+class JobCancelled(Exception):
+    """Raised inside a job once its cancellation has been requested"""
+
+
+class JobContext:
+    """Progress and cancellation handle passed to a running job"""
+
+    def __init__(self, job_id, events, cancel_event):
+        self.job_id = job_id
+        self._events = events
+        self._cancel_event = cancel_event
+
+    def report(self, fraction=None, message=None):
+        """Send progress (``fraction`` in [0, 1] or None) to the UI"""
+        self._events.put((self.job_id, "progress", (fraction, message)))
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def check_cancelled(self):
+        if self._cancel_event.is_set():
+            raise JobCancelled()
+
+
+class Job:
+    """A submitted job; ``cancel()`` stops it if it has not finished"""
+
+    def __init__(self, job_id, name, cancel_event, on_done, on_error, on_progress):
+        self.id = job_id
+        self.name = name
+        self.future = None
+        self.state = "pending"
+        self._cancel_event = cancel_event
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_progress = on_progress
+
+    def cancel(self):
+        """Request cancellation; pending jobs are dropped without running"""
+        self._cancel_event.set()
+        if self.future is not None:
+            self.future.cancel()
+
+    @property
+    def cancel_requested(self):
+        return self._cancel_event.is_set()
+
+    @property
+    def finished(self):
+        return self.state in ("done", "failed", "cancelled")
+
+
+class JobRunner:
+    """Runs at most ``max_workers`` jobs at a time off the UI thread"""
+
+    def __init__(self, max_workers=2, use_processes=False):
+        self.use_processes = use_processes
+        if use_processes:
+            # Proxies from a manager can be pickled into worker processes
+            self._manager = multiprocessing.Manager()
+            self._events = self._manager.Queue()
+            self._executor = ProcessPoolExecutor(
+                max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+        else:
+            self._manager = None
+            self._events = queue.Queue()
+            self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                                thread_name_prefix="job")
+        self._ids = itertools.count(1)
+        self.jobs = {}
+
+    def submit(self, fn, *args, name=None, on_done=None, on_error=None, on_progress=None):
+        """Queue ``fn(context, *args)`` and return its ``Job``
+
+        ``on_done(result)``, ``on_error(exception)`` and
+        ``on_progress(fraction, message)`` are called from ``poll()``.
+        """
+        job_id = next(self._ids)
+        cancel_event = self._manager.Event() if self._manager else threading.Event()
+        job = Job(job_id, name or getattr(fn, "__name__", "job"), cancel_event,
+                  on_done, on_error, on_progress)
+        context = JobContext(job_id, self._events, cancel_event)
+        self.jobs[job_id] = job
+        job.future = self._executor.submit(fn, context, *args)
+        job.future.add_done_callback(lambda future: self._events.put((job_id, "finished", None)))
+        return job
+
+    @property
+    def active(self):
+        """Jobs that are queued or running"""
+        return [job for job in self.jobs.values() if not job.finished]
+
+    def poll(self):
+        """Deliver queued events to job callbacks; call on the UI thread"""
+        while True:
+            try:
+                job_id, kind, payload = self._events.get_nowait()
+            except queue.Empty:
+                return
+            job = self.jobs.get(job_id)
+            if job is None:
+                continue
+            if kind == "progress":
+                if job.cancel_requested:
+                    continue
+                job.state = "running"
+                if job.on_progress is not None:
+                    job.on_progress(*payload)
+            else:
+                self._finish(job)
+
+    def _finish(self, job):
+        del self.jobs[job.id]
+        future = job.future
+        # Whatever a cancelled job went on to return or raise is discarded
+        if future.cancelled() or job.cancel_requested:
+            job.state = "cancelled"
+            return
+        error = future.exception()
+        if error is not None:
+            job.state = "failed"
+            if job.on_error is not None:
+                job.on_error(error)
+        else:
+            job.state = "done"
+            if job.on_done is not None:
+                job.on_done(future.result())
+
+    def attach(self, root, interval_ms=100):
+        """Poll from the Tk event loop every ``interval_ms`` milliseconds"""
+        def tick():
+            self.poll()
+            root.after(interval_ms, tick)
+        root.after(interval_ms, tick)
+
+    def shutdown(self):
+        """Cancel every job and stop the pool without waiting for it"""
+        for job in list(self.jobs.values()):
+            job.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._manager is not None:
+            self._manager.shutdown()
@@ -0,0 +1,197 @@
+"""Forecast error metrics, computed in one pass or accumulated as a stream.
+
+``score`` evaluates the point metrics (RMSE, MAE, MAPE, sMAPE), the pinball
+loss of quantile forecasts and the coverage of an interval from one error
+array, along any axis of stacked forecasts (e.g. folds x horizons).
+
+``MetricAccumulator`` keeps the same metrics as running means that are
+merged in the Welford/Chan way: a batch of ``k`` new errors moves each
+mean by ``(batch mean - mean) * k / n``, never through a large running
+sum. Accumulators merge and unmerge, so ``RollingMetrics`` updates a
+rolling-window score by adding the newest bucket and removing the oldest
+one, without rescanning the window.
+
+Percentage errors skip the points where they are undefined (zero actuals
+for MAPE, a zero denominator for sMAPE), as the SQL scores in ``store`` do.
+"""
+import collections
+import warnings
+
+import numpy as np
+
+POINT_METRICS = ("RMSE", "MAE", "MAPE", "sMAPE")
+
+
+def _terms(actual, predicted, lower=None, upper=None, quantiles=None):
+    """Per-point terms whose (NaN-skipping) means are the metrics"""
+    actual = np.asarray(actual, dtype=np.float64)
+    error = np.asarray(predicted, dtype=np.float64) - actual
+    absolute = np.abs(error)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        terms = {
+            "error": error,
+            "squared": error * error,
+            "absolute": absolute,
+            "percentage": np.where(actual != 0, absolute / np.abs(actual), np.nan),
+            "symmetric": 2 * absolute / (np.abs(actual) + np.abs(predicted)),
+        }
+    terms["symmetric"][~np.isfinite(terms["symmetric"])] = np.nan
+    if quantiles:
+        levels = np.array(list(quantiles), dtype=np.float64)
+        stacked = np.stack([np.asarray(q, dtype=np.float64) for q in quantiles.values()], axis=-1)
+        under = actual[..., None] - stacked
+        # Mean over the quantile levels of max(q * u, (q - 1) * u)
+        terms["pinball"] = np.maximum(levels * under, (levels - 1) * under).mean(axis=-1)
+    if lower is not None and upper is not None:
+        terms["covered"] = ((actual >= np.asarray(lower, dtype=np.float64))
+                            & (actual <= np.asarray(upper, dtype=np.float64))).astype(np.float64)
+    return terms
+
+
+def _metrics(means):
+    metrics = {
+        "RMSE": np.sqrt(means["squared"]),
+        "MAE": means["absolute"],
+        "MAPE": 100 * means["percentage"],
+        "sMAPE": 100 * means["symmetric"],
+    }
+    if "pinball" in means:
+        metrics["Pinball"] = means["pinball"]
+    if "covered" in means:
+        metrics["Coverage"] = 100 * means["covered"]
+    return metrics
+
+
+def score(actual, predicted, lower=None, upper=None, quantiles=None, axis=None):
+    """Point, quantile and interval metrics of a set of forecasts
+
+    ``quantiles`` maps quantile levels (e.g. 0.1, 0.9) to forecasts of
+    those quantiles; their pinball loss is averaged over the levels.
+    ``lower`` and ``upper`` bound an interval whose coverage is reported
+    in percent. With ``axis=None`` every metric is a float, otherwise an
+    array reduced along ``axis``.
+    """
+    terms = _terms(actual, predicted, lower, upper, quantiles)
+    terms.pop("error")
+    with warnings.catch_warnings():
+        # An all-NaN slice (e.g. all-zero actuals for MAPE) scores NaN
+        warnings.simplefilter("ignore", RuntimeWarning)
+        means = {name: np.nanmean(values, axis=axis) for name, values in terms.items()}
+    metrics = _metrics(means)
+    if axis is None:
+        return {name: float(value) for name, value in metrics.items()}
+    return metrics
+
+
+def pinball_loss(actual, predicted, level):
+    """Mean pinball (quantile) loss of forecasts of the ``level`` quantile"""
+    under = np.asarray(actual, dtype=np.float64) - np.asarray(predicted, dtype=np.float64)
+    return float(np.mean(np.maximum(level * under, (level - 1) * under)))
+
+
+class MetricAccumulator:
+    """Running metrics of a stream of forecasts, updated one batch at a time
+
+    Each term is held as a count and a mean; ``error`` also keeps the sum
+    of squared deviations (Welford's M2), so the bias and spread of the
+    errors are available as well as the metrics.
+    """
+
+    def __init__(self):
+        self.counts = {}
+        self.means = {}
+        self.m2 = 0.0
+
+    @property
+    def count(self):
+        return self.counts.get("error", 0)
+
+    def _combine(self, counts, means, m2, sign):
+        """Add (``sign=1``) or remove (``sign=-1``) a summarized batch"""
+        for name, k in counts.items():
+            n, mean = self.counts.get(name, 0), self.means.get(name, 0.0)
+            total = n + sign * k
+            if total <= 0:
+                self.counts.pop(name, None)
+                self.means.pop(name, None)
+                if name == "error":
+                    self.m2 = 0.0
+                continue
+            # Chan et al.'s pairwise update; removal solves it for the remainder
+            if sign > 0:
+                delta = means[name] - mean
+                self.means[name] = mean + delta * k / total
+                spread = delta * delta * n * k / total
+            else:
+                self.means[name] = (n * mean - k * means[name]) / total
+                delta = means[name] - self.means[name]
+                spread = delta * delta * total * k / n
+            if name == "error":
+                self.m2 += sign * (m2 + spread)
+            self.counts[name] = total
+
+    @staticmethod
+    def _summary(actual, predicted, lower, upper, quantiles):
+        terms = _terms(actual, predicted, lower, upper, quantiles)
+        counts, means = {}, {}
+        for name, values in terms.items():
+            values = values[~np.isnan(values)]
+            if len(values):
+                counts[name], means[name] = len(values), float(values.mean())
+        error = terms["error"][~np.isnan(terms["error"])]
+        m2 = float(((error - error.mean()) ** 2).sum()) if len(error) else 0.0
+        return counts, means, m2
+
+    def update(self, actual, predicted, lower=None, upper=None, quantiles=None):
+        """Fold a batch of forecasts into the running metrics"""
+        self._combine(*self._summary(actual, predicted, lower, upper, quantiles), sign=1)
+        return self
+
+    def merge(self, other):
+        """Add another accumulator's forecasts, e.g. from another worker"""
+        self._combine(other.counts, other.means, other.m2, sign=1)
+        return self
+
+    def remove(self, other):
+        """Take out forecasts that were merged in from ``other``"""
+        self._combine(other.counts, other.means, other.m2, sign=-1)
+        return self
+
+    def result(self):
+        """Current metrics, plus the ``Bias`` and ``Error SD`` of the errors"""
+        means = {name: self.means.get(name, np.nan)
+                 for name in ("squared", "absolute", "percentage", "symmetric")}
+        means.update({name: self.means[name] for name in ("pinball", "covered") if name in self.means})
+        metrics = {name: float(value) for name, value in _metrics(means).items()}
+        metrics["Bias"] = self.means.get("error", np.nan)
+        metrics["Error SD"] = float(np.sqrt(self.m2 / (self.count - 1))) if self.count > 1 else np.nan
+        return metrics
+
+
+class RollingMetrics:
+    """Metrics over the last ``window`` buckets (e.g. days) of a stream
+
+    ``add`` summarizes one bucket of forecasts; once more than ``window``
+    buckets have been added the oldest is removed from the total, so each
+    update costs the size of one bucket rather than of the window.
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.total = MetricAccumulator()
+        self._buckets = collections.deque()
+
+    def add(self, actual, predicted, lower=None, upper=None, quantiles=None):
+        bucket = MetricAccumulator().update(actual, predicted, lower, upper, quantiles)
+        self._buckets.append(bucket)
+        self.total.merge(bucket)
+        while len(self._buckets) > self.window:
+            oldest = self._buckets.popleft()
+            if len(self._buckets) == 0:
+                self.total = MetricAccumulator()
+            else:
+                self.total.remove(oldest)
+        return self.total.result()
+
+    def result(self):
+        return self.total.result()
@@ -0,0 +1,536 @@
+"""Forecasting models ported from the notebook.
+
+Every model follows the same small interface: ``fit(series)`` on a regularly
+spaced Series, ``forecast(steps)`` returning a Series indexed by the next
+``steps`` periods and ``forecast_interval(steps, level)`` returning the same
+forecast with the bounds of a central prediction interval. Fitted models
+are picklable so ``ModelCache`` can keep them on disk. ``EnsembleForecaster``
+only names the members whose forecasts are stacked.
+"""
+import copy
+import os
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from .cache import feature_cache
+from .calendars import ontario_calendar
+from .ensemble import MEMBERS
+from .features import build_features, calendar_features, is_subdaily, lag_matrix
+from .intervals import INTERVAL_LEVEL, calibration_windows, conformal_interval
+
+# Threads each native library may use in this process (None: every core)
+_threads = None
+
+
+def limit_threads(workers):
+    """Pool initializer giving each of ``workers`` processes its share of the cores
+
+    Without it every spawned worker sizes OpenMP, BLAS, TensorFlow and
+    XGBoost to the whole machine, and a pool of one worker per core runs
+    about cores squared threads. The variables are read when the libraries
+    initialise, which in a fresh spawned worker is after this runs.
+    """
+    global _threads
+    _threads = max(1, (os.cpu_count() or 1) // workers)
+    for name in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS",
+                 "TF_NUM_INTRAOP_THREADS", "TF_NUM_INTEROP_THREADS"):
+        os.environ[name] = str(_threads)
+
+
+def future_index(index, steps):
+    """Index of the ``steps`` periods following a regular DatetimeIndex"""
+    freq = index.freq or pd.infer_freq(index)
+    if freq is None:
+        raise ValueError("Series index needs a regular frequency to forecast")
+    offset = pd.tseries.frequencies.to_offset(freq)
+    return pd.date_range(index[-1] + offset, periods=steps, freq=offset, name=index.name)
+
+
+class SarimaxForecaster:
+    """SARIMAX(7,1,1)(1,1,0,12) with a constant, as fitted in the notebook
+
+    These are the defaults; the service, batch and backtest use the orders
+    ``order_search`` saved for the target instead, when there are any.
+
+    Unlike the notebook's, the model has no exogenous regressors: its
+    ``weather_cluster`` and ``holiday_ind`` columns are left out, since
+    forecasts are issued up to years ahead where the weather regime is
+    unknown (the notebook scored with the realised clusters of the test
+    days). Calendar and holiday effects enter through ``XgboostForecaster``.
+    ``update(series)`` brings a fitted model up to date with new
+    observations without a cold fit: the Kalman filter is run over the new
+    rows with the fitted parameters, and once ``refit_every`` observations
+    have been appended the parameters are re-estimated starting from the
+    previous ones, for at most ``warm_maxiter`` optimiser iterations.
+    """
+
+    name = "ARIMA"
+
+    def __init__(self, order=(7, 1, 1), seasonal_order=(1, 1, 0, 12), trend="c", refit_every=30,
+                 warm_maxiter=10):
+        self.order = order
+        self.seasonal_order = seasonal_order
+        self.trend = trend
+        self.refit_every = refit_every
+        self.warm_maxiter = warm_maxiter
+
+    def _model(self, values):
+        from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+        return SARIMAX(values, order=self.order, seasonal_order=self.seasonal_order, trend=self.trend)
+
+    def fit(self, series):
+        self.results_ = self._model(series.to_numpy(dtype=np.float64)).fit(disp=False)
+        self.index_ = series.index
+        self.appended_ = 0
+        return self
+
+    def update(self, series):
+        """Return a model of ``series``, which must extend the fitted history
+
+        ``series`` may start later than the fitted history, but where the
+        two overlap they must agree; otherwise ``ValueError`` is raised and
+        the caller should fit from scratch. The fitted model is unchanged.
+        """
+        last = self.index_[-1]
+        overlap = series.loc[:last]
+        endog = self.results_.model.endog[:, 0]
+        if (len(overlap) == 0 or len(overlap) > len(endog)
+                or not overlap.index.equals(self.index_[-len(overlap):])
+                or not np.allclose(overlap.to_numpy(dtype=np.float64), endog[-len(overlap):],
+                                   equal_nan=True)):
+            raise ValueError("Series does not extend the fitted history")
+        new = series.loc[series.index > last]
+        if new.empty:
+            return self
+
+        updated = copy.copy(self)
+        values = new.to_numpy(dtype=np.float64)
+        updated.index_ = self.index_.append(new.index)
+        updated.appended_ = getattr(self, "appended_", 0) + len(new)
+        if updated.appended_ >= self.refit_every:
+            # Warm start: the previous optimum is close, so few iterations are needed
+            history = np.concatenate([endog, values])
+            updated.results_ = self._model(history).fit(
+                start_params=self.results_.params, maxiter=self.warm_maxiter, disp=False)
+            updated.appended_ = 0
+        else:
+            updated.results_ = self.results_.append(values)
+        return updated
+
+    def forecast(self, steps):
+        values = self.results_.forecast(steps)
+        return pd.Series(values, index=future_index(self.index_, steps), name="forecast")
+
+    def forecast_interval(self, steps, level=INTERVAL_LEVEL):
+        """Forecast with the state-space model's own prediction interval"""
+        prediction = self.results_.get_forecast(steps)
+        bounds = np.asarray(prediction.conf_int(alpha=1 - level))
+        return pd.DataFrame({"forecast": np.asarray(prediction.predicted_mean),
+                             "lower": bounds[:, 0], "upper": bounds[:, 1]},
+                            index=future_index(self.index_, steps))
+
+
+class LstmForecaster:
+    """``Sequential([LSTM(50), Dense(1)])`` on the previous ``lags`` values
+
+    Like the notebook, the target is min-max scaled and the network trained
+    with MAE loss, ``epochs=50``, ``batch_size=72`` and no shuffling.
+    Forecasts beyond one step feed each prediction back in as the next lag,
+    for a whole batch of series at once (see ``predict_batch``). The inputs
+    are the lags only; the notebook's ``weather_cluster`` and
+    ``holiday_ind`` columns are left out, as for ``SarimaxForecaster``.
+
+    Intervals are conformal and out of sample, as for ``XgboostForecaster``:
+    the network is first trained without the last days of the history,
+    which are forecast from ``calibration`` origins ``calibration_horizon``
+    steps ahead in one batch, and the residuals kept with the model. It is
+    then trained ``update_epochs`` more epochs on the whole history.
+
+    With ``sequence=True`` the lags are fed as ``(lags, 1)`` sequences
+    through the ``training`` input pipeline instead of the notebook's
+    single timestep, and with ``patience`` the most recent tenth of the
+    windows is held out to stop training early.
+    """
+
+    name = "LSTM"
+
+    def __init__(self, lags=7, units=50, epochs=50, batch_size=72, seed=11, calibration=120,
+                 calibration_horizon=90, update_epochs=5, sequence=False, patience=None):
+        self.lags = lags
+        self.units = units
+        self.epochs = epochs
+        self.batch_size = batch_size
+        self.seed = seed
+        self.calibration = calibration
+        self.calibration_horizon = calibration_horizon
+        self.update_epochs = update_epochs
+        self.sequence = sequence
+        self.patience = patience
+
+    @property
+    def input_shape(self):
+        return (self.lags, 1) if self.sequence else (1, self.lags)
+
+    def _build(self):
+        from keras.layers import LSTM, Dense, Input
+        from keras.models import Sequential
+
+        model = Sequential([Input(self.input_shape), LSTM(self.units), Dense(1)])
+        model.compile(loss="mae", optimizer="adam")
+        return model
+
+    def fit(self, series):
+        import keras
+
+        keras.utils.set_random_seed(self.seed)
+        values = series.to_numpy(dtype=np.float32)
+        self.minimum_ = float(values.min())
+        self.range_ = float(values.max() - values.min()) or 1.0
+        horizon = max(1, min(self.calibration_horizon, (len(values) - self.lags) // 4))
+        origins = max(1, min(self.calibration, (len(values) - self.lags) // 4))
+        # Calibration targets start at ``first``, so the network is trained without them
+        first = len(values) - horizon - origins + 1
+        self.model_ = None
+        if self.sequence:
+            self._fit_sequences(values[:first])
+        else:
+            self._train(values[:first], self.epochs)
+        self._calibrate(values, origins, horizon)
+        if self.update_epochs:
+            self._train(values, self.update_epochs)
+        return self._finish(series)
+
+    def _train(self, values, epochs):
+        """Train ``model_``, built first if there is none yet, on ``values``"""
+        if self.model_ is None:
+            self.model_ = self._build()
+        self.rollout_ = None
+        if self.sequence:
+            from .training import window_dataset
+
+            train = window_dataset(lambda: iter([values]), lags=self.lags, batch_size=self.batch_size,
+                                   minimum=self.minimum_, scale=self.range_)
+            with warnings.catch_warnings():
+                # Streamed datasets have no length, which Keras reports every epoch
+                warnings.filterwarnings("ignore", "Your input ran out of data", UserWarning)
+                self.model_.fit(train, epochs=epochs, verbose=0, shuffle=False)
+            return
+        scaled = (values - self.minimum_) / self.range_
+        # Oldest lag first, so the last column is t-1 as in the notebook
+        X = lag_matrix(scaled, range(self.lags, 0, -1))
+        y = scaled[self.lags:]
+        self.model_.fit(X.reshape(len(X), 1, self.lags), y, epochs=epochs,
+                        batch_size=self.batch_size, verbose=0, shuffle=False)
+
+    def _fit_sequences(self, values):
+        from .training import fit_model, window_dataset
+
+        options = dict(lags=self.lags, batch_size=self.batch_size, minimum=self.minimum_,
+                       scale=self.range_)
+        validation = None
+        if self.patience:
+            held_out = max(1, (len(values) - self.lags) // 10)
+            train = window_dataset(lambda: iter([values[:-held_out]]), **options)
+            validation = window_dataset(lambda: iter([values[-held_out - self.lags:]]), **options)
+        else:
+            train = window_dataset(lambda: iter([values]), **options)
+        self.model_, history = fit_model(self._build, train, validation, epochs=self.epochs,
+                                         patience=self.patience)
+        self.history_ = history.history
+
+    def _calibrate(self, values, origins, horizon):
+        """Keep the residuals of forecasts from the last ``origins`` origins of ``values``
+
+        The model must not have been trained on the last ``origins + horizon - 1``
+        values, or the residuals understate its errors.
+        """
+        windows, actual = calibration_windows(values, self.lags, origins, horizon)
+        self.rollout_ = None
+        self.residuals_ = (actual - self.predict_batch(windows, horizon)).astype(np.float32)
+
+    def _finish(self, series):
+        """Keep the forecast state of a trained and calibrated model"""
+        values = series.to_numpy(dtype=np.float32)
+        self.window_ = values[-self.lags:].copy()
+        self.rollout_ = None
+        self.index_ = series.index
+        return self
+
+    def _rollout(self):
+        """Graph-compiled recursive forecast shared by every batch
+
+        The step loop runs inside a ``tf.while_loop``, so a long horizon
+        costs one graph call rather than one Python round trip per step.
+        The signature makes the batch size and ``steps`` graph inputs, so
+        every chunk and horizon runs the one trace.
+        """
+        if getattr(self, "rollout_", None) is None:
+            import tensorflow as tf
+
+            model, shape = self.model_, (-1,) + self.input_shape
+
+            @tf.function(input_signature=(tf.TensorSpec([None, self.lags], tf.float32),
+                                          tf.TensorSpec([], tf.int32)))
+            def rollout(window, steps):
+                outputs = tf.TensorArray(tf.float32, size=steps)
+                for step in tf.range(steps):
+                    yhat = model(tf.reshape(window, shape), training=False)
+                    outputs = outputs.write(step, yhat[:, 0])
+                    window = tf.concat([window[:, 1:], yhat], axis=1)
+                return tf.transpose(outputs.stack())
+
+            self.rollout_ = rollout
+        return self.rollout_
+
+    def scale(self, values):
+        return (np.asarray(values, dtype=np.float32) - self.minimum_) / self.range_
+
+    def unscale(self, scaled):
+        """Invert the target scaling without rebuilding full feature rows"""
+        return np.asarray(scaled, dtype=np.float64) * self.range_ + self.minimum_
+
+    def predict_batch(self, histories, horizons, batch_size=4096):
+        """Recursive multi-step forecasts for many series in one pass
+
+        ``histories`` is a 2-D array with one series per row (only the last
+        ``lags`` columns are used) or a list of 1-D series. ``horizons`` is
+        one horizon for every series or one per series. Returns a float
+        array of shape ``(len(histories), max(horizons))``, NaN past each
+        series' own horizon.
+        """
+        if isinstance(histories, np.ndarray) and histories.ndim == 2:
+            windows = histories[:, -self.lags:]
+        else:
+            windows = np.stack([np.asarray(h)[-self.lags:] for h in histories])
+        windows = self.scale(windows)
+        horizons = np.broadcast_to(np.asarray(horizons, dtype=np.int64), (len(windows),))
+        steps = int(horizons.max())
+
+        rollout = self._rollout()
+        scaled = np.empty((len(windows), steps), dtype=np.float32)
+        for first in range(0, len(windows), batch_size):
+            chunk = windows[first:first + batch_size]
+            scaled[first:first + len(chunk)] = rollout(chunk, steps).numpy()
+
+        predictions = self.unscale(scaled)
+        predictions[np.arange(steps) >= horizons[:, None]] = np.nan
+        return predictions
+
+    def forecast(self, steps):
+        values = self.predict_batch(self.window_[None, :], steps)[0]
+        return pd.Series(values, index=future_index(self.index_, steps), name="forecast")
+
+    def forecast_interval(self, steps, level=INTERVAL_LEVEL):
+        """Forecast with conformal bounds from the calibration residuals"""
+        forecast = self.forecast(steps)
+        lower, upper = conformal_interval(forecast.to_numpy(), self.residuals_, level)
+        return pd.DataFrame({"forecast": forecast.to_numpy(), "lower": lower, "upper": upper},
+                            index=forecast.index)
+
+    def __getstate__(self):
+        # Keras models do not pickle; keep the weights and rebuild on load
+        state = self.__dict__.copy()
+        state.pop("rollout_", None)
+        model = state.pop("model_", None)
+        if model is not None:
+            state["weights_"] = model.get_weights()
+        return state
+
+    def __setstate__(self, state):
+        weights = state.pop("weights_", None)
+        self.__dict__.update(state)
+        if weights is not None:
+            self.model_ = self._build()
+            self.model_.set_weights(weights)
+
+
+class XgboostForecaster:
+    """Gradient-boosted trees on the lag, rolling, calendar and holiday features
+
+    Trees are grown with XGBoost's histogram method on ``nthread`` threads
+    (by default every core, or the process's share under ``limit_threads``)
+    from a ``QuantileDMatrix``, so each fit buckets the features once. The
+    feature matrix comes from ``FeatureCache``, so backtest folds and
+    refreshes of the same history reuse its rows instead of rebuilding
+    them. Multi-step forecasts are recursive, for many origins at once
+    (see ``_rollout``).
+
+    The first ``rounds`` trees are fitted without the last days of the
+    history, which are forecast from ``calibration`` origins for
+    out-of-sample conformal intervals; ``update_rounds`` more trees are
+    then boosted on the whole history. ``update(series)`` boosts another
+    ``update_rounds`` trees when days are added, and refits once
+    ``refit_every`` days have been added.
+    """
+
+    name = "XGBoost"
+
+    def __init__(self, lags=(1, 2, 3, 4, 5, 6, 7, 14, 28), diffs=(1, 7), windows=(7, 30),
+                 events=True, rounds=300, update_rounds=20, learning_rate=0.05, max_depth=4,
+                 max_bin=256, nthread=None, calibration=120, calibration_horizon=90, refit_every=30,
+                 seed=11):
+        self.lags = tuple(lags)
+        self.diffs = tuple(diffs)
+        self.windows = tuple(windows)
+        self.events = events
+        self.rounds = rounds
+        self.update_rounds = update_rounds
+        self.learning_rate = learning_rate
+        self.max_depth = max_depth
+        self.max_bin = max_bin
+        self.nthread = nthread
+        self.calibration = calibration
+        self.calibration_horizon = calibration_horizon
+        self.refit_every = refit_every
+        self.seed = seed
+
+    @property
+    def depth(self):
+        """Days of history behind each feature row"""
+        return max(list(self.lags) + [d + 1 for d in self.diffs] + list(self.windows))
+
+    def _build(self, series):
+        return build_features(series, self.lags, self.diffs, self.windows, calendar=True,
+                              events=ontario_calendar() if self.events else None)
+
+    def _features(self, series):
+        return feature_cache().get(series, self._build,
+                                   (self.lags, self.diffs, self.windows, self.events), self.depth)
+
+    def _boost(self, X, y, rounds, booster=None):
+        import xgboost as xgb
+
+        params = {"tree_method": "hist", "max_bin": self.max_bin, "eta": self.learning_rate,
+                  "max_depth": self.max_depth, "nthread": self.nthread or _threads or os.cpu_count(),
+                  "seed": self.seed}
+        matrix = xgb.QuantileDMatrix(X, y, max_bin=self.max_bin, nthread=params["nthread"])
+        return xgb.train(params, matrix, num_boost_round=rounds,
+                         xgb_model=None if booster is None else booster.copy())
+
+    def _fixed(self, index):
+        """Calendar and event columns of ``index``, which do not depend on the values"""
+        columns = [calendar_features(index, hourly=is_subdaily(index))]
+        if self.events:
+            columns.append(ontario_calendar().features(index))
+        return np.hstack(columns).astype(np.float64)
+
+    def _rollout(self, tails, fixed, offsets, steps):
+        """Recursive forecasts from every row of ``tails`` at once
+
+        Row ``i`` forecasts the days whose ``fixed`` rows start at
+        ``offsets[i]``; each step is one batched prediction.
+        """
+        tails = np.array(tails, dtype=np.float64)
+        out = np.empty((len(tails), steps))
+        for step in range(steps):
+            # Same columns, in the same order, as ``build_features``
+            columns = [tails[:, -lag] for lag in self.lags]
+            columns += [tails[:, -1] - tails[:, -1 - d] for d in self.diffs]
+            for window in self.windows:
+                values = tails[:, -window:]
+                mean = values.mean(axis=1)
+                columns += [mean, np.sqrt(np.maximum((values * values).mean(axis=1) - mean * mean, 0.0)),
+                            values.min(axis=1), values.max(axis=1)]
+            rows = np.hstack([np.column_stack(columns), fixed[offsets + step]])
+            out[:, step] = self.booster_.inplace_predict(rows)
+            tails = np.concatenate([tails[:, 1:], out[:, step:step + 1]], axis=1)
+        return out
+
+    def fit(self, series):
+        features = self._features(series)
+        values = series.to_numpy(dtype=np.float64)
+        horizon = max(1, min(self.calibration_horizon, len(features.y) // 4))
+        origins = max(1, min(self.calibration, len(features.y) // 4))
+        # Origins run from ``first`` to the last day that still has ``horizon`` days after it
+        first = len(values) - horizon - origins + 1
+        rows = first - (len(values) - len(features.y))
+        self.booster_ = self._boost(features.X[:rows], features.y[:rows], self.rounds)
+
+        windows, actual = calibration_windows(values, self.depth, origins, horizon)
+        predicted = self._rollout(windows, self._fixed(series.index[first:]), np.arange(origins), horizon)
+        self.residuals_ = (actual - predicted).astype(np.float32)
+
+        self.booster_ = self._boost(features.X, features.y, self.update_rounds, self.booster_)
+        self.values_ = values
+        self.index_ = series.index
+        self.appended_ = 0
+        return self
+
+    def update(self, series):
+        """Return a model of ``series``, which must extend the fitted history
+
+        As for ``SarimaxForecaster.update``, ``ValueError`` means the
+        caller should fit from scratch. The fitted model is unchanged.
+        """
+        last = self.index_[-1]
+        overlap = series.loc[:last]
+        if (len(overlap) == 0 or len(overlap) > len(self.values_)
+                or not overlap.index.equals(self.index_[-len(overlap):])
+                or not np.allclose(overlap.to_numpy(dtype=np.float64), self.values_[-len(overlap):],
+                                   equal_nan=True)):
+            raise ValueError("Series does not extend the fitted history")
+        new = series.loc[series.index > last]
+        if new.empty:
+            return self
+        if self.appended_ + len(new) >= self.refit_every:
+            return copy.copy(self).fit(series)
+
+        updated = copy.copy(self)
+        updated.values_ = np.concatenate([self.values_, new.to_numpy(dtype=np.float64)])
+        updated.index_ = self.index_.append(new.index)
+        updated.appended_ = self.appended_ + len(new)
+        history = pd.Series(updated.values_, index=updated.index_)
+        features = self._features(history)
+        updated.booster_ = self._boost(features.X, features.y, self.update_rounds, self.booster_)
+        return updated
+
+    def forecast(self, steps):
+        index = future_index(self.index_, steps)
+        values = self._rollout(self.values_[None, -self.depth:], self._fixed(index), np.zeros(1, dtype=np.intp),
+                               steps)[0]
+        return pd.Series(values, index=index, name="forecast")
+
+    def forecast_interval(self, steps, level=INTERVAL_LEVEL):
+        """Forecast with conformal bounds from the held-out calibration residuals"""
+        forecast = self.forecast(steps)
+        lower, upper = conformal_interval(forecast.to_numpy(), self.residuals_, level)
+        return pd.DataFrame({"forecast": forecast.to_numpy(), "lower": lower, "upper": upper},
+                            index=forecast.index)
+
+
+class EnsembleForecaster:
+    """Weighted combination of the registered ``members``
+
+    The ensemble is never fitted as a model of its own: the service, batch
+    and backtest fit (or load) each member with its own searched settings
+    and stack their forecasts and bounds with ``ensemble.combine_intervals``.
+    This holds the display name, the ``members`` and the stacking
+    ``weights`` (see ``ensemble``); without weights the members are
+    averaged.
+    """
+
+    name = "Ensemble"
+
+    def __init__(self, members=MEMBERS, weights=None):
+        self.members = tuple(members)
+        self.weights = weights
+
+
+MODELS = {
+    SarimaxForecaster.name: SarimaxForecaster,
+    LstmForecaster.name: LstmForecaster,
+    XgboostForecaster.name: XgboostForecaster,
+    EnsembleForecaster.name: EnsembleForecaster,
+}
+
+
+def create_model(name, **settings):
+    """Instantiate the model registered under its display name with ``settings``"""
+    try:
+        model = MODELS[name]
+    except KeyError:
+        raise ValueError(f"{name} forecasting is not available yet") from None
+    return model(**settings)
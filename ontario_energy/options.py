@@ -0,0 +1,29 @@
+"""Choices offered by the Streamlit and Tkinter front ends.
+
+Both front ends build their dropdowns from these lists so they always agree
+with each other and with the core (targets, durations and periods are read
+from the modules that define them).
+"""
+from .backtest import TARGETS, TEST_PERIODS
+from .data import PERIOD_MONTHS, SOURCES
+from .metrics import POINT_METRICS
+from .service import DURATION_DAYS
+
+PAGES = ["Home", "Visualization", "Predict", "Evaluation"]
+
+# Models not registered in ``models.MODELS`` are reported as not available yet
+MODEL_OPTIONS = ["ARIMA", "XGBoost", "LSTM", "Ensemble"]
+
+TARGET_OPTIONS = list(TARGETS)
+
+DURATION_OPTIONS = list(DURATION_DAYS)
+
+SOURCE_OPTIONS = list(SOURCES)
+
+VISUALIZATION_TYPES = ["Line Chart", "Bar Chart", "Heat Map", "Scatter Plot"]
+
+PERIOD_OPTIONS = list(PERIOD_MONTHS)
+
+METRIC_OPTIONS = list(POINT_METRICS) + ["All Metrics"]
+
+TEST_PERIOD_OPTIONS = list(TEST_PERIODS)
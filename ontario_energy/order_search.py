@@ -0,0 +1,234 @@
+"""Stepwise SARIMA order selection run across a process pool.
+
+The differencing orders are chosen first, as auto_arima does: ``d`` is the
+smallest number of differences whose augmented Dickey-Fuller test rejects
+a unit root, and ``D`` is 1 when the seasonal strength of the differenced
+series exceeds 0.64. The differenced series and every ADF result are kept
+in a ``DifferencingCache``, so each is computed once per series no matter
+how many candidates or targets use it.
+
+With ``d`` and ``D`` fixed, AIC values are comparable, and the search
+fits ARMA candidates on the differenced series. Each round evaluates every
+unvisited neighbour of the current best order in parallel and stops once
+no neighbour lowers the AIC. Orders far from the optimum are pruned
+without ever being fitted, rather than the whole grid being fitted.
+
+The best orders are saved to ``<RESULTS_DIR>/arima_orders.json``, and
+``model_settings`` hands them to the service, batch and backtest, so a
+nightly ``orders`` run re-tunes the SARIMAX model of every target.
+"""
+import collections
+import functools
+import json
+import multiprocessing
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from . import backtest, data
+from .cache import hash_series
+from .config import RESULTS_DIR
+from .models import SarimaxForecaster, limit_threads
+
+ADF_ALPHA = 0.05
+
+# Seasonal strength above which one seasonal difference is taken (nsdiffs)
+SEASONAL_STRENGTH = 0.64
+
+ORDERS_NAME = "arima_orders.json"
+
+OrderSearch = collections.namedtuple("OrderSearch", ["order", "seasonal_order", "trend", "aic",
+                                                     "candidates"])
+
+
+class DifferencingCache:
+    """Differenced series and ADF tests, computed once per series and order"""
+
+    def __init__(self):
+        self._differenced = {}
+        self._adf = {}
+
+    def differenced(self, series, d, D=0, s=0):
+        key = (hash_series(series), d, D, s)
+        if key not in self._differenced:
+            values = series.to_numpy(dtype=np.float64)
+            for _ in range(D):
+                values = values[s:] - values[:-s]
+            self._differenced[key] = np.diff(values, n=d) if d else values
+        return self._differenced[key]
+
+    def adf(self, series, d, D=0, s=0):
+        """(statistic, p-value) of the ADF test on the differenced series"""
+        key = (hash_series(series), d, D, s)
+        if key not in self._adf:
+            from statsmodels.tsa.stattools import adfuller
+
+            statistic, pvalue = adfuller(self.differenced(series, d, D, s), autolag="AIC")[:2]
+            self._adf[key] = (float(statistic), float(pvalue))
+        return self._adf[key]
+
+
+DIFFERENCING = DifferencingCache()
+
+
+def seasonal_strength(values, period):
+    """1 - Var(remainder) / Var(seasonal + remainder) of a classical decomposition"""
+    from statsmodels.tsa.seasonal import seasonal_decompose
+
+    parts = seasonal_decompose(values, period=period, extrapolate_trend=period)
+    detrended = parts.seasonal + parts.resid
+    return max(0.0, 1 - np.var(parts.resid) / np.var(detrended))
+
+
+def select_differencing(series, period=12, max_d=2, max_D=1, cache=DIFFERENCING):
+    """Differencing orders ``(d, D)`` from ADF tests and seasonal strength"""
+    d = next((d for d in range(max_d + 1) if cache.adf(series, d)[1] < ADF_ALPHA), max_d)
+    D = 0
+    if max_D and period > 1 and len(series) > 2 * period + d:
+        D = int(seasonal_strength(cache.differenced(series, d), period) > SEASONAL_STRENGTH)
+    return d, D
+
+
+def fit_candidate(values, arma, period, trend):
+    """AIC of ARMA ``(p, q, P, Q)`` on an already differenced series"""
+    from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+    p, q, P, Q = arma
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        try:
+            results = SARIMAX(values, order=(p, 0, q), seasonal_order=(P, 0, Q, period),
+                              trend=trend).fit(disp=False)
+        except (ValueError, np.linalg.LinAlgError):
+            return np.inf
+    # The optimiser can wander into a region where the likelihood evaluates
+    # to exactly zero; such a fit is broken, not a perfect one
+    if not np.isfinite(results.llf) or results.llf == 0.0:
+        return np.inf
+    return float(results.aic)
+
+
+def _neighbours(arma, bounds):
+    p, q, P, Q = arma
+    steps = [(1, 0, 0, 0), (0, 1, 0, 0), (1, 1, 0, 0), (0, 0, 1, 0), (0, 0, 0, 1), (0, 0, 1, 1)]
+    for step in steps:
+        for sign in (1, -1):
+            candidate = tuple(v + sign * dv for v, dv in zip(arma, step))
+            if all(0 <= v <= bound for v, bound in zip(candidate, bounds)):
+                yield candidate
+
+
+def search_orders(series, period=12, max_p=7, max_q=3, max_P=2, max_Q=1, trend="c",
+                  max_rounds=20, pool=None, workers=None, cache=DIFFERENCING, progress=None):
+    """Best SARIMA order of ``series`` by stepwise AIC search
+
+    ``pool`` is an executor to share between searches; otherwise one with
+    ``workers`` processes is created. ``progress`` is called with the
+    number of candidates evaluated so far. Returns an ``OrderSearch`` whose
+    ``candidates`` frame lists every fitted order by AIC.
+    """
+    series = series.interpolate(limit_direction="both")
+    d, D = select_differencing(series, period, cache=cache)
+    values = cache.differenced(series, d, D, period)
+    if d + D >= 2:
+        # A constant on a twice-differenced series is a quadratic trend
+        trend = "n"
+    bounds = (max_p, max_q, max_P, max_Q)
+    starts = [(2, 2, 1, 1), (0, 0, 0, 0), (1, 0, 1, 0), (0, 1, 0, 1), (7, 1, 1, 0)]
+    frontier = {tuple(min(v, bound) for v, bound in zip(start, bounds)) for start in starts}
+
+    own_pool = pool is None
+    if own_pool:
+        workers = workers or os.cpu_count()
+        pool = ProcessPoolExecutor(max_workers=workers,
+                                   mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=limit_threads, initargs=(workers,))
+    scores = {}
+    try:
+        for _ in range(max_rounds):
+            futures = {arma: pool.submit(fit_candidate, values, arma, period, trend)
+                       for arma in frontier}
+            for arma, future in futures.items():
+                scores[arma] = future.result()
+            if progress is not None:
+                progress(len(scores))
+            best = min(scores, key=scores.get)
+            if best not in frontier:
+                break
+            frontier = {arma for arma in _neighbours(best, bounds) if arma not in scores}
+            if not frontier:
+                break
+    finally:
+        if own_pool:
+            pool.shutdown()
+
+    p, q, P, Q = best
+    candidates = pd.DataFrame(
+        [(f"({a[0]},{d},{a[1]})", f"({a[2]},{D},{a[3]},{period})", aic) for a, aic in scores.items()],
+        columns=["order", "seasonal_order", "aic"],
+    ).sort_values("aic", ignore_index=True)
+    return OrderSearch((p, d, q), (P, D, Q, period), trend, scores[best], candidates)
+
+
+def search_targets(targets=None, workers=None, results_dir=RESULTS_DIR, progress=None, **search):
+    """Search every target with one shared pool and save the best orders
+
+    Returns ``{target: OrderSearch}``; the orders are also written to
+    ``<results_dir>/arima_orders.json``.
+    """
+    targets = list(targets or backtest.TARGETS)
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    workers = workers or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=limit_threads, initargs=(workers,)) as pool:
+        for target in targets:
+            report = None if progress is None else (lambda done, target=target: progress(target, done))
+            results[target] = search_orders(data.load_series(target), pool=pool,
+                                            progress=report, **search)
+    save_orders(results, results_dir)
+    return results
+
+
+def save_orders(results, results_dir=RESULTS_DIR):
+    path = os.path.join(results_dir, ORDERS_NAME)
+    orders = load_orders(results_dir)
+    searched_at = pd.Timestamp.now().isoformat()
+    for target, result in results.items():
+        orders[target] = {"order": list(result.order), "seasonal_order": list(result.seasonal_order),
+                          "trend": result.trend, "aic": result.aic, "searched_at": searched_at}
+    os.makedirs(results_dir, exist_ok=True)
+    with open(path + ".tmp", "w") as f:
+        json.dump(orders, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+@functools.lru_cache(maxsize=4)
+def _read_orders(path, mtime):
+    # ``mtime`` is only part of the cache key, so a new search is reloaded
+    with open(path) as f:
+        return json.load(f)
+
+
+def load_orders(results_dir=RESULTS_DIR):
+    """Saved best orders by target, or an empty dict"""
+    path = os.path.join(results_dir, ORDERS_NAME)
+    if not os.path.exists(path):
+        return {}
+    return dict(_read_orders(path, os.path.getmtime(path)))
+
+
+def model_settings(model, target, results_dir=RESULTS_DIR):
+    """Constructor arguments of ``model`` for ``target`` from the saved search
+
+    SARIMAX gets the order last searched for ``target``; other models, and
+    targets that were never searched, keep their defaults (``{}``).
+    """
+    entry = load_orders(results_dir).get(target) if model == SarimaxForecaster.name else None
+    if entry is None:
+        return {}
+    return {"order": tuple(entry["order"]), "seasonal_order": tuple(entry["seasonal_order"]),
+            "trend": entry["trend"]}
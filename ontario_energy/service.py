@@ -0,0 +1,218 @@
+"""Forecasting service behind the Predict pages.
+
+``ForecastService.forecast(model, target, duration)`` loads the target
+history and returns the daily forecast; ``forecast_interval`` returns it
+with the model's ``INTERVAL_LEVEL`` prediction interval. It is served, in order, from
+memory, from the batch forecasts table written by ``ontario_energy.batch``
+(when it was computed from the same history), or by fetching the fitted
+model from ``ModelCache``. When the data changed, the previous fit of the
+same model and target is updated with the new observations if the model
+supports it, and fitted from scratch otherwise. Forecast durations do not
+affect the fit, so all three options share one model. Models are built
+with the settings ``order_search`` saved for the target (the SARIMAX
+order), which are part of the cache key, so a re-tune means a new fit.
+
+The ensemble is served by stacking its members' forecasts, fetched
+concurrently through the same path, with weights learned from their
+latest backtest; no ensemble model is ever fitted.
+
+Every forecast served from outside the memo is also recorded in the
+``ForecastStore``, issued at the last day of its history, so the pages
+can query and score it later. Where each forecast was served from, and
+the time spent fitting, updating and forecasting, are recorded in the
+``instrumentation`` registry.
+"""
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from . import backtest, data, order_search
+from .cache import ModelCache, hash_series, hash_settings
+from .config import RESULTS_DIR
+from .ensemble import combine_intervals, stacking_weights
+from .instrumentation import count, span
+from .intervals import INTERVAL_LEVEL
+from .models import MODELS, EnsembleForecaster, create_model
+from .store import ForecastStore, describe_model
+
+DURATION_DAYS = {
+    "2 Years": 2 * 365,
+    "5 Years": 5 * 365 + 1,
+    "10 Years": 10 * 365 + 2,
+}
+
+FORECASTS_NAME = "forecasts.parquet"
+
+
+@functools.lru_cache(maxsize=4)
+def _read_forecasts(path, mtime):
+    # ``mtime`` is only part of the cache key, so a new batch run is reloaded
+    frame = pd.read_parquet(path)
+    return {key: group.set_index(pd.DatetimeIndex(group["day"], name="day"))
+            for key, group in frame.groupby(["model", "target", "duration"])}
+
+
+def load_forecasts(results_dir=RESULTS_DIR):
+    """The latest batch forecasts table, or None if none has been written"""
+    path = os.path.join(results_dir, FORECASTS_NAME)
+    if not os.path.exists(path):
+        return None
+    return pd.read_parquet(path)
+
+
+def precomputed_forecast(model, target, duration, history, settings="default", results_dir=RESULTS_DIR):
+    """Batch forecast and interval made from the history with hash ``history``, or None
+
+    ``settings`` is the ``hash_settings`` of the model's arguments, which
+    must also match the batch run's.
+    """
+    path = os.path.join(results_dir, FORECASTS_NAME)
+    if not os.path.exists(path):
+        return None
+    group = _read_forecasts(path, os.path.getmtime(path)).get((model, target, duration))
+    # Tables written before intervals or settings were added are recomputed
+    if (group is None or "lower" not in group or "settings" not in group
+            or group["history"].iloc[0] != history or group["settings"].iloc[0] != settings):
+        return None
+    return group[["forecast", "lower", "upper"]]
+
+
+@functools.lru_cache(maxsize=16)
+def _ensemble_weights(path, mtime, target, members, results_dir):
+    predictions = backtest.load_predictions(results_dir)
+    rows = predictions[(predictions["target"] == target) & predictions["model"].isin(members)]
+    if set(rows["model"]) != set(members):
+        return None
+    # The longest test period backtested has the most folds to learn from
+    longest = max(rows["test_period"].unique(), key=backtest.TEST_PERIODS.get)
+    rows = rows[rows["test_period"] == longest]
+    table = rows.pivot_table(index="day", columns="model", values="predicted")
+    actual = rows.groupby("day")["actual"].first().reindex(table.index)
+    return stacking_weights(actual, table[list(members)])
+
+
+def ensemble_weights(target, members, results_dir=RESULTS_DIR):
+    """Stacking weights of ``members`` from their latest backtest, or None
+
+    None (equal weights) until every member has been backtested on
+    ``target``. Weights are recomputed only when the backtest table changes.
+    """
+    path = os.path.join(results_dir, backtest.PREDICTIONS_NAME)
+    if not os.path.exists(path):
+        return None
+    return _ensemble_weights(path, os.path.getmtime(path), target, tuple(members), results_dir)
+
+
+class ForecastService:
+    """Cached model fitting and forecasting for every (model, target) pair"""
+
+    def __init__(self, cache=None, results_dir=RESULTS_DIR, store=None):
+        self.cache = cache if cache is not None else ModelCache()
+        self.results_dir = results_dir
+        self.store = store if store is not None else ForecastStore(results_dir)
+        self._forecasts = {}
+        self._lock = threading.Lock()
+
+    def _key(self, model, target):
+        """History, settings and cache key ``(model, target, settings, history)``"""
+        series = data.load_series(target)
+        settings = order_search.model_settings(model, target, self.results_dir)
+        return series, settings, (data.slugify(model), data.slugify(target), hash_settings(settings),
+                                  hash_series(series))
+
+    def fitted_model(self, model, target):
+        """Return the model fitted on the current history of ``target``"""
+        series, settings, key = self._key(model, target)
+        return self.cache.get_or_fit(key, lambda: self._fit(model, series, settings, key)), key
+
+    def _fit(self, model, series, settings, key):
+        # Only a previous fit with the same settings is updated; a re-tuned model is fitted cold
+        previous = self.cache.latest(key[:3])
+        if previous is not None and hasattr(previous, "update"):
+            try:
+                with span("service.update"):
+                    updated = previous.update(series)
+                count("service.updated")
+                return updated
+            except ValueError:
+                pass
+        with span("service.fit"):
+            fitted = create_model(model, **settings).fit(series)
+        count("service.fitted")
+        return fitted
+
+    def forecast(self, model, target, duration):
+        """Daily point forecast of ``target`` over ``duration``"""
+        return self.forecast_interval(model, target, duration)["forecast"]
+
+    def forecast_interval(self, model, target, duration):
+        """Daily ``forecast``, ``lower`` and ``upper`` of ``target`` over ``duration``
+
+        The bounds are the ``INTERVAL_LEVEL`` prediction interval.
+        """
+        if duration not in DURATION_DAYS:
+            raise ValueError(f"Unknown forecast duration {duration!r}")
+        if model == EnsembleForecaster.name:
+            return self.ensemble_forecast(target, duration)
+        series, _, key = self._key(model, target)
+        forecast_key = key + (duration,)
+        with self._lock:
+            if forecast_key in self._forecasts:
+                count("service.memo_hit")
+                return self._forecasts[forecast_key]
+        forecast = precomputed_forecast(model, target, duration, key[3], key[2], self.results_dir)
+        if forecast is None:
+            fitted, key = self.fitted_model(model, target)
+            with span("service.forecast"):
+                forecast = fitted.forecast_interval(DURATION_DAYS[duration], INTERVAL_LEVEL)
+            self._record(model, target, series, key, forecast, describe_model(fitted))
+        else:
+            count("service.batch_hit")
+            self._record(model, target, series, key, forecast, {"source": "batch"})
+        with self._lock:
+            self._forecasts[forecast_key] = forecast
+        return forecast
+
+    def ensemble_forecast(self, target, duration, weights=None):
+        """Stack the members' forecasts with ``weights`` or the learned ones
+
+        Member forecasts come from the memo, the batch table or the model
+        cache, so trying other weights never refits a member. The forecast
+        with the learned weights is memoized and recorded like a single
+        model's. Returns the stacked ``forecast``, ``lower`` and ``upper``
+        columns.
+        """
+        learned = weights is None
+        if learned:
+            series, _, key = self._key(EnsembleForecaster.name, target)
+            forecast_key = key + (duration,)
+            with self._lock:
+                if forecast_key in self._forecasts:
+                    count("service.memo_hit")
+                    return self._forecasts[forecast_key]
+        members = [name for name in EnsembleForecaster().members if name in MODELS]
+        # Each member runs in a copy of this context, so its spans join the caller's request
+        contexts = [contextvars.copy_context() for _ in members]
+        with ThreadPoolExecutor(max_workers=len(members)) as pool:
+            frames = pool.map(lambda context, member: context.run(
+                self.forecast_interval, member, target, duration), contexts, members)
+            frames = dict(zip(members, frames))
+        if learned:
+            weights = ensemble_weights(target, members, self.results_dir)
+        forecast = combine_intervals(frames, weights)
+        if learned:
+            weights = None if weights is None else weights.to_dict()
+            self._record(EnsembleForecaster.name, target, series, key, forecast,
+                         {"members": members, "weights": weights})
+            with self._lock:
+                self._forecasts[forecast_key] = forecast
+        return forecast
+
+    def _record(self, model, target, series, key, forecast, metadata):
+        self.store.record(model, target, forecast.assign(issued_at=series.index[-1],
+                                                         valid_at=forecast.index),
+                          history=key[3], metadata=metadata)
@@ -0,0 +1,281 @@
+"""SQLite store of issued forecasts, their intervals and realized actuals.
+
+Every forecast is stored as one row per valid time under the key
+(model, target, kind, issue time, valid time), where ``kind`` separates
+live forecasts from backtest folds. An ``issues`` table holds the history
+hash and model metadata of each issue, and ``actuals`` the observed value
+of every target and day. Tables are ``WITHOUT ROWID``, so each one is
+clustered on its key and a range query over one model and target reads
+a contiguous run of the B-tree.
+
+Error metrics are aggregated in SQL over a join with the actuals. The
+Predict and Evaluation pages read stored results rather than rebuilding
+forecasts and scores on every submit. Times are stored as integer seconds
+since the epoch.
+"""
+import contextlib
+import json
+import math
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from .config import RESULTS_DIR
+from .instrumentation import timed
+
+STORE_NAME = "forecasts.sqlite"
+
+FORECAST = "forecast"
+BACKTEST = "backtest"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS issues (
+    model TEXT NOT NULL,
+    target TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    issued_at INTEGER NOT NULL,
+    history TEXT,
+    created_at INTEGER NOT NULL,
+    metadata TEXT,
+    PRIMARY KEY (model, target, kind, issued_at)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS forecasts (
+    model TEXT NOT NULL,
+    target TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    issued_at INTEGER NOT NULL,
+    valid_at INTEGER NOT NULL,
+    forecast REAL NOT NULL,
+    lower REAL,
+    upper REAL,
+    PRIMARY KEY (model, target, kind, issued_at, valid_at)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS actuals (
+    target TEXT NOT NULL,
+    valid_at INTEGER NOT NULL,
+    actual REAL NOT NULL,
+    PRIMARY KEY (target, valid_at)
+) WITHOUT ROWID;
+"""
+
+# The last ``:last`` issues of every model (all of them when ``:last`` is NULL)
+RECENT_ISSUES = """
+WITH recent AS (
+    SELECT model, issued_at FROM (
+        SELECT model, issued_at,
+               ROW_NUMBER() OVER (PARTITION BY model ORDER BY issued_at DESC) AS recency
+        FROM issues
+        WHERE target = :target AND kind = :kind {models})
+    WHERE :last IS NULL OR recency <= :last
+)
+"""
+
+
+def _seconds(times):
+    return pd.DatetimeIndex(times).as_unit("s").asi8
+
+
+def _times(seconds):
+    return pd.to_datetime(np.asarray(seconds, dtype=np.int64), unit="s")
+
+
+def describe_model(model):
+    """Hyperparameters of a model: its public attributes that are not fitted state"""
+    return {name: value for name, value in vars(model).items()
+            if not name.startswith("_") and not name.endswith("_")}
+
+
+class ForecastStore:
+    """Forecasts, intervals, issue metadata and actuals in one SQLite file
+
+    Each call opens its own connection, so one store can be shared by
+    threads, and separate processes can write to the same file.
+    """
+
+    def __init__(self, results_dir=RESULTS_DIR, name=STORE_NAME):
+        self.path = os.path.join(results_dir, name)
+        os.makedirs(results_dir, exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(SCHEMA)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    @timed("store.record")
+    def record(self, model, target, forecasts, kind=FORECAST, history=None, metadata=None):
+        """Store one or more issues of ``model`` for ``target``
+
+        ``forecasts`` has ``issued_at``, ``valid_at`` and ``forecast``
+        columns and optionally ``lower`` and ``upper``. Rows of an issue
+        made from another history are replaced; otherwise the new rows are
+        merged into it, so a longer horizon extends a shorter one.
+        """
+        forecasts = forecasts.reset_index(drop=True)
+        issued = _seconds(forecasts["issued_at"])
+        bounds = {column: forecasts[column].to_numpy(dtype=np.float64) if column in forecasts
+                  else np.full(len(forecasts), np.nan) for column in ("lower", "upper")}
+        rows = zip([model] * len(forecasts), [target] * len(forecasts), [kind] * len(forecasts),
+                   issued.tolist(), _seconds(forecasts["valid_at"]).tolist(),
+                   forecasts["forecast"].to_numpy(dtype=np.float64).tolist(),
+                   # NULL rather than NaN for missing interval bounds
+                   [None if math.isnan(v) else v for v in bounds["lower"].tolist()],
+                   [None if math.isnan(v) else v for v in bounds["upper"].tolist()])
+        created_at = int(pd.Timestamp.now().timestamp())
+        metadata = json.dumps(metadata, default=str) if metadata is not None else None
+        key = "model = ? AND target = ? AND kind = ? AND issued_at = ?"
+        with self._connect() as db:
+            for issue in np.unique(issued).tolist():
+                db.execute(f"DELETE FROM forecasts WHERE {key} AND EXISTS ("
+                           f"SELECT 1 FROM issues WHERE {key} AND history IS NOT ?)",
+                           (model, target, kind, issue) * 2 + (history,))
+                db.execute("INSERT OR REPLACE INTO issues VALUES (?, ?, ?, ?, ?, ?, ?)",
+                           (model, target, kind, issue, history, created_at, metadata))
+            db.executemany("INSERT OR REPLACE INTO forecasts VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def drop_stale(self, model, target, kind, history):
+        """Delete the issues of ``model`` and ``target`` made from any other history"""
+        key = "model = ? AND target = ? AND kind = ?"
+        with self._connect() as db:
+            db.execute(f"DELETE FROM forecasts WHERE {key} AND issued_at IN ("
+                       f"SELECT issued_at FROM issues WHERE {key} AND history IS NOT ?)",
+                       (model, target, kind) * 2 + (history,))
+            db.execute(f"DELETE FROM issues WHERE {key} AND history IS NOT ?",
+                       (model, target, kind, history))
+
+    def record_actuals(self, target, series):
+        """Insert or correct the observed values of ``target``"""
+        series = series.dropna()
+        rows = zip([target] * len(series), _seconds(series.index).tolist(),
+                   series.to_numpy(dtype=np.float64).tolist())
+        with self._connect() as db:
+            db.executemany("INSERT INTO actuals VALUES (?, ?, ?) "
+                           "ON CONFLICT (target, valid_at) DO UPDATE SET actual = excluded.actual "
+                           "WHERE actual IS NOT excluded.actual", rows)
+
+    def latest_issue(self, model, target, kind=FORECAST):
+        """Time of the latest issue of ``model`` for ``target``, or None"""
+        with self._connect() as db:
+            (issued,), = db.execute("SELECT MAX(issued_at) FROM issues "
+                                    "WHERE model = ? AND target = ? AND kind = ?",
+                                    (model, target, kind))
+        return None if issued is None else _times([issued])[0]
+
+    def metadata(self, model, target, issued_at, kind=FORECAST):
+        """History hash, creation time and metadata of one issue, or None"""
+        with self._connect() as db:
+            row = db.execute("SELECT history, created_at, metadata FROM issues "
+                             "WHERE model = ? AND target = ? AND kind = ? AND issued_at = ?",
+                             (model, target, kind, int(_seconds([issued_at])[0]))).fetchone()
+        if row is None:
+            return None
+        history, created_at, metadata = row
+        return {"history": history, "created_at": _times([created_at])[0],
+                "metadata": json.loads(metadata) if metadata is not None else None}
+
+    def _issue(self, model, target, issued_at, kind, start, end):
+        if issued_at is None:
+            issued_at = self.latest_issue(model, target, kind)
+        params = {"model": model, "target": target, "kind": kind}
+        for name, time in (("issued_at", issued_at), ("start", start), ("end", end)):
+            params[name] = None if time is None else int(_seconds([time])[0])
+        return params
+
+    def forecasts(self, model, target, issued_at=None, kind=FORECAST, start=None, end=None):
+        """One issue's forecasts from ``start`` to ``end`` with any realized actuals
+
+        ``issued_at`` defaults to the latest issue. Returns a frame indexed
+        by valid time with ``forecast``, ``lower``, ``upper`` and ``actual``.
+        """
+        params = self._issue(model, target, issued_at, kind, start, end)
+        with self._connect() as db:
+            frame = pd.read_sql_query(
+                "SELECT f.valid_at, f.forecast, f.lower, f.upper, a.actual FROM forecasts f "
+                "LEFT JOIN actuals a ON a.target = f.target AND a.valid_at = f.valid_at "
+                "WHERE f.model = :model AND f.target = :target AND f.kind = :kind "
+                "AND f.issued_at = :issued_at "
+                "AND (:start IS NULL OR f.valid_at >= :start) AND (:end IS NULL OR f.valid_at <= :end) "
+                "ORDER BY f.valid_at", db, params=params)
+        frame.index = pd.DatetimeIndex(_times(frame.pop("valid_at")), name="day")
+        return frame.astype(np.float64)
+
+    @timed("store.monthly")
+    def monthly(self, model, target, issued_at=None, kind=FORECAST, start=None, end=None):
+        """Monthly means of one issue's forecast and interval bounds"""
+        params = self._issue(model, target, issued_at, kind, start, end)
+        with self._connect() as db:
+            frame = pd.read_sql_query(
+                "SELECT strftime('%Y-%m-01', valid_at, 'unixepoch') AS month, AVG(forecast) AS forecast, "
+                "AVG(lower) AS lower, AVG(upper) AS upper FROM forecasts "
+                "WHERE model = :model AND target = :target AND kind = :kind AND issued_at = :issued_at "
+                "AND (:start IS NULL OR valid_at >= :start) AND (:end IS NULL OR valid_at <= :end) "
+                "GROUP BY month ORDER BY month", db, params=params)
+        frame.index = pd.DatetimeIndex(pd.to_datetime(frame.pop("month")), name="month")
+        return frame.astype(np.float64)
+
+    def _recent(self, target, kind, models):
+        params = {"target": target, "kind": kind}
+        names = ""
+        if models is not None:
+            params.update({f"model{i}": model for i, model in enumerate(models)})
+            names = "AND model IN ({})".format(", ".join(f":model{i}" for i in range(len(models))))
+        return RECENT_ISSUES.format(models=names), params
+
+    @timed("store.predictions")
+    def predictions(self, model, target, kind=BACKTEST, last=None):
+        """Forecasts of the last ``last`` issues of ``model`` joined with actuals
+
+        For backtests these are the fold predictions of a test period, in
+        the ``day``/``actual``/``predicted`` layout of the backtest tables.
+        """
+        recent, params = self._recent(target, kind, [model])
+        params["last"] = last
+        with self._connect() as db:
+            frame = pd.read_sql_query(
+                recent + "SELECT f.issued_at, f.valid_at AS day, a.actual, f.forecast AS predicted "
+                "FROM recent r JOIN forecasts f ON f.model = r.model AND f.target = :target "
+                "AND f.kind = :kind AND f.issued_at = r.issued_at "
+                "JOIN actuals a ON a.target = f.target AND a.valid_at = f.valid_at "
+                "ORDER BY f.issued_at, f.valid_at", db, params=params)
+        frame["issued_at"] = _times(frame["issued_at"])
+        frame["day"] = _times(frame["day"])
+        return frame
+
+    @timed("store.metrics")
+    def metrics(self, target, kind=BACKTEST, last=None, models=None):
+        """Scores of every model's last ``last`` issues against the actuals
+
+        RMSE, MAE, MAPE and sMAPE as in ``metrics.score``, plus the interval
+        coverage of issues stored with bounds. With ``last`` set, models
+        with fewer issues than that are left out rather than scored on a
+        shorter period. Returns long-format rows of ``model``, ``metric``
+        and ``value``.
+        """
+        recent, params = self._recent(target, kind, models)
+        params["last"] = last
+        with self._connect() as db:
+            frame = pd.read_sql_query(
+                recent + "SELECT f.model, "
+                "AVG((f.forecast - a.actual) * (f.forecast - a.actual)) AS mse, "
+                "AVG(ABS(f.forecast - a.actual)) AS MAE, "
+                "100.0 * AVG(ABS((f.forecast - a.actual) / a.actual)) AS MAPE, "
+                "200.0 * AVG(ABS(f.forecast - a.actual) / (ABS(a.actual) + ABS(f.forecast))) AS sMAPE, "
+                "100.0 * AVG(CASE WHEN f.lower IS NULL OR f.upper IS NULL THEN NULL "
+                "WHEN a.actual BETWEEN f.lower AND f.upper THEN 1.0 ELSE 0.0 END) AS Coverage "
+                "FROM recent r JOIN forecasts f ON f.model = r.model AND f.target = :target "
+                "AND f.kind = :kind AND f.issued_at = r.issued_at "
+                "JOIN actuals a ON a.target = f.target AND a.valid_at = f.valid_at "
+                "GROUP BY f.model HAVING :last IS NULL OR COUNT(DISTINCT f.issued_at) = :last",
+                db, params=params)
+        # SQLite has no square root without its optional math functions
+        frame.insert(1, "RMSE", np.sqrt(frame.pop("mse").astype(np.float64)))
+        frame = frame.melt(id_vars="model", var_name="metric", value_name="value")
+        return frame.dropna(subset=["value"]).reset_index(drop=True)
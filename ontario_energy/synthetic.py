@@ -0,0 +1,171 @@
+"""Deterministic demo series used when no real data has been loaded.
+
+The shapes follow what the front ends used to draw inline: roughly 18 GW of
+demand with winter/summer peaks and a weekday effect, a ~$50/MWh price,
+hourly demand with a real daily profile, temperature and an economic
+index. The same seed always gives the same history, so caches
+keyed on the data stay valid between runs.
+
+``household_energy`` and ``daily_weather`` generate the notebook's raw
+inputs (smart-meter blocks and Dark Sky weather) at any size, for the
+benchmark suite.
+"""
+import numpy as np
+import pandas as pd
+from scipy.signal import lfilter
+
+from .weather import WEATHER_COLUMNS
+
+TARGET_SHAPES = {
+    "Electricity Demand": {"base": 18000.0, "seasonal": 1500.0, "weekly": 1200.0,
+                           "trend": 150.0, "noise": 400.0},
+    "Price": {"base": 50.0, "seasonal": 8.0, "weekly": 4.0, "trend": 2.0, "noise": 5.0},
+}
+
+
+def target_series(target, end=None, years=10, seed=0):
+    """Daily history of ``target`` ending at ``end`` (yesterday by default)"""
+    if target not in TARGET_SHAPES:
+        raise ValueError(f"Unknown target {target!r}")
+    shape = TARGET_SHAPES[target]
+    if end is None:
+        end = pd.Timestamp.now().normalize() - pd.Timedelta(days=1)
+    index = pd.date_range(end=end, periods=int(round(years * 365.25)), freq="D", name="day")
+
+    rng = np.random.default_rng(seed)
+    day_of_year = index.dayofyear.to_numpy()
+    # Two peaks a year: heating in January and cooling in July
+    seasonal = np.cos(4 * np.pi * (day_of_year - 15) / 365.25)
+    weekday = np.where(index.dayofweek.to_numpy() < 5, 1.0, -1.0)
+    trend = np.arange(len(index)) / 365.25
+
+    values = (shape["base"] + shape["seasonal"] * seasonal + shape["weekly"] * weekday
+              + shape["trend"] * trend + ar1_noise(rng, shape["noise"], len(index)))
+    return pd.Series(values, index=index, name=target)
+
+
+def hourly_demand(end=None, years=5, seed=1):
+    """Hourly Ontario-style demand in MW ending at ``end`` (this hour by default)"""
+    if end is None:
+        end = pd.Timestamp.now().floor("h")
+    index = pd.date_range(end=end, periods=int(round(years * 365.25 * 24)), freq="h", name="time")
+
+    rng = np.random.default_rng(seed)
+    hour = index.hour.to_numpy()
+    day_of_year = index.dayofyear.to_numpy()
+    # Morning and evening peaks over an overnight trough
+    daily = -np.cos(2 * np.pi * hour / 24) + 0.4 * np.cos(4 * np.pi * (hour - 18) / 24)
+    seasonal = np.cos(4 * np.pi * (day_of_year - 15) / 365.25)
+    weekday = np.where(index.dayofweek.to_numpy() < 5, 1.0, -1.0)
+
+    values = (16000 + 2500 * daily + 1500 * seasonal + 800 * weekday
+              + ar1_noise(rng, 150.0, len(index), phi=0.95))
+    return pd.Series(values, index=index, name="Energy Demand (MW)")
+
+
+# IESO transmission zones, with each zone's rough share of provincial demand
+ZONES = {
+    "Northwest": 0.03, "Northeast": 0.08, "Ottawa": 0.10, "East": 0.06, "Toronto": 0.33,
+    "Essa": 0.07, "Bruce": 0.01, "Southwest": 0.19, "Niagara": 0.03, "West": 0.10,
+}
+
+
+def zonal_demand(end=None, years=2, zones=None, seed=4):
+    """Hourly demand of every zone, one column each, ending at ``end``
+
+    ``zones`` is a list of names or a number of synthetic zones; every zone
+    shares the provincial daily and seasonal shape with its own noise.
+    """
+    if zones is None:
+        zones = list(ZONES)
+    elif isinstance(zones, int):
+        zones = [f"Zone {i + 1}" for i in range(zones)]
+    shares = np.array([ZONES.get(zone, 1.0 / len(zones)) for zone in zones])
+    shares = shares / shares.sum()
+    total = hourly_demand(end=end, years=years, seed=seed)
+
+    rng = np.random.default_rng(seed)
+    noise = lfilter([1.0], [1.0, -0.9], rng.normal(0.0, 0.01, (len(zones), len(total))), axis=1)
+    values = total.to_numpy()[None, :] * shares[:, None] * (1 + noise)
+    return pd.DataFrame(values.T.astype(np.float32), index=total.index, columns=zones)
+
+
+def daily_temperature(end=None, years=5, seed=2):
+    """Daily Toronto-like mean temperature in degrees Celsius"""
+    if end is None:
+        end = pd.Timestamp.now().normalize()
+    index = pd.date_range(end=end, periods=int(round(years * 365.25)), freq="D", name="time")
+
+    rng = np.random.default_rng(seed)
+    seasonal = -np.cos(2 * np.pi * (index.dayofyear.to_numpy() - 20) / 365.25)
+    values = 9 + 14 * seasonal + ar1_noise(rng, 2.5, len(index))
+    return pd.Series(values, index=index, name="Temperature (°C)")
+
+
+def economic_index(end=None, years=5, seed=3):
+    """Daily economic activity index with a slow upward trend"""
+    if end is None:
+        end = pd.Timestamp.now().normalize()
+    index = pd.date_range(end=end, periods=int(round(years * 365.25)), freq="D", name="time")
+
+    rng = np.random.default_rng(seed)
+    trend = np.linspace(0, 4 * years, len(index))
+    seasonal = 5 * np.sin(2 * np.pi * index.dayofyear.to_numpy() / 365.25)
+    values = 100 + trend + seasonal + ar1_noise(rng, 0.5, len(index), phi=0.98)
+    return pd.Series(values, index=index, name="Economic Index")
+
+
+def household_energy(households=200, years=1, end=None, seed=5):
+    """Daily smart-meter readings in the ``day``/``LCLid``/``energy_sum`` block layout
+
+    Households join over the first half of the period, as in the London
+    trial behind the notebook, so the number reporting varies by day.
+    """
+    if end is None:
+        end = pd.Timestamp.now().normalize() - pd.Timedelta(days=1)
+    index = pd.date_range(end=end, periods=int(round(years * 365.25)), freq="D", name="day")
+
+    rng = np.random.default_rng(seed)
+    joined = rng.integers(0, len(index) // 2 + 1, households)
+    level = rng.lognormal(np.log(10.0), 0.4, households)
+    seasonal = 1 + 0.25 * np.cos(2 * np.pi * (index.dayofyear.to_numpy() - 15) / 365.25)
+    values = level[:, None] * seasonal[None, :] * rng.gamma(20.0, 1 / 20.0, (households, len(index)))
+    household, day = np.nonzero(np.arange(len(index))[None, :] >= joined[:, None])
+    names = [f"MAC{i:06d}" for i in range(households)]
+    return pd.DataFrame({
+        "day": index[day],
+        "LCLid": pd.Categorical.from_codes(household, names),
+        "energy_sum": values[household, day],
+    })
+
+
+def daily_weather(end=None, years=1, seed=6):
+    """Daily Dark Sky-style weather with ``time`` and every ``WEATHER_COLUMNS`` field"""
+    temperature = daily_temperature(end=end, years=years, seed=seed)
+    rng = np.random.default_rng(seed)
+    t = temperature.to_numpy()
+    n = len(t)
+    swing = 4 + rng.gamma(4.0, 1.0, n)
+    columns = {
+        "temperatureMax": t + swing / 2, "temperatureMin": t - swing / 2,
+        "temperatureHigh": t + swing / 2 - 0.5, "temperatureLow": t - swing / 2 + 0.5,
+        "apparentTemperatureMax": t + swing / 2 - 2, "apparentTemperatureMin": t - swing / 2 - 3,
+        "apparentTemperatureHigh": t + swing / 2 - 2.5, "apparentTemperatureLow": t - swing / 2 - 2.5,
+        "dewPoint": t - 5 + ar1_noise(rng, 1.5, n),
+        "humidity": np.clip(0.75 + ar1_noise(rng, 0.06, n), 0.2, 1.0),
+        "pressure": 1013 + ar1_noise(rng, 6.0, n, phi=0.8),
+        "windSpeed": rng.gamma(2.0, 2.0, n), "windBearing": rng.integers(0, 360, n),
+        "cloudCover": rng.uniform(0.0, 1.0, n), "visibility": np.clip(rng.normal(11.0, 2.0, n), 0.5, 16.0),
+        "uvIndex": np.clip(np.round(4 + 3 * np.sin(2 * np.pi * (temperature.index.dayofyear - 80) / 365.25)),
+                           0, None),
+        "moonPhase": (np.arange(n) / 29.53) % 1.0,
+    }
+    frame = pd.DataFrame({column: np.asarray(columns[column], dtype=np.float64)
+                          for column in WEATHER_COLUMNS})
+    frame.insert(0, "time", temperature.index)
+    return frame
+
+
+def ar1_noise(rng, scale, size, phi=0.7):
+    """AR(1) noise so the series have some persistence for models to learn"""
+    return lfilter([1.0], [1.0, -phi], rng.normal(0.0, scale, size))
@@ -0,0 +1,200 @@
+"""LSTM training on windowed sequences streamed through ``tf.data``.
+
+The notebook fed Keras in-memory arrays reshaped to ``(samples, 1, lags)``,
+so every sample was a single timestep holding all the lags. Here the
+training data are ``(lags, 1)`` sequences cut from 1-D segments of a
+series by ``window_dataset``: segments come from a generator (an in-memory
+array, or one zone at a time from the hourly Parquet dataset), are framed,
+scaled and stripped of windows with gaps in a parallel ``map``, rebatched
+and prefetched, so windows are cut while the previous batch trains and no
+window matrix is ever materialised.
+
+``fit_model`` trains under a ``tf.distribute`` strategy (see
+``cpu_strategy``, which splits the CPU into data-parallel replicas), holds
+out the most recent windows to stop early on, and checkpoints the best
+weights so an interrupted retrain resumes from them.
+
+``train_zone_lstm`` puts these together for the hourly zonal dataset:
+one ``LstmForecaster`` per zone, saved under ``<DATA_DIR>/models/lstm/``.
+"""
+import os
+import pickle
+import warnings
+
+import numpy as np
+import pandas as pd
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from .config import DATA_DIR
+from .hourly import HOURLY_DIR, iter_chunks, open_hourly
+from .models import LstmForecaster
+
+LSTM_DIR = os.path.join(DATA_DIR, "models", "lstm")
+
+
+def cpu_strategy(replicas=None):
+    """Data-parallel ``MirroredStrategy`` over ``replicas`` logical CPUs
+
+    Each replica trains on its share of every batch and the gradients are
+    summed before the update. Logical devices can only be configured before
+    TensorFlow first runs anything; after that (or with one replica) the
+    existing devices are used.
+    """
+    import tensorflow as tf
+
+    replicas = replicas or os.cpu_count() or 1
+    if replicas > 1:
+        try:
+            cpu = tf.config.list_physical_devices("CPU")[0]
+            tf.config.set_logical_device_configuration(
+                cpu, [tf.config.LogicalDeviceConfiguration()] * replicas)
+        except RuntimeError:
+            pass
+    devices = [device.name for device in tf.config.list_logical_devices("CPU")]
+    if replicas < 2 or len(devices) < 2:
+        return tf.distribute.get_strategy()
+    return tf.distribute.MirroredStrategy(devices[:replicas])
+
+
+def window_dataset(segments, lags, batch_size=72, minimum=0.0, scale=1.0, shuffle=0, seed=None):
+    """Batches of ``(lags, 1)`` input sequences and their next values
+
+    ``segments`` is a callable returning an iterator of 1-D arrays, called
+    again for every epoch; windows never span two segments. Values are
+    scaled to ``(value - minimum) / scale`` and windows containing NaN are
+    dropped. ``shuffle`` is the size of the window shuffle buffer; with
+    the default 0 the windows stay in time order, as in the notebook.
+    """
+    import tensorflow as tf
+
+    autotune = tf.data.AUTOTUNE
+
+    def frame(segment):
+        windows = tf.signal.frame((segment - minimum) / scale, lags + 1, 1, axis=0)
+        return tf.boolean_mask(windows, tf.reduce_all(tf.math.is_finite(windows), axis=1))
+
+    def split(windows):
+        return windows[:, :lags, None], windows[:, lags:]
+
+    dataset = (tf.data.Dataset.from_generator(
+                   lambda: (np.asarray(segment, dtype=np.float32) for segment in segments()),
+                   output_signature=tf.TensorSpec((None,), tf.float32))
+               .filter(lambda segment: tf.size(segment) > lags)
+               .map(frame, num_parallel_calls=autotune, deterministic=True))
+    if shuffle:
+        dataset = dataset.unbatch().shuffle(shuffle, seed=seed).batch(batch_size)
+    else:
+        dataset = dataset.rebatch(batch_size)
+    return dataset.map(split, num_parallel_calls=autotune).prefetch(autotune)
+
+
+def fit_model(build, train, validation=None, epochs=50, patience=5, checkpoint=None, strategy=None):
+    """Build a model under ``strategy`` and fit it on the ``train`` dataset
+
+    With ``validation`` the fit stops once the validation loss has not
+    improved for ``patience`` epochs and the best weights are restored.
+    ``checkpoint`` (a ``.weights.h5`` path) keeps the best weights seen so
+    far; if it already exists training resumes from it, and it is only
+    replaced by weights that beat it on the validation windows. Returns
+    the model and the Keras history.
+    """
+    import keras
+
+    strategy = strategy or cpu_strategy(1)
+    with strategy.scope():
+        model = build()
+        # Optimizer slots must exist for a checkpoint to restore them
+        model.optimizer.build(model.trainable_variables)
+    resumed = None
+    if checkpoint is not None and os.path.exists(checkpoint):
+        model.load_weights(checkpoint)
+        if validation is not None:
+            resumed = model.evaluate(validation, verbose=0)
+
+    monitor = "val_loss" if validation is not None else "loss"
+    callbacks = []
+    if patience:
+        callbacks.append(keras.callbacks.EarlyStopping(monitor=monitor, patience=patience,
+                                                       restore_best_weights=True))
+    if checkpoint is not None:
+        os.makedirs(os.path.dirname(checkpoint) or ".", exist_ok=True)
+        callbacks.append(keras.callbacks.ModelCheckpoint(checkpoint, monitor=monitor, save_best_only=True,
+                                                         save_weights_only=True,
+                                                         initial_value_threshold=resumed))
+    with warnings.catch_warnings():
+        # Streamed datasets have no length, which Keras reports every epoch
+        warnings.filterwarnings("ignore", "Your input ran out of data", UserWarning)
+        history = model.fit(train, validation_data=validation, epochs=epochs, verbose=0, shuffle=False,
+                            callbacks=callbacks)
+    if resumed is not None and min(history.history[monitor]) >= resumed:
+        model.load_weights(checkpoint)
+    return model, history
+
+
+def _zone_path(directory, name, suffix):
+    return os.path.join(directory, "".join(c if c.isalnum() else "_" for c in name) + suffix)
+
+
+def zone_history(dataset_dir, name):
+    """Minimum, maximum and last hour of one series in the hourly dataset"""
+    table = open_hourly(dataset_dir).to_table(columns=["time", "value"],
+                                              filter=ds.field("series") == name)
+    if table.num_rows == 0:
+        raise ValueError(f"No hourly data for {name!r}")
+    bounds = pc.min_max(table["value"]).as_py()
+    return bounds["min"], bounds["max"], pd.Timestamp(pc.max(table["time"]).as_py())
+
+
+def train_zone_lstm(name, dataset_dir=HOURLY_DIR, lags=168, units=50, epochs=50, batch_size=256,
+                    patience=5, validation_days=28, months=6, strategy=None, directory=LSTM_DIR):
+    """Train and save the sequence LSTM of one hourly series (e.g. a zone)
+
+    The series is streamed from the Parquet dataset ``months`` at a time
+    for every epoch. The last ``validation_days`` are held out for early
+    stopping. Returns the fitted ``LstmForecaster``.
+    """
+    minimum, maximum, last = zone_history(dataset_dir, name)
+    cutoff = last - pd.Timedelta(days=validation_days)
+    forecaster = LstmForecaster(lags=lags, units=units, epochs=epochs, batch_size=batch_size,
+                                sequence=True, patience=patience)
+    forecaster.minimum_, forecaster.range_ = float(minimum), float(maximum - minimum) or 1.0
+
+    def segments(start=None, end=None):
+        # Chunks overlap by ``lags`` hours so no window is lost at a boundary
+        return lambda: (chunk[name].to_numpy() for chunk in iter_chunks(
+            dataset_dir, [name], start=start, end=end, months=months, overlap=lags))
+
+    options = dict(lags=lags, batch_size=batch_size, minimum=forecaster.minimum_,
+                   scale=forecaster.range_)
+    train = window_dataset(segments(end=cutoff - pd.Timedelta(hours=1)), **options)
+    validation = window_dataset(segments(start=cutoff - pd.Timedelta(hours=lags)), **options)
+    forecaster.model_, history = fit_model(
+        forecaster._build, train, validation, epochs=epochs, patience=patience,
+        checkpoint=_zone_path(directory, name, ".weights.h5"), strategy=strategy)
+    forecaster.history_ = history.history
+
+    # Only the recent hours are needed to forecast and calibrate intervals; the
+    # calibration targets fall in the validation days, which were not trained on
+    origins = min(forecaster.calibration, validation_days * 24 // 2)
+    horizon = min(forecaster.calibration_horizon, validation_days * 24 - origins + 1)
+    start = last - pd.Timedelta(hours=lags + origins + horizon)
+    tail = pd.concat(chunk[name] for chunk in iter_chunks(dataset_dir, [name], start=start, overlap=0))
+    tail = tail.interpolate(limit_direction="both")
+    forecaster._calibrate(tail.to_numpy(dtype=np.float32), origins, horizon)
+    forecaster._finish(tail)
+    save_zone_lstm(forecaster, name, directory)
+    return forecaster
+
+
+def save_zone_lstm(forecaster, name, directory=LSTM_DIR):
+    path = _zone_path(directory, name, ".pkl")
+    os.makedirs(directory, exist_ok=True)
+    with open(path + ".tmp", "wb") as f:
+        pickle.dump(forecaster, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(path + ".tmp", path)
+
+
+def load_zone_lstm(name, directory=LSTM_DIR):
+    with open(_zone_path(directory, name, ".pkl"), "rb") as f:
+        return pickle.load(f)
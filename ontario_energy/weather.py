@@ -0,0 +1,79 @@
+"""Compact, typed daily weather and the joined ``weather_energy`` table.
+
+Days are ``datetime64[ns]`` rather than Python ``date`` objects, so they
+are compared as int64. Weather measurements are float32, household counts
+int32, the holiday flag int8 and weather clusters categorical. Both sides
+are sorted by day before they are joined, so the join walks the two
+indexes once instead of hashing object keys.
+"""
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+
+from .calendars import HOLIDAY, CalendarService
+
+WEATHER_COLUMNS = [
+    "temperatureMax", "windBearing", "dewPoint", "cloudCover", "windSpeed",
+    "pressure", "apparentTemperatureHigh", "visibility", "humidity",
+    "apparentTemperatureLow", "apparentTemperatureMax", "uvIndex",
+    "temperatureLow", "temperatureMin", "temperatureHigh",
+    "apparentTemperatureMin", "moonPhase",
+]
+
+
+def read_weather(path, columns=WEATHER_COLUMNS):
+    """Read the daily Dark Sky CSV as a compact frame sorted by ``day``
+
+    Only ``time`` and ``columns`` are parsed, straight into float32.
+    """
+    table = pacsv.read_csv(path, convert_options=pacsv.ConvertOptions(
+        include_columns=["time"] + list(columns),
+        column_types={column: pa.float32() for column in columns},
+    ))
+    frame = table.to_pandas()
+    frame.insert(0, "day", pd.to_datetime(frame.pop("time")).dt.normalize())
+    return compact_weather(frame.dropna())
+
+
+def compact_weather(frame):
+    """Cast a weather frame to float32 and sort it by a unique ``day``"""
+    frame = frame.astype({column: np.float32 for column in frame.columns if column != "day"})
+    frame["day"] = pd.to_datetime(frame["day"]).astype("datetime64[ns]")
+    return frame.sort_values("day").drop_duplicates("day", keep="last").reset_index(drop=True)
+
+
+def compact_energy(frame):
+    """``day``, float32 energy columns and int32 household counts, sorted by day"""
+    types = {column: np.float32 for column in ("energy_sum", "avg_energy") if column in frame}
+    if "LCLid" in frame:
+        types["LCLid"] = np.int32
+    frame = frame.astype(types)
+    frame["day"] = pd.to_datetime(frame["day"]).astype("datetime64[ns]")
+    return frame.sort_values("day").reset_index(drop=True)
+
+
+def weather_energy_table(energy, weather):
+    """Inner join of daily energy and weather on ``day``
+
+    Both sides are compacted and joined on sorted, unique DatetimeIndexes,
+    which pandas merges in a single pass. ``day`` is kept as a column so
+    the result reads like the notebook's ``energy.merge(weather, on='day')``.
+    """
+    energy = compact_energy(energy).set_index("day")
+    weather = compact_weather(weather).set_index("day")
+    return energy.join(weather, how="inner").reset_index()
+
+
+def holiday_flags(days, holidays):
+    """int8 flag for every entry of ``days`` that is one of ``holidays``"""
+    days = pd.DatetimeIndex(days)
+    calendar = CalendarService(days.min(), days.max(), holidays=holidays, breaks=())
+    return (calendar.lookup(days) & HOLIDAY).astype(np.int8)
+
+
+def cluster_labels(labels, n_clusters=None):
+    """Weather-cluster labels as a categorical with every cluster listed"""
+    labels = np.asarray(labels)
+    categories = range(n_clusters if n_clusters is not None else labels.max() + 1)
+    return pd.Categorical(labels, categories=categories)
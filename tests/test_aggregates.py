@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from ontario_energy.aggregates import DailyAggregateStore
+from ontario_energy.ingest import ingest_blocks
+
+
+def write_block(directory, number, households, days, scale=1.0):
+    rows = [(day.strftime("%Y-%m-%d"), household, scale * (index + 1))
+            for index, (household, day) in enumerate((h, d) for h in households for d in days)]
+    frame = pd.DataFrame(rows, columns=["day", "LCLid", "energy_sum"])
+    frame.to_csv(directory / f"block_{number}.csv", index=False)
+
+
+@pytest.mark.parametrize("distinct", ["exact", "hll"])
+def test_rewritten_block_replaces_its_rows(tmp_path, distinct):
+    source, dataset = tmp_path / "csv", tmp_path / "energy"
+    source.mkdir()
+    days = pd.date_range("2013-01-30", "2013-02-03")
+    write_block(source, 0, ["MAC000001", "MAC000002"], days)
+    write_block(source, 1, ["MAC000003"], days)
+    store = DailyAggregateStore(tmp_path / "store", distinct=distinct)
+    store.append_blocks(dataset, ingest_blocks(source, dataset))
+    before = store.to_frame()
+
+    # Block 0 is revised: one household fewer, one day less and doubled energy
+    write_block(source, 0, ["MAC000001"], days[:-1], scale=2.0)
+    written = ingest_blocks(source, dataset)
+    assert written == [0]
+    assert DailyAggregateStore(tmp_path / "store", distinct=distinct).append_blocks(dataset, written) == [0]
+
+    revised = DailyAggregateStore(tmp_path / "store", distinct=distinct).to_frame()
+    rebuilt = DailyAggregateStore(tmp_path / "rebuilt", distinct=distinct)
+    rebuilt.append_blocks(dataset)
+    assert not revised.equals(before)
+    pd.testing.assert_frame_equal(revised, rebuilt.to_frame(), check_exact=False)
+    assert revised["LCLid"].tolist() == [2, 2, 2, 2, 1]
+    np.testing.assert_allclose(revised["energy_sum"], [2 + 1, 4 + 2, 6 + 3, 8 + 4, 5])
+
+
+@pytest.mark.parametrize("distinct", ["exact", "hll"])
+def test_repeated_pairs_add_energy_but_not_households(tmp_path, distinct):
+    store = DailyAggregateStore(tmp_path / "store", distinct=distinct)
+    rows = {"day": ["2013-01-01"] * 3, "LCLid": ["MAC000001", "MAC000001", "MAC000002"],
+            "energy_sum": [1.0, 2.0, 4.0]}
+    store.append(pd.DataFrame(rows), block=0)
+    store.append(pd.DataFrame(rows).iloc[:1], block=1)
+    frame = store.to_frame()
+    assert frame["LCLid"].tolist() == [2]
+    assert frame["energy_sum"].tolist() == [8.0]
+
+
+def test_unchanged_block_is_skipped(tmp_path):
+    source, dataset = tmp_path / "csv", tmp_path / "energy"
+    source.mkdir()
+    write_block(source, 0, ["MAC000001"], pd.date_range("2013-01-01", periods=3))
+    store = DailyAggregateStore(tmp_path / "store")
+    assert store.append_blocks(dataset, ingest_blocks(source, dataset)) == [0]
+    assert store.append_blocks(dataset) == []
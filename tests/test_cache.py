@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+
+from ontario_energy.cache import FeatureCache
+from ontario_energy.features import FeatureMatrix
+
+# Rows start later than ``DEPTH``, as when leading rows with gaps are dropped
+DEPTH, START = 3, 10
+
+
+def build(series):
+    values = series.to_numpy(dtype=np.float64)
+    X = np.column_stack([values[START - lag:len(values) - lag] for lag in (1, 2, 3)])
+    return FeatureMatrix(X, values[START:].astype(np.float32), series.index[START:], ["t-1", "t-2", "t-3"])
+
+
+def test_truncated_history_is_built_not_sliced(tmp_path):
+    series = pd.Series(np.arange(50.0), index=pd.date_range("2024-01-01", periods=50))
+    cache = FeatureCache(tmp_path)
+    assert len(cache.get(series, build, "lags", DEPTH).X) == 40
+
+    prefix = cache.get(series.iloc[:20], build, "lags", DEPTH)
+    np.testing.assert_array_equal(prefix.X, build(series.iloc[:20]).X)
+
+    short = cache.get(series.iloc[:8], build, "lags", DEPTH)
+    assert len(short.X) == 0 and len(short.index) == 0
+    # The longer cached matrix is kept
+    assert len(cache.get(series, build, "lags", DEPTH).X) == 40
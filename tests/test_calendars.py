@@ -0,0 +1,32 @@
+import datetime
+
+import pandas as pd
+
+from ontario_energy.calendars import SCHOOL_BREAK, SCHOOL_DAY, CalendarService, school_breaks
+
+
+def test_winter_break_2024_25():
+    # Toronto public schools: last class Friday Dec 20, 2024, back Monday Jan 6, 2025
+    assert (datetime.date(2024, 12, 21), datetime.date(2025, 1, 5)) in school_breaks(2024)
+    flags = CalendarService("2024-12-01", "2025-01-31").range("2024-12-20", "2025-01-07")
+    days = pd.date_range("2024-12-20", "2025-01-07")
+    on_break = days[(flags & SCHOOL_BREAK) != 0]
+    assert on_break[0] == pd.Timestamp("2024-12-21") and on_break[-1] == pd.Timestamp("2025-01-05")
+    assert flags[0] & SCHOOL_DAY and flags[-2] & SCHOOL_DAY
+    assert not (flags[(days >= "2024-12-21") & (days <= "2025-01-05")] & SCHOOL_DAY).any()
+
+
+def test_winter_break_when_new_years_day_is_a_monday():
+    assert (datetime.date(2023, 12, 23), datetime.date(2024, 1, 7)) in school_breaks(2023)
+    # Christmas on a Saturday: the break starts the Saturday before
+    assert school_breaks(2021)[-1][0] == datetime.date(2021, 12, 18)
+
+
+def test_winter_break_when_new_years_day_is_a_sunday():
+    # New Year's Day observed on Monday Jan 2, 2023; classes resume Jan 9
+    assert (datetime.date(2022, 12, 24), datetime.date(2023, 1, 8)) in school_breaks(2022)
+
+
+def test_january_of_the_first_year_is_on_break():
+    flags = CalendarService("2025-01-01", "2025-01-31").range("2025-01-01", "2025-01-06")
+    assert (flags[:5] & SCHOOL_BREAK).all() and flags[5] & SCHOOL_DAY
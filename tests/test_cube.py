@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+
+from ontario_energy.cube import AggregationCube, month_window
+
+
+def hourly(start, end, seed=0):
+    index = pd.date_range(start, end, freq="h")
+    return pd.Series(np.random.default_rng(seed).normal(100, 10, len(index)), index=index)
+
+
+def assert_same(cube, expected):
+    for name in ("sum", "count", "min", "max"):
+        np.testing.assert_allclose(getattr(cube, name), getattr(expected, name))
+    assert cube.watermark == expected.watermark
+
+
+def test_last_month_is_the_last_complete_month_for_every_chart():
+    series = hourly("2023-01-01", "2024-03-03 10:00")
+    start, stop = month_window(series.index[0], series.index[-1], 1)
+    assert (start, stop) == (pd.Timestamp("2024-02-01"), pd.Timestamp("2024-03-01"))
+    window = series.loc[start:stop - pd.Timedelta(hours=1)]
+
+    cube = AggregationCube()
+    cube.update(series)
+    monthly = cube.monthly(months=1)
+    assert monthly.index.tolist() == [pd.Timestamp("2024-02-01")]
+    assert np.isclose(monthly.iloc[0], window.mean())
+    assert cube.reduce(("hour",), months=1, stat="count").sum() == len(window)
+
+    # Data ending on the last day of its month includes that month
+    assert month_window(series.index[0], pd.Timestamp("2024-02-29 23:00"), 1)[0] == pd.Timestamp("2024-02-01")
+
+
+def test_revised_and_new_rows_are_refolded():
+    series = hourly("2023-01-01", "2024-03-03 10:00")
+    cube = AggregationCube()
+    assert cube.update(series) == len(series)
+    assert cube.update(series) == 0
+
+    revised = series.copy()
+    revised.loc["2023-06-10"] += 50.0
+    extended = pd.concat([revised, hourly("2024-03-03 11:00", "2024-03-10", seed=1)])
+    folded = cube.update(extended)
+    assert folded == 30 * 24 + len(extended.loc["2024-03"])
+
+    expected = AggregationCube()
+    expected.update(extended)
+    assert_same(cube, expected)
+
+
+def test_saved_cube_keeps_its_fingerprints(tmp_path):
+    series = hourly("2023-01-01", "2023-12-31")
+    cube = AggregationCube()
+    cube.update(series)
+    cube.save(tmp_path / "cube.npz")
+    loaded = AggregationCube.load(tmp_path / "cube.npz")
+    assert loaded.update(series) == 0
@@ -0,0 +1,35 @@
+import pytest
+
+from ontario_energy.intervals import calibration_windows, residual_bounds
+from ontario_energy.models import LstmForecaster
+from ontario_energy.synthetic import target_series
+
+pytest.importorskip("keras")
+
+
+def test_lstm_calibrates_on_days_it_was_not_trained_on(monkeypatch):
+    series = target_series("Electricity Demand", end="2020-12-31", years=2)
+    trained = []
+    train = LstmForecaster._train
+
+    def record(self, values, epochs):
+        trained.append(len(values))
+        train(self, values, epochs)
+
+    monkeypatch.setattr(LstmForecaster, "_train", record)
+    model = LstmForecaster(epochs=2, update_epochs=1).fit(series)
+
+    origins, horizon = model.residuals_.shape
+    assert trained == [len(series) - origins - horizon + 1, len(series)]
+
+
+def test_lstm_intervals_cover_new_data():
+    series = target_series("Electricity Demand", end="2020-12-31", years=4)
+    history, future = series.iloc[:-365], series.to_numpy()[-365 - 7:]
+    model = LstmForecaster(epochs=10, calibration_horizon=30).fit(history)
+
+    windows, actual = calibration_windows(future, model.lags, 300, 30)
+    predicted = model.predict_batch(windows, 30)
+    lower, upper = residual_bounds(model.residuals_, 0.9)
+    covered = (actual >= predicted + lower) & (actual <= predicted + upper)
+    assert covered.mean() > 0.8
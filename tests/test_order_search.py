@@ -0,0 +1,23 @@
+from ontario_energy.cache import ModelCache
+from ontario_energy.order_search import OrderSearch, model_settings, save_orders
+from ontario_energy.service import ForecastService
+
+
+def save(results_dir, target, order, seasonal_order):
+    save_orders({target: OrderSearch(order, seasonal_order, "c", 0.0, None)}, results_dir)
+
+
+def test_searched_order_is_used_and_keys_the_cache(tmp_path):
+    assert model_settings("ARIMA", "Price", tmp_path) == {}
+    save(tmp_path, "Price", (1, 0, 0), (0, 0, 0, 0))
+    assert model_settings("LSTM", "Price", tmp_path) == {}
+    assert model_settings("ARIMA", "Electricity Demand", tmp_path) == {}
+
+    service = ForecastService(ModelCache(tmp_path / "models"), results_dir=tmp_path)
+    fitted, key = service.fitted_model("ARIMA", "Price")
+    assert (fitted.order, fitted.seasonal_order) == ((1, 0, 0), (0, 0, 0, 0))
+
+    save(tmp_path, "Price", (2, 0, 0), (0, 0, 0, 0))
+    refitted, retuned = service.fitted_model("ARIMA", "Price")
+    assert refitted.order == (2, 0, 0)
+    assert retuned[2] != key[2] and retuned[3] == key[3]